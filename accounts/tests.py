@@ -1,3 +1,34 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from config.perf import query_budget
+
+
+class AuthEndpointBudgetTests(TestCase):
+    """
+    Query-count and latency budgets for sign-up and JWT login (the first
+    two calls of every new client). Password hashing dominates the
+    latency, so those budgets are wide.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_register_login_refresh(self):
+        with query_budget("register", max_queries=4, max_ms=1500):
+            response = self.client.post(
+                "/api/accounts/register/",
+                {"username": "newcomer", "email": "new@example.com", "phone": "03001234567", "password": "s3cret-pass"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+
+        with query_budget("jwt_login", max_queries=2, max_ms=1500):
+            response = self.client.post(
+                "/api/accounts/jwt/login/", {"username": "newcomer", "password": "s3cret-pass"}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+        with query_budget("jwt_refresh", max_queries=4, max_ms=250):
+            response = self.client.post("/api/accounts/jwt/refresh/", {"refresh": response.json()["refresh"]}, format="json")
+        self.assertEqual(response.status_code, 200)
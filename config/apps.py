@@ -1,12 +1,14 @@
 import os
 from django.apps import AppConfig
+from django.conf import settings
 
 class ConfigConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "config"
 
     def ready(self):
-        # Prevent scheduler from running twice due to autoreloader
-        if os.environ.get("RUN_MAIN") == "true":
+        # Jobs normally run in the poll_gold_price worker. Opt-in only for
+        # local runserver (RUN_MAIN avoids a second copy in the autoreloader).
+        if settings.MARKET_SCHEDULER_IN_WEB and os.environ.get("RUN_MAIN") == "true":
             from market.scheduler import start
             start()
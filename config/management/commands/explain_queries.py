@@ -0,0 +1,53 @@
+import difflib
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from config.perf import explain, full_scans, key_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes EXPLAIN plans of the hot-path queries to PERF_PLANS_DIR/<vendor>/<name>.txt, "
+        "so index regressions show up in review diffs. --check compares instead of writing. "
+        "Run it against a freshly migrated database: the planner picks by table statistics, "
+        "so plans taken on a database with data differ from the saved ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Plans directory (default PERF_PLANS_DIR).")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Exit non-zero when a plan differs from the saved one or misses its index.",
+        )
+
+    def handle(self, *args, **options):
+        directory = os.path.join(options["output"] or settings.PERF_PLANS_DIR, connection.vendor)
+        os.makedirs(directory, exist_ok=True)
+
+        problems = []
+        for name, (queryset, table, index) in key_queries().items():
+            plan = explain(queryset) + "\n"
+            if full_scans(plan, table) or (index and index not in plan):
+                problems.append(f"{name}: expected {index or 'an index'} on {table}\n{plan}")
+
+            path = os.path.join(directory, f"{name}.txt")
+            saved = open(path).read() if os.path.exists(path) else ""
+
+            if options["check"]:
+                if plan != saved:
+                    diff = difflib.unified_diff(saved.splitlines(True), plan.splitlines(True), path, "current")
+                    problems.append("".join(diff))
+                continue
+
+            if plan != saved:
+                with open(path, "w") as f:
+                    f.write(plan)
+                self.stdout.write(f"{'Updated' if saved else 'Wrote'} {path}")
+
+        if problems:
+            raise CommandError("Query plan regressions:\n\n" + "\n".join(problems))
+        self.stdout.write(self.style.SUCCESS(f"Plans for {connection.vendor} are up to date in {directory}"))
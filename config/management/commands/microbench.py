@@ -0,0 +1,229 @@
+import json
+import platform
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+from uuid import uuid4
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from config.perf import compare_to_baseline, summarize, time_calls
+from market.models import GoldPriceConfig
+from market.services import GoldPriceService
+from wallet.models import Wallet
+from wallet.services import InventoryEngine, WalletEngine
+
+
+# Small enough that any stock / balance covers a full run
+GRAMS = Decimal("0.000001")
+
+
+class EngineState:
+    """
+    One per thread: its own wallet and the stripes it reserved, so every
+    pair (credit/debit, reserve/release, reduce/increase) nets to zero.
+    """
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+        self.stripes = deque()
+
+
+def cpu_benchmarks():
+    service = GoldPriceService()
+    wallet = Wallet(gold_balance_grams=Decimal("123.456789"))
+    return {
+        "pricing.compute_prices": lambda: service.compute_prices(Decimal("2345.67"), Decimal("278.90")),
+        "wallet.tola": wallet.tola,
+        "wallet.milligrams": wallet.milligrams,
+    }
+
+
+# Order matters: each second benchmark of a pair undoes the first
+ENGINE_BENCHMARKS = {
+    "engine.wallet_credit": lambda state: WalletEngine.credit(state.wallet, GRAMS, reference="microbench"),
+    "engine.wallet_debit": lambda state: WalletEngine.debit(state.wallet, GRAMS, reference="microbench"),
+    "engine.inventory_reserve": lambda state: state.stripes.append(InventoryEngine.reserve(GRAMS)),
+    "engine.inventory_release": lambda state: InventoryEngine.release(GRAMS, stripe=state.stripes.popleft()),
+    "engine.inventory_reduce_total": lambda state: InventoryEngine.reduce_total(GRAMS),
+    "engine.inventory_increase_total": lambda state: InventoryEngine.increase_total(GRAMS),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmarks for pricing, unit conversions and the wallet/inventory engines: warm-up, "
+        "repeated samples, median/stdev per call. Saves JSON (--output) and compares with a stored "
+        "baseline (--baseline). Engine benchmarks run against the default database, so run once "
+        "with DJANGO_ENV=local (SQLite) and once with DATABASE_URL (Postgres) to compare backends. "
+        "They leave balances and stock unchanged but write ledger rows for a throwaway user: "
+        "use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="+", help="Run benchmarks whose name contains any of these.")
+        parser.add_argument("--skip-engine", action="store_true", help="Pure-Python benchmarks only (no database).")
+        parser.add_argument("--threads", type=int, default=1, help="Concurrent threads for engine benchmarks (default 1).")
+        parser.add_argument("--repeats", type=int, default=7, help="Samples per benchmark (default 7).")
+        parser.add_argument("--number", type=int, default=100, help="Engine calls per sample and thread (default 100).")
+        parser.add_argument("--cpu-number", type=int, default=20000, help="Calls per sample for pure benchmarks (default 20000).")
+        parser.add_argument("--warmup", type=int, default=20, help="Untimed calls first, per thread (default 20; x100 for pure).")
+        parser.add_argument("--output", "-o", help="Write results as JSON here.")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare with.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.10,
+            help="Median slowdown that counts as a regression (default 0.10 = 10%%).",
+        )
+        parser.add_argument("--fail-on-regression", action="store_true", help="Exit non-zero on a regression.")
+
+    def handle(self, *args, **options):
+        def selected(name):
+            return not options["only"] or any(part in name for part in options["only"])
+
+        results = {}
+        for name, fn in cpu_benchmarks().items():
+            if not selected(name):
+                continue
+            if name.startswith("pricing.") and not GoldPriceConfig.objects.exists():
+                self.stdout.write(self.style.WARNING(f"{name}: skipped, no GoldPriceConfig in this database"))
+                continue
+            started = time.perf_counter()
+            samples = time_calls(fn, options["cpu_number"], options["repeats"], options["warmup"] * 100)
+            results[name] = summarize(
+                samples, options["cpu_number"] * options["repeats"], time.perf_counter() - started
+            )
+            self._print(name, results[name])
+
+        engine = [name for name in ENGINE_BENCHMARKS if selected(name)]
+        if engine and not options["skip_engine"]:
+            results.update(self._run_engine(engine, options))
+
+        report = {
+            "meta": {
+                "timestamp": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "machine": platform.machine(),
+                "vendor": connection.vendor,
+                "threads": options["threads"],
+                "repeats": options["repeats"],
+                "number": options["number"],
+                "cpu_number": options["cpu_number"],
+            },
+            "results": results,
+        }
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Saved {len(results)} results to {options['output']}")
+
+        if options["baseline"]:
+            self._compare(report, options)
+
+    def _run_engine(self, names, options):
+        threads, number, repeats, warmup = options["threads"], options["number"], options["repeats"], options["warmup"]
+        calls = threads * (warmup + number * repeats)
+        available = InventoryEngine.totals()["available_grams"]
+        if available < GRAMS * calls:
+            raise CommandError(f"Needs {GRAMS * calls}g available inventory, only {available}g is.")
+
+        User = get_user_model()
+        prefix = f"microbench-{uuid4().hex[:8]}-"
+        states = [
+            EngineState(Wallet.objects.get(user=User.objects.create_user(username=f"{prefix}{i}")))
+            for i in range(threads)
+        ]
+
+        results = {}
+        try:
+            for name in names:
+                results[name] = self._run_threads(ENGINE_BENCHMARKS[name], states, number, repeats, warmup)
+                self._print(name, results[name])
+        finally:
+            # Ledger rows of the throwaway wallets net to zero
+            User.objects.filter(username__startswith=prefix).delete()
+            InventoryEngine.rebalance()
+        return results
+
+    @staticmethod
+    def _run_threads(op, states, number, repeats, warmup):
+        samples, errors = [], [0]
+        lock = threading.Lock()
+
+        def worker(state, start=None):
+            def call():
+                try:
+                    op(state)
+                except Exception:
+                    with lock:
+                        errors[0] += 1
+
+            if start is not None:
+                start.wait()
+            own = time_calls(call, number, repeats, warmup)
+            with lock:
+                samples.extend(own)
+
+        started = time.perf_counter()
+        if len(states) == 1:
+            # In the calling thread: no extra connection
+            worker(states[0])
+        else:
+            start = threading.Barrier(len(states) + 1)
+
+            def run(state):
+                try:
+                    worker(state, start)
+                finally:
+                    close_old_connections()
+
+            workers = [threading.Thread(target=run, args=(state,)) for state in states]
+            for thread in workers:
+                thread.start()
+            start.wait()
+            started = time.perf_counter()
+            for thread in workers:
+                thread.join()
+
+        seconds = time.perf_counter() - started
+        ops = len(states) * (warmup + number * repeats)
+        return summarize(samples, ops, seconds, errors=errors[0])
+
+    def _print(self, name, result):
+        line = (
+            f"{name:<32} median {result['median_us']:>10.2f}us  min {result['min_us']:>10.2f}us  "
+            f"±{result['rel_stdev']:>6.1%}  {result['ops_per_second']:>11.1f} ops/s"
+        )
+        if result["errors"]:
+            line += f"  errors: {result['errors']}"
+        self.stdout.write(line)
+
+    def _compare(self, report, options):
+        with open(options["baseline"]) as f:
+            baseline = json.load(f)
+
+        if baseline.get("meta", {}).get("vendor") != report["meta"]["vendor"]:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline ran on {baseline.get('meta', {}).get('vendor')}, this run on {report['meta']['vendor']}"
+            ))
+
+        comparison = compare_to_baseline(report["results"], baseline.get("results", {}), options["threshold"])
+        regressions = []
+        for name, row in comparison.items():
+            style = self.style.ERROR if row["regression"] else self.style.SUCCESS if row["change"] < 0 else str
+            self.stdout.write(style(
+                f"{name:<32} {row['baseline_us']:>10.2f}us -> {row['current_us']:>10.2f}us  {row['change']:>+7.1%}"
+            ))
+            if row["regression"]:
+                regressions.append(name)
+
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"Slower than baseline by more than {options['threshold']:.0%}: {', '.join(regressions)}")
@@ -0,0 +1,248 @@
+import gc
+import json
+import os
+import re
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+# ----------------------------------------------
+# REQUEST BUDGETS
+# ----------------------------------------------
+_SAVEPOINT = re.compile(r"(RELEASE |ROLLBACK TO )?SAVEPOINT ")
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+def _record(report):
+    """
+    Appends one measurement to PERF_REPORT_PATH (JSON lines), if set.
+    """
+    path = settings.PERF_REPORT_PATH
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(report) + "\n")
+
+
+@contextmanager
+def query_budget(name, max_queries, max_ms):
+    """
+    Measures the block: queries run, SQL time and wall-clock time.
+    Raises BudgetExceeded past max_queries or max_ms (scaled by
+    PERF_LATENCY_BUDGET_SCALE for slow CI machines). Yields the report
+    dict, filled in when the block ends.
+    """
+    report = {"name": name, "vendor": connection.vendor, "max_queries": max_queries}
+    sql_seconds = []
+
+    def timed(execute, sql, params, many, context):
+        # Django's own query log rounds to whole milliseconds
+        query_started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            sql_seconds.append(time.perf_counter() - query_started)
+
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as captured, connection.execute_wrapper(timed):
+        yield report
+
+    report["wall_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    # Savepoints come from nested atomic blocks (the test case itself
+    # wraps every request in one), so they are reported but not budgeted
+    queries = [query for query in captured.captured_queries if not _SAVEPOINT.match(query["sql"])]
+    report["sql_ms"] = round(sum(sql_seconds) * 1000, 2)
+    report["queries"] = len(queries)
+    report["savepoints"] = len(captured) - len(queries)
+    report["max_ms"] = max_ms * settings.PERF_LATENCY_BUDGET_SCALE
+    _record(report)
+
+    if report["queries"] > max_queries:
+        sql = "\n".join(f"{i}. {query['sql']}" for i, query in enumerate(queries, start=1))
+        raise BudgetExceeded(f"{name}: {report['queries']} queries, budget {max_queries}\n{sql}")
+    if report["wall_ms"] > report["max_ms"]:
+        raise BudgetExceeded(
+            f"{name}: {report['wall_ms']}ms (SQL {report['sql_ms']}ms), budget {report['max_ms']}ms"
+        )
+
+
+# ----------------------------------------------
+# QUERY PLANS
+# ----------------------------------------------
+# Row estimates and costs change with table statistics; only the plan
+# shape (scan types, indexes, ordering) is kept so saved plans diff cleanly.
+_PG_NOISE = re.compile(r"\s+\(cost=[^)]*\)|\s+\(actual[^)]*\)")
+_SQLITE_IDS = re.compile(r"^\d+ \d+ \d+ ", re.MULTILINE)
+# Monthly snapshot partitions come and go; one line stands for all of them
+_PG_PARTITION = re.compile(r"_p\d{4}_\d{2}|_default(?=\b|_)")
+_PG_ALIAS = re.compile(r"(market_goldpricesnapshot)_\d+\b")
+
+
+def explain(queryset):
+    """
+    Normalized EXPLAIN output for queryset on the default connection.
+    On Postgres sequential scans are disabled while explaining, so a
+    small test table still shows the index the query would use in
+    production; a Seq Scan in the output means no index fits at all.
+    """
+    if connection.vendor != "postgresql":
+        return _SQLITE_IDS.sub("", queryset.explain()).strip()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        try:
+            plan = queryset.explain()
+        finally:
+            cursor.execute("RESET enable_seqscan")
+    lines = []
+    for line in _PG_NOISE.sub("", plan).splitlines():
+        line = _PG_ALIAS.sub(r"\1", _PG_PARTITION.sub("_pN", line))
+        if not lines or line != lines[-1]:
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def full_scans(plan, table):
+    """
+    Lines of plan that read all of table instead of using an index.
+    """
+    patterns = [
+        re.compile(rf"Seq Scan on {table}\b"),
+        re.compile(rf"\bSCAN {table}\b(?! USING)"),
+    ]
+    return [line for line in plan.splitlines() if any(p.search(line) for p in patterns)]
+
+
+def key_queries():
+    """
+    The hot-path queries whose plans are saved under perf/plans/ and
+    checked by the budget tests: name → (queryset, table, index the
+    plan must use; None = any index).
+    """
+    from datetime import datetime, timezone
+
+    from market.models import GoldPriceSnapshot, PriceCandle
+    from wallet.audit_models import OrderAuditLog
+    from wallet.ledger import ledger_queryset
+    from wallet.models import BuyOrder, IdempotencyRecord, SellOrder, Wallet, WalletTransaction
+
+    # Fixed literals keep the saved plans byte-stable
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    wallet = Wallet(pk=1)
+    ledger = ledger_queryset(wallet).filter(timestamp__lt=now).values("id")[:51]
+
+    return {
+        "wallet_ledger_page": (ledger, WalletTransaction._meta.db_table, "wallettx_wallet_ts_id_idx"),
+        "buy_order_by_token": (
+            BuyOrder.objects.filter(order_token="token"), BuyOrder._meta.db_table, None,
+        ),
+        "sell_order_by_token": (
+            SellOrder.objects.filter(order_token="token"), SellOrder._meta.db_table, None,
+        ),
+        "sweeper_expired_buys": (
+            BuyOrder.objects.filter(status=BuyOrder.STATUS_PENDING_LOCKED, expires_at__lt=now).order_by("expires_at")[:500],
+            BuyOrder._meta.db_table,
+            "buyorder_pending_expiry_idx",
+        ),
+        "sweeper_expired_sells": (
+            SellOrder.objects.filter(status=SellOrder.STATUS_PENDING_LOCKED, expires_at__lt=now).order_by("expires_at")[:500],
+            SellOrder._meta.db_table,
+            "sellorder_pending_expiry_idx",
+        ),
+        "idempotency_lookup": (
+            IdempotencyRecord.objects.filter(user_id=1, key="key", endpoint="buy_confirm"),
+            IdempotencyRecord._meta.db_table,
+            None,
+        ),
+        "order_audit_history": (
+            OrderAuditLog.objects.filter(order_id="token").order_by("timestamp"),
+            OrderAuditLog._meta.db_table,
+            "audit_order_ts_idx",
+        ),
+        "latest_price_snapshot": (
+            GoldPriceSnapshot.objects.order_by("-timestamp")[:1], GoldPriceSnapshot._meta.db_table, None,
+        ),
+        "price_candle_range": (
+            PriceCandle.objects.filter(resolution="1h", bucket_start__gte=now, bucket_start__lt=now).order_by("bucket_start"),
+            PriceCandle._meta.db_table,
+            None,
+        ),
+    }
+
+
+# ----------------------------------------------
+# MICROBENCHMARKS
+# ----------------------------------------------
+def time_calls(fn, number, repeats, warmup):
+    """
+    timeit-style: warmup calls, then repeats samples of number calls
+    each, with the garbage collector off. Returns seconds per call, one
+    value per sample.
+    """
+    for _ in range(warmup):
+        fn()
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - started) / number)
+        return samples
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def summarize(samples, ops, seconds, errors=0):
+    """
+    Per-call statistics in microseconds. The median is what baselines
+    compare; rel_stdev says how far to trust it.
+    """
+    micros = sorted(sample * 1e6 for sample in samples)
+    mean = statistics.fmean(micros)
+    stdev = statistics.stdev(micros) if len(micros) > 1 else 0.0
+    return {
+        "median_us": round(statistics.median(micros), 3),
+        "min_us": round(micros[0], 3),
+        "mean_us": round(mean, 3),
+        "stdev_us": round(stdev, 3),
+        "rel_stdev": round(stdev / mean, 4) if mean else 0.0,
+        "samples": len(micros),
+        "ops": ops,
+        "ops_per_second": round(ops / seconds, 1) if seconds else 0.0,
+        "errors": errors,
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    {name: {"baseline_us", "current_us", "change", "regression"}} for
+    benchmarks present in both; change is the relative median change
+    (+0.25 = 25% slower), a regression when above threshold.
+    """
+    comparison = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("median_us"):
+            continue
+        change = current["median_us"] / previous["median_us"] - 1
+        comparison[name] = {
+            "baseline_us": previous["median_us"],
+            "current_us": current["median_us"],
+            "change": round(change, 4),
+            "regression": change > threshold,
+        }
+    return comparison
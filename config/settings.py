@@ -123,6 +123,17 @@ else:
     # Optional: keep connections open
     DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=600)
 
+# ----------------------------
+# Cache (latest price, config version)
+# ----------------------------
+# Local memory by default; point CACHE_URL at Redis/Memcached on servers
+# so every worker shares the latest snapshot (a system check warns about a
+# process-local cache there while the poller runs separately), e.g.:
+# CACHE_URL=rediscache://127.0.0.1:6379/1
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://")
+}
+
 # ----------------------------
 # Password validation
 # ----------------------------
@@ -187,6 +198,123 @@ SIMPLE_JWT = {
 APSCHEDULER_DATETIME_FORMAT = "N j, Y, f:s a"
 APSCHEDULER_RUN_NOW_TIMEOUT = 25  # seconds
 
+# Jobs run in the worker: python manage.py poll_gold_price --with-jobs
+# True = old behaviour, scheduler inside `runserver` (local dev only)
+MARKET_SCHEDULER_IN_WEB = env.bool("MARKET_SCHEDULER_IN_WEB", default=False)
+
+# Leader lease: only the holder polls prices and runs the jobs; a
+# standby takes over about this many seconds after the leader dies
+MARKET_LEADER_LEASE_SECONDS = env.int("MARKET_LEADER_LEASE_SECONDS", default=15)
+
+# ----------------------------
+# Live price providers
+# ----------------------------
+# Tried in order; "stub" gives deterministic offline prices.
+GOLD_PRICE_PROVIDERS = env.list("GOLD_PRICE_PROVIDERS", default=["yfinance", "yahoo_chart"])
+GOLD_PRICE_FETCH_DEADLINE_SECONDS = env.float("GOLD_PRICE_FETCH_DEADLINE_SECONDS", default=20)
+GOLD_PRICE_HEDGE_AFTER_SECONDS = env.float("GOLD_PRICE_HEDGE_AFTER_SECONDS", default=2.0)
+GOLD_PRICE_POLL_BUDGET_SECONDS = env.float("GOLD_PRICE_POLL_BUDGET_SECONDS", default=45)
+
+# Seconds between snapshots; also drives Cache-Control max-age on reads
+GOLD_PRICE_POLL_INTERVAL_SECONDS = env.int("GOLD_PRICE_POLL_INTERVAL_SECONDS", default=60)
+
+# Circuit breaker per provider
+GOLD_PRICE_BREAKER_FAILURES = env.int("GOLD_PRICE_BREAKER_FAILURES", default=3)
+GOLD_PRICE_BREAKER_SLOW_SECONDS = env.float("GOLD_PRICE_BREAKER_SLOW_SECONDS", default=10)
+GOLD_PRICE_BREAKER_COOLDOWN_SECONDS = env.float("GOLD_PRICE_BREAKER_COOLDOWN_SECONDS", default=120)
+
+# ----------------------------
+# Live price stream (SSE / WebSocket, ASGI)
+# ----------------------------
+MARKET_STREAM_HEARTBEAT_SECONDS = env.int("MARKET_STREAM_HEARTBEAT_SECONDS", default=15)
+MARKET_STREAM_HISTORY = env.int("MARKET_STREAM_HISTORY", default=120)
+MARKET_STREAM_POLL_SECONDS = env.float("MARKET_STREAM_POLL_SECONDS", default=1.0)
+
+# ----------------------------
+# Daily closing prices
+# ----------------------------
+# The nightly job recomputes this many days (today included)
+MARKET_CLOSING_RECOMPUTE_DAYS = env.int("MARKET_CLOSING_RECOMPUTE_DAYS", default=3)
+
+# ----------------------------
+# Snapshot retention
+# ----------------------------
+# Full minute resolution for N days, then one snapshot per hour until
+# the downsampled horizon, then deleted (candles keep OHLC history).
+MARKET_SNAPSHOT_FULL_RESOLUTION_DAYS = env.int("MARKET_SNAPSHOT_FULL_RESOLUTION_DAYS", default=30)
+MARKET_SNAPSHOT_DOWNSAMPLED_DAYS = env.int("MARKET_SNAPSHOT_DOWNSAMPLED_DAYS", default=365)
+MARKET_SNAPSHOT_PRUNE_BATCH_SIZE = env.int("MARKET_SNAPSHOT_PRUNE_BATCH_SIZE", default=1000)
+
+# ----------------------------
+# Gold inventory striping
+# ----------------------------
+# GoldInventory rows the stock is spread over; more stripes = less row
+# lock contention between concurrent buy locks/confirms
+INVENTORY_STRIPES = env.int("INVENTORY_STRIPES", default=8)
+
+# ----------------------------
+# Expired lock sweeper
+# ----------------------------
+WALLET_LOCK_SWEEP_INTERVAL_SECONDS = env.int("WALLET_LOCK_SWEEP_INTERVAL_SECONDS", default=30)
+WALLET_LOCK_SWEEP_BATCH_SIZE = env.int("WALLET_LOCK_SWEEP_BATCH_SIZE", default=500)
+
+# ----------------------------
+# Wallet ledger pagination
+# ----------------------------
+WALLET_LEDGER_PAGE_SIZE = env.int("WALLET_LEDGER_PAGE_SIZE", default=50)
+WALLET_LEDGER_MAX_PAGE_SIZE = env.int("WALLET_LEDGER_MAX_PAGE_SIZE", default=200)
+# Rows fetched per round trip by streaming exports
+WALLET_LEDGER_EXPORT_CHUNK_SIZE = env.int("WALLET_LEDGER_EXPORT_CHUNK_SIZE", default=2000)
+
+# ----------------------------
+# Wallet balance checkpoints
+# ----------------------------
+WALLET_CHECKPOINT_INTERVAL_MINUTES = env.int("WALLET_CHECKPOINT_INTERVAL_MINUTES", default=60)
+# Ledger rows younger than this wait for the next run (in-flight commits)
+WALLET_CHECKPOINT_SETTLE_SECONDS = env.int("WALLET_CHECKPOINT_SETTLE_SECONDS", default=60)
+
+# ----------------------------
+# Reconciliation
+# ----------------------------
+WALLET_RECONCILIATION_INTERVAL_MINUTES = env.int("WALLET_RECONCILIATION_INTERVAL_MINUTES", default=15)
+# Drift (grams) tolerated before alerting
+WALLET_RECONCILIATION_TOLERANCE_GRAMS = env.str("WALLET_RECONCILIATION_TOLERANCE_GRAMS", default="0.000001")
+WALLET_RECONCILIATION_SETTLE_SECONDS = env.int("WALLET_RECONCILIATION_SETTLE_SECONDS", default=60)
+
+# ----------------------------
+# Idempotency keys (confirm endpoints)
+# ----------------------------
+IDEMPOTENCY_TTL_HOURS = env.int("IDEMPOTENCY_TTL_HOURS", default=24)
+# An in-progress key older than this is treated as abandoned
+IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS = env.int("IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS", default=60)
+# A retry of a key still in progress waits this long for its response
+IDEMPOTENCY_WAIT_SECONDS = env.float("IDEMPOTENCY_WAIT_SECONDS", default=5.0)
+IDEMPOTENCY_PURGE_BATCH_SIZE = env.int("IDEMPOTENCY_PURGE_BATCH_SIZE", default=1000)
+
+# ----------------------------
+# Order audit log (buffered writer)
+# ----------------------------
+AUDIT_BATCH_SIZE = env.int("AUDIT_BATCH_SIZE", default=200)
+AUDIT_FLUSH_SECONDS = env.float("AUDIT_FLUSH_SECONDS", default=1.0)
+# Queued events are spooled here until written; must survive restarts
+AUDIT_SPOOL_DIR = env.str("AUDIT_SPOOL_DIR", default=str(BASE_DIR / "var" / "audit_spool"))
+AUDIT_SPOOL_FSYNC = env.bool("AUDIT_SPOOL_FSYNC", default=False)
+# Names this node's spool files ("" = hostname); keep it stable across
+# container restarts so a restarted node replays its own leftovers
+AUDIT_INSTANCE_ID = env.str("AUDIT_INSTANCE_ID", default="")
+
+# Drift alerts go to mail_admins; comma-separated emails
+ADMINS = [(email, email) for email in env.list("ADMINS", default=[])]
+
+# ----------------------------
+# Performance budgets (tests + explain_queries)
+# ----------------------------
+# Multiplies every latency budget in the endpoint budget tests
+PERF_LATENCY_BUDGET_SCALE = env.float("PERF_LATENCY_BUDGET_SCALE", default=1.0)
+# JSON-lines file the budget tests append measurements to ("" = off)
+PERF_REPORT_PATH = env.str("PERF_REPORT_PATH", default="")
+PERF_PLANS_DIR = env.str("PERF_PLANS_DIR", default=str(BASE_DIR / "perf" / "plans"))
+
 # ----------------------------
 # Production security toggles
 # ----------------------------
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import GoldPriceConfig, GoldPriceSnapshot, DailyClosingPrice
+from .models import GoldPriceConfig, GoldPriceSnapshot, DailyClosingPrice, PriceCandle, SchedulerLease
 
 
 # --------------------------------------------
@@ -70,6 +70,11 @@ class GoldPriceSnapshotAdmin(admin.ModelAdmin):
     ordering = ("-timestamp",)
     readonly_fields = [f.name for f in GoldPriceSnapshot._meta.fields]
 
+    # Drill down by date so queries stay within a few partitions, and
+    # skip the unfiltered COUNT(*) over the whole history.
+    date_hierarchy = "timestamp"
+    show_full_result_count = False
+
 
 # --------------------------------------------
 # DAILY CLOSING PRICE ADMIN
@@ -88,4 +93,32 @@ class DailyClosingPriceAdmin(admin.ModelAdmin):
     readonly_fields = [
         f.name for f in DailyClosingPrice._meta.fields
         if f.name != "source_snapshot"
-    ]
\ No newline at end of file
+    ]
+
+
+# --------------------------------------------
+# PRICE CANDLE ADMIN
+# --------------------------------------------
+@admin.register(PriceCandle)
+class PriceCandleAdmin(admin.ModelAdmin):
+    list_display = (
+        "resolution",
+        "bucket_start",
+        "open",
+        "high",
+        "low",
+        "close",
+        "sample_count",
+    )
+
+    list_filter = ("resolution",)
+    ordering = ("-bucket_start",)
+    readonly_fields = [f.name for f in PriceCandle._meta.fields]
+
+# --------------------------------------------
+# SCHEDULER LEASE ADMIN
+# --------------------------------------------
+@admin.register(SchedulerLease)
+class SchedulerLeaseAdmin(admin.ModelAdmin):
+    list_display = ("name", "holder", "acquired_at", "renewed_at", "expires_at")
+    readonly_fields = [f.name for f in SchedulerLease._meta.fields]
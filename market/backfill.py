@@ -0,0 +1,215 @@
+import csv
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import PricingConfigCache
+from .candles import CandleRollup
+from .closing import ClosingPriceEngine
+from .models import GoldPriceSnapshot
+from .services import GoldPriceService
+
+
+# Accepted CSV column names (first match wins)
+CSV_COLUMNS = {
+    "timestamp": ("timestamp", "time", "date", "datetime"),
+    "usd_per_ounce": ("usd_per_ounce", "gold_close", "close"),
+    "usd_pkr_rate": ("usd_pkr_rate", "fx_close", "pkr_close"),
+}
+
+PRICE_FIELDS = [
+    "usd_per_ounce",
+    "usd_pkr_rate",
+    "pkr_per_ounce_raw",
+    "pkr_per_gram_raw",
+    "pkr_per_tola_raw",
+    "pkr_per_ounce_final",
+    "pkr_per_gram_final",
+    "pkr_per_tola_final",
+]
+
+
+def _parse_timestamp(value):
+    value = value.strip()
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return int(parsed.timestamp())
+
+
+def load_csv(path):
+    """
+    Reads a CSV with a header row: timestamp (ISO 8601, UTC when naive,
+    or epoch seconds), gold close (USD/oz) and USD/PKR close.
+    Returns numpy arrays (epoch_seconds, usd_per_ounce, usd_pkr_rate).
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader)]
+
+        positions = {}
+        for field, aliases in CSV_COLUMNS.items():
+            match = next((header.index(a) for a in aliases if a in header), None)
+            if match is None:
+                raise ValueError(f"CSV is missing a {field} column (one of: {', '.join(aliases)})")
+            positions[field] = match
+
+        stamps, gold, fx = [], [], []
+        for row in reader:
+            if not row:
+                continue
+            stamps.append(_parse_timestamp(row[positions["timestamp"]]))
+            gold.append(row[positions["usd_per_ounce"]] or "nan")
+            fx.append(row[positions["usd_pkr_rate"]] or "nan")
+
+    from .providers import align_series
+
+    ts = np.array(stamps, dtype=np.int64)
+    return align_series(ts, np.array(gold, dtype=np.float64), ts, np.array(fx, dtype=np.float64))
+
+
+def compute_series(usd_per_ounce, usd_pkr_rate, margin_multiplier):
+    """
+    Vectorized GoldPriceService.compute_prices(): the whole series in
+    one pass, rounded to the 4 decimals the DB stores.
+    """
+    multiplier = float(margin_multiplier)
+
+    pkr_per_ounce = usd_per_ounce * usd_pkr_rate
+    pkr_per_gram = pkr_per_ounce / float(GoldPriceService.OUNCE_TO_GRAM)
+    pkr_per_tola = pkr_per_gram * float(GoldPriceService.GRAM_PER_TOLA)
+
+    computed = {
+        "usd_per_ounce": usd_per_ounce,
+        "usd_pkr_rate": usd_pkr_rate,
+
+        "pkr_per_ounce_raw": pkr_per_ounce,
+        "pkr_per_gram_raw": pkr_per_gram,
+        "pkr_per_tola_raw": pkr_per_tola,
+
+        "pkr_per_ounce_final": pkr_per_ounce * multiplier,
+        "pkr_per_gram_final": pkr_per_gram * multiplier,
+        "pkr_per_tola_final": pkr_per_tola * multiplier,
+    }
+    return {field: np.round(values, 4) for field, values in computed.items()}
+
+
+# --------------------------------------------
+# SNAPSHOT BACKFILL
+# --------------------------------------------
+class SnapshotBackfill:
+    """
+    Seeds GoldPriceSnapshot for past periods from a bulk price series:
+    1. Drops bars whose second already has a snapshot (re-runs are safe)
+    2. Computes raw + final PKR prices for the whole series at once,
+       using the current config's margin multiplier
+    3. Writes rows with multi-row INSERTs, one transaction per chunk
+    4. Rebuilds candles and recomputes DailyClosingPrice for the covered
+       days
+    """
+
+    def __init__(self, chunk_size=5000):
+        self.chunk_size = chunk_size
+
+    def run(self, epoch, usd_per_ounce, usd_pkr_rate, dry_run=False):
+        report = {"rows": 0, "skipped": 0, "candles": 0, "closes": 0, "timings": {}}
+        if len(epoch) == 0:
+            return report
+
+        started = time.monotonic()
+        first_day = timezone.localtime(self._datetime(epoch[0])).date()
+        last_day = timezone.localtime(self._datetime(epoch[-1])).date()
+        report["first_day"], report["last_day"] = first_day, last_day
+
+        existing = np.fromiter(
+            (
+                int(ts.timestamp())
+                for ts in GoldPriceSnapshot.objects
+                .filter(
+                    timestamp__gte=self._datetime(epoch[0]),
+                    timestamp__lt=self._datetime(epoch[-1] + 1),
+                )
+                .values_list("timestamp", flat=True)
+                .iterator(chunk_size=self.chunk_size)
+            ),
+            dtype=np.int64,
+        )
+        new = ~np.isin(epoch, existing)
+        report["skipped"] = int(len(epoch) - new.sum())
+        epoch, usd_per_ounce, usd_pkr_rate = epoch[new], usd_per_ounce[new], usd_pkr_rate[new]
+
+        computed = compute_series(usd_per_ounce, usd_pkr_rate, PricingConfigCache.get()["margin_multiplier"])
+        report["timings"]["compute"] = round(time.monotonic() - started, 3)
+        report["rows"] = len(epoch)
+        if dry_run or not len(epoch):
+            return report
+
+        step = time.monotonic()
+        self._insert(epoch, computed)
+        report["timings"]["insert"] = round(time.monotonic() - step, 3)
+
+        step = time.monotonic()
+        report["candles"] = CandleRollup.rebuild(first_day, last_day, batch_size=self.chunk_size)
+        report["timings"]["candles"] = round(time.monotonic() - step, 3)
+
+        step = time.monotonic()
+        report["closes"] = ClosingPriceEngine.recompute(first_day, last_day)["days"]
+        report["timings"]["closes"] = round(time.monotonic() - step, 3)
+
+        report["timings"]["total"] = round(time.monotonic() - started, 3)
+        return report
+
+    @staticmethod
+    def _datetime(epoch_seconds):
+        return datetime.fromtimestamp(int(epoch_seconds), tz=dt_timezone.utc)
+
+    def _insert(self, epoch, computed):
+        """
+        Multi-row INSERTs straight from the computed columns. Skips
+        per-instance model/field preparation, which dominates bulk_create
+        time at this volume. That also skips the field validation
+        bulk_create would do (e.g. max_digits): the series must already
+        be clean.
+        Prices are bound as fixed-point text with each field's
+        decimal_places (what Django binds for a Decimal), never as
+        floats, so every backend stores the same digits.
+        """
+        fields = [GoldPriceSnapshot._meta.get_field(name) for name in ["timestamp", *PRICE_FIELDS]]
+        quote = connection.ops.quote_name
+        per_statement = connection.ops.bulk_batch_size(fields, range(self.chunk_size)) or 1
+        sql = (
+            f"INSERT INTO {quote(GoldPriceSnapshot._meta.db_table)} "
+            f"({', '.join(quote(f.column) for f in fields)}) VALUES "
+        )
+        placeholder = f"({', '.join(['%s'] * len(fields))})"
+
+        # UTC timestamps as text: naive for SQLite (Django's storage
+        # format), with an explicit offset everywhere else
+        stamps = np.datetime_as_string(epoch.astype("datetime64[s]"), unit="s")
+        stamps = np.char.replace(stamps, "T", " ")
+        if connection.vendor != "sqlite":
+            stamps = np.char.add(stamps, "+00:00")
+        stamps = stamps.tolist()
+        prices = list(zip(*(
+            np.char.mod(f"%.{field.decimal_places}f", computed[field.name]).tolist()
+            for field in fields[1:]
+        )))
+
+        for offset in range(0, len(stamps), self.chunk_size):
+            end = min(offset + self.chunk_size, len(stamps))
+            with transaction.atomic(), connection.cursor() as cursor:
+                for start in range(offset, end, per_statement):
+                    stop = min(start + per_statement, end)
+                    params = []
+                    for ts, values in zip(stamps[start:stop], prices[start:stop]):
+                        params.append(ts)
+                        params.extend(values)
+                    cursor.execute(sql + ", ".join([placeholder] * (stop - start)), params)
@@ -0,0 +1,339 @@
+import math
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import GoldPriceSnapshot, GoldPriceConfig
+
+
+# Snapshots older than this are flagged as stale in API responses
+STALE_AFTER_SECONDS = 180
+
+# How long a worker trusts its process-local copy before re-checking
+# the shared cache for a snapshot written by another process.
+LOCAL_TTL_SECONDS = 1.0
+
+SHARED_CACHE_KEY = "market:latest_price"
+# The shared entry expires after this many poll intervals, so a worker
+# that missed an update (or a dead poller) falls back to the DB
+SHARED_TTL_POLL_INTERVALS = 2
+CONFIG_VERSION_KEY = "market:config_version"
+
+HUNDRED = Decimal("100")
+ONE = Decimal("1.00")
+
+
+def cache_is_process_local():
+    """
+    True when Django's cache is not shared between processes (locmem,
+    dummy). Workers then compare against the DB instead of the cache.
+    """
+    return isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def is_stale(snapshot, now=None):
+    now = now or timezone.now()
+    return (now - snapshot.timestamp).total_seconds() > STALE_AFTER_SECONDS
+
+
+def seconds_until_next_snapshot(last_timestamp, now=None):
+    """
+    Expected seconds until the poller stores the snapshot after the one
+    taken at last_timestamp (>= 1). A late poller gets a 1 second floor,
+    so caches keep revalidating.
+    """
+    if last_timestamp is None:
+        return 1
+    now = now or timezone.now()
+    interval = settings.GOLD_PRICE_POLL_INTERVAL_SECONDS
+    age = (now - last_timestamp).total_seconds()
+    return max(1, min(interval, math.ceil(interval - age)))
+
+
+def build_price_payload(snapshot, pricing, stale):
+    """
+    Response body for /api/market/gold-price/.
+    """
+    return {
+        "timestamp": snapshot.timestamp,
+        "is_stale": stale,
+
+        "usd_per_ounce": snapshot.usd_per_ounce,
+        "usd_pkr_rate": snapshot.usd_pkr_rate,
+
+        "pkr_per_ounce_raw": snapshot.pkr_per_ounce_raw,
+        "pkr_per_gram_raw": snapshot.pkr_per_gram_raw,
+        "pkr_per_tola_raw": snapshot.pkr_per_tola_raw,
+
+        "pkr_per_ounce_final": snapshot.pkr_per_ounce_final,
+        "pkr_per_gram_final": snapshot.pkr_per_gram_final,
+        "pkr_per_tola_final": snapshot.pkr_per_tola_final,
+
+        "margins": {
+            "safeguard_margin": pricing["safeguard_margin"],
+            "spread_margin": pricing["spread_margin"],
+        }
+    }
+
+
+def normalize_decimals(snapshot):
+    """
+    Round Decimal fields to the precision the DB stores, so a freshly
+    created instance serves exactly what a DB read would.
+    """
+    for field in snapshot._meta.concrete_fields:
+        decimal_places = getattr(field, "decimal_places", None)
+        value = getattr(snapshot, field.attname)
+        if decimal_places is not None and isinstance(value, Decimal):
+            setattr(snapshot, field.attname, value.quantize(Decimal(1).scaleb(-decimal_places)))
+
+
+# --------------------------------------------
+# PRICING CONFIG CACHE
+# --------------------------------------------
+def bump_config_version():
+    """
+    Called on commit of GoldPriceConfig.save()/delete(). Every worker
+    reloads the config on its next read after the bump.
+    """
+    PricingConfigCache.clear()
+    try:
+        return cache.incr(CONFIG_VERSION_KEY)
+    except ValueError:
+        # Key missing (first bump or evicted); start a fresh sequence
+        # that cannot collide with a version a worker may still hold.
+        version = time.time_ns()
+        cache.set(CONFIG_VERSION_KEY, version, None)
+        return version
+
+
+def config_row_version(pk, updated_at):
+    return f"{pk}.{int(updated_at.timestamp() * 1_000_000)}"
+
+
+def get_config_version():
+    if cache_is_process_local():
+        # A bump in another process never reaches this cache; the
+        # active row's updated_at is the version instead
+        row = (
+            GoldPriceConfig.objects.filter(is_active=True)
+            .order_by("-updated_at")
+            .values_list("pk", "updated_at")
+            .first()
+        )
+        return config_row_version(*row) if row else None
+
+    version = cache.get(CONFIG_VERSION_KEY)
+    if version is None:
+        cache.add(CONFIG_VERSION_KEY, 1, None)
+        version = cache.get(CONFIG_VERSION_KEY, 1)
+    return version
+
+
+class PricingConfigCache:
+    """
+    Process-local GoldPriceConfig, reloaded only when the shared version
+    counter changes (or, with a process-local cache, the active row's
+    updated_at). Margin multiplier and fee fractions are computed
+    once per version:
+    - margin_multiplier = (1 + safeguard%) * (1 + spread%)
+    - buy_fee_rate / sell_fee_rate = fee% / 100
+    """
+
+    _lock = threading.Lock()
+    _current = None
+    _checked_at = 0.0
+
+    @classmethod
+    def get(cls):
+        current = cls._current
+        now = time.monotonic()
+        if current is not None and now - cls._checked_at < LOCAL_TTL_SECONDS:
+            return current
+
+        if current is None or current["version"] != get_config_version():
+            current = cls._build()
+
+        with cls._lock:
+            cls._current = current
+            cls._checked_at = now
+        return current
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._current = None
+            cls._checked_at = 0.0
+
+    @staticmethod
+    def _build():
+        if cache_is_process_local():
+            config = GoldPriceConfig.load()
+            version = config_row_version(config.pk, config.updated_at)
+        else:
+            # Version first: a bump during the load only causes a reload
+            version = get_config_version()
+            config = GoldPriceConfig.load()
+        safeguard = ONE + config.safeguard_margin / HUNDRED
+        spread = ONE + config.spread_margin / HUNDRED
+
+        return {
+            "version": version,
+            "config": config,
+
+            "min_buy_amount_pkr": config.min_buy_amount_pkr,
+            "lock_duration_seconds": config.lock_duration_seconds,
+
+            "safeguard_margin": config.safeguard_margin,
+            "spread_margin": config.spread_margin,
+            "margin_multiplier": safeguard * spread,
+
+            "buy_fee_percentage": config.buy_fee_percentage,
+            "sell_fee_percentage": config.sell_fee_percentage,
+            "buy_fee_rate": config.buy_fee_percentage / HUNDRED,
+            "sell_fee_rate": config.sell_fee_percentage / HUNDRED,
+        }
+
+
+# --------------------------------------------
+# LATEST PRICE CACHE
+# --------------------------------------------
+class LatestPriceCache:
+    """
+    Latest GoldPriceSnapshot + pre-rendered /gold-price/ bodies.
+    - Process-local copy (no I/O on the hot path)
+    - Shared copy in Django's cache, so web workers see snapshots
+      written by the poller process; it expires after two poll intervals
+    - Falls back to the DB when both are empty. With a process-local
+      cache the DB is checked every LOCAL_TTL_SECONDS instead (slower,
+      but never stuck on an old snapshot)
+
+    Both is_stale variants of the body are rendered up front, so a read
+    only has to pick one based on the snapshot age at request time.
+    Bodies embed the margins, so they are re-rendered when the config
+    version changes.
+    """
+
+    _lock = threading.Lock()
+    _entry = None
+    _checked_at = 0.0
+
+    @classmethod
+    def store(cls, snapshot):
+        normalize_decimals(snapshot)
+        entry = cls._build_entry(snapshot)
+        timeout = SHARED_TTL_POLL_INTERVALS * settings.GOLD_PRICE_POLL_INTERVAL_SECONDS
+        cache.set(SHARED_CACHE_KEY, entry, timeout)
+        cls._set_local(entry)
+        return entry
+
+    @classmethod
+    def get_snapshot(cls):
+        entry = cls._get_entry()
+        return entry["snapshot"] if entry else None
+
+    @classmethod
+    def get_body(cls):
+        """
+        Returns the JSON body (bytes) for the latest snapshot, or None.
+        """
+        entry = cls._get_entry()
+        if not entry:
+            return None
+        if entry["config_version"] != PricingConfigCache.get()["version"]:
+            entry = cls.store(entry["snapshot"])
+        return entry["bodies"][is_stale(entry["snapshot"])]
+
+    @classmethod
+    def get_response_parts(cls, now=None):
+        """
+        Body plus HTTP validators for the latest snapshot, or None:
+        - etag: snapshot id + config version + is_stale variant
+        - last_modified: snapshot time (or when it turned stale)
+        - max_age: seconds until the next expected snapshot
+        """
+        entry = cls._get_entry()
+        if not entry:
+            return None
+        if entry["config_version"] != PricingConfigCache.get()["version"]:
+            entry = cls.store(entry["snapshot"])
+
+        now = now or timezone.now()
+        snapshot = entry["snapshot"]
+        stale = is_stale(snapshot, now)
+        last_modified = snapshot.timestamp
+        if stale:
+            last_modified += timedelta(seconds=STALE_AFTER_SECONDS)
+
+        return {
+            "body": entry["bodies"][stale],
+            "etag": f'"{snapshot.pk}-{entry["config_version"]}-{int(stale)}"',
+            "last_modified": last_modified,
+            "max_age": seconds_until_next_snapshot(snapshot.timestamp, now),
+        }
+
+    @classmethod
+    def invalidate(cls):
+        cache.delete(SHARED_CACHE_KEY)
+        with cls._lock:
+            cls._entry = None
+            cls._checked_at = 0.0
+
+    # --------------------------------------------
+    # Internals
+    # --------------------------------------------
+    @classmethod
+    def _build_entry(cls, snapshot):
+        pricing = PricingConfigCache.get()
+        renderer = JSONRenderer()
+        return {
+            "snapshot": snapshot,
+            "config_version": pricing["version"],
+            "bodies": {
+                stale: renderer.render(build_price_payload(snapshot, pricing, stale))
+                for stale in (False, True)
+            },
+        }
+
+    @classmethod
+    def _set_local(cls, entry):
+        with cls._lock:
+            current = cls._entry
+            if current is None or current["snapshot"].timestamp <= entry["snapshot"].timestamp:
+                cls._entry = entry
+            cls._checked_at = time.monotonic()
+
+    @classmethod
+    def _get_entry(cls):
+        entry = cls._entry
+        if entry is not None and time.monotonic() - cls._checked_at < LOCAL_TTL_SECONDS:
+            return entry
+
+        if not cache_is_process_local():
+            shared = cache.get(SHARED_CACHE_KEY)
+            if shared is not None:
+                cls._set_local(shared)
+                return cls._entry
+
+        # Look at recent rows first so only the newest partition is scanned
+        recent = GoldPriceSnapshot.objects.filter(timestamp__gte=timezone.now() - timedelta(days=2))
+        snapshot = (
+            recent.order_by("-timestamp").first()
+            or GoldPriceSnapshot.objects.order_by("-timestamp").first()
+        )
+        if not snapshot:
+            return None
+        if entry is not None and entry["snapshot"].pk == snapshot.pk:
+            # Unchanged: keep the rendered bodies
+            cls._set_local(entry)
+            return entry
+
+        return cls.store(snapshot)
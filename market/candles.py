@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import GoldPriceSnapshot, PriceCandle
+
+
+# Fixed-width buckets, aligned to the epoch. Daily buckets follow the
+# local (Asia/Karachi) calendar day instead.
+BUCKET_SECONDS = {
+    PriceCandle.RESOLUTION_5M: 5 * 60,
+    PriceCandle.RESOLUTION_1H: 60 * 60,
+}
+
+RESOLUTIONS = [
+    PriceCandle.RESOLUTION_5M,
+    PriceCandle.RESOLUTION_1H,
+    PriceCandle.RESOLUTION_1D,
+]
+
+CANDLE_FIELDS = ["open", "high", "low", "close", "open_timestamp", "close_timestamp", "sample_count"]
+
+
+def bucket_start(resolution, timestamp):
+    if resolution == PriceCandle.RESOLUTION_1D:
+        local = timezone.localtime(timestamp)
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    step = BUCKET_SECONDS[resolution]
+    seconds = int(timestamp.timestamp())
+    return datetime.fromtimestamp(seconds - seconds % step, tz=dt_timezone.utc)
+
+
+def bucket_end(resolution, start):
+    if resolution == PriceCandle.RESOLUTION_1D:
+        return local_day_start(timezone.localtime(start).date() + timedelta(days=1))
+    return start + timedelta(seconds=BUCKET_SECONDS[resolution])
+
+
+def local_day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+# --------------------------------------------
+# CANDLE ROLLUP
+# --------------------------------------------
+class CandleRollup:
+    """
+    Keeps PriceCandle rows in sync with GoldPriceSnapshot.
+    - apply_snapshot(): incremental, one conditional UPDATE per resolution
+    - rebuild(): full recompute for a range of local days (backfill)
+    """
+
+    @staticmethod
+    def apply_snapshot(snapshot):
+        price = snapshot.pkr_per_gram_final
+        ts = snapshot.timestamp
+
+        for resolution in RESOLUTIONS:
+            CandleRollup._merge(resolution, bucket_start(resolution, ts), price, ts)
+
+    @staticmethod
+    def _merge(resolution, start, price, ts):
+        bucket = PriceCandle.objects.filter(resolution=resolution, bucket_start=start)
+        price_value = Value(price, output_field=models.DecimalField(max_digits=18, decimal_places=4))
+        ts_value = Value(ts, output_field=models.DateTimeField())
+
+        updated = bucket.update(
+            high=Greatest("high", price_value),
+            low=Least("low", price_value),
+            open=Case(When(open_timestamp__gt=ts, then=price_value), default=F("open")),
+            close=Case(When(close_timestamp__lte=ts, then=price_value), default=F("close")),
+            open_timestamp=Least("open_timestamp", ts_value),
+            close_timestamp=Greatest("close_timestamp", ts_value),
+            sample_count=F("sample_count") + 1,
+        )
+        if updated:
+            return
+
+        try:
+            with transaction.atomic():
+                PriceCandle.objects.create(
+                    resolution=resolution,
+                    bucket_start=start,
+                    open=price,
+                    high=price,
+                    low=price,
+                    close=price,
+                    open_timestamp=ts,
+                    close_timestamp=ts,
+                    sample_count=1,
+                )
+        except IntegrityError:
+            # Another writer created the bucket first; merge into it
+            CandleRollup._merge(resolution, start, price, ts)
+
+    @staticmethod
+    def rebuild(start_day, end_day, resolutions=None, batch_size=1000):
+        """
+        Recomputes candles for local days start_day..end_day (inclusive)
+        from raw snapshots in one ordered pass. Whole days are rebuilt, so
+        every touched bucket is fully covered. A stored candle built from
+        more samples is kept: retention has thinned its snapshots since.
+        Returns candles written.
+        """
+        resolutions = resolutions or RESOLUTIONS
+        range_start = local_day_start(start_day)
+        range_end = local_day_start(end_day + timedelta(days=1))
+
+        snapshots = (
+            GoldPriceSnapshot.objects
+            .filter(timestamp__gte=range_start, timestamp__lt=range_end)
+            .order_by("timestamp")
+            .values_list("timestamp", "pkr_per_gram_final")
+            .iterator(chunk_size=5000)
+        )
+
+        candles = []
+        # Rows arrive in time order, so each resolution only needs its
+        # open bucket; bucket boundaries are computed once per bucket
+        current = {resolution: None for resolution in resolutions}
+        current_end = {resolution: None for resolution in resolutions}
+
+        for ts, price in snapshots:
+            for resolution in resolutions:
+                candle = current[resolution]
+                if candle is None or ts >= current_end[resolution]:
+                    start = bucket_start(resolution, ts)
+                    candle = PriceCandle(
+                        resolution=resolution,
+                        bucket_start=start,
+                        open=price,
+                        high=price,
+                        low=price,
+                        close=price,
+                        open_timestamp=ts,
+                        close_timestamp=ts,
+                        sample_count=1,
+                    )
+                    candles.append(candle)
+                    current[resolution] = candle
+                    current_end[resolution] = bucket_end(resolution, start)
+                    continue
+
+                if price > candle.high:
+                    candle.high = price
+                elif price < candle.low:
+                    candle.low = price
+                candle.close = price
+                candle.close_timestamp = ts
+                candle.sample_count += 1
+
+        # Past the full-resolution window retention keeps one snapshot
+        # per hour; never replace a candle with one built from fewer
+        stored = {
+            (resolution, start): count
+            for resolution, start, count in PriceCandle.objects.filter(
+                resolution__in=resolutions, bucket_start__gte=range_start, bucket_start__lt=range_end,
+            ).values_list("resolution", "bucket_start", "sample_count")
+        }
+        candles = [c for c in candles if c.sample_count >= stored.get((c.resolution, c.bucket_start), 0)]
+
+        PriceCandle.objects.bulk_create(
+            candles,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["resolution", "bucket_start"],
+            update_fields=CANDLE_FIELDS,
+        )
+        return len(candles)
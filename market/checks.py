@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .cache import cache_is_process_local
+
+
+@register(Tags.caches)
+def check_shared_price_cache(app_configs, **kwargs):
+    """
+    With the poller in its own process (poll_gold_price), web workers
+    only hear about new snapshots and config changes through a shared
+    cache. A locmem cache still works (every worker re-reads the DB each
+    second) but should not be what a server runs on. A warning, so
+    migrate and other commands still run before the cache is set up.
+    """
+    if settings.DJANGO_ENV == "local" or settings.MARKET_SCHEDULER_IN_WEB:
+        return []
+    if not cache_is_process_local():
+        return []
+    return [
+        Warning(
+            "CACHES['default'] is process-local but prices are polled in a separate process.",
+            hint="Set CACHE_URL to a shared cache (e.g. rediscache://127.0.0.1:6379/1).",
+            id="market.W001",
+        )
+    ]
@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber, TruncDate
+from django.utils import timezone
+
+from .candles import local_day_start
+from .models import DailyClosingPrice, GoldPriceSnapshot
+
+
+CLOSE_FIELDS = ["closing_ounce", "closing_gram", "closing_tola", "source_snapshot"]
+
+
+# --------------------------------------------
+# CLOSING PRICE ENGINE
+# --------------------------------------------
+class ClosingPriceEngine:
+    """
+    DailyClosingPrice = final prices of the last snapshot of each local
+    (Asia/Karachi) day.
+    - last_snapshots(): one window-function query over a plain timestamp
+      range (index/partition friendly), ROW_NUMBER() per local day
+    - recompute(): upserts every day of a range in bulk, so missed
+      nightly runs can be filled in later
+    """
+
+    @staticmethod
+    def last_snapshots(start_day, end_day):
+        """
+        Values rows (id, timestamp, day, final prices) of the last snapshot
+        of every local day start_day..end_day (inclusive) that has data.
+        """
+        local_day = TruncDate("timestamp", tzinfo=timezone.get_current_timezone())
+
+        return (
+            GoldPriceSnapshot.objects
+            .filter(
+                timestamp__gte=local_day_start(start_day),
+                timestamp__lt=local_day_start(end_day + timedelta(days=1)),
+            )
+            .annotate(
+                day=local_day,
+                position=Window(
+                    RowNumber(),
+                    partition_by=[local_day],
+                    order_by=[F("timestamp").desc(), F("id").desc()],
+                ),
+            )
+            .filter(position=1)
+            .order_by("day")
+            .values(
+                "id",
+                "timestamp",
+                "day",
+                "pkr_per_ounce_final",
+                "pkr_per_gram_final",
+                "pkr_per_tola_final",
+            )
+        )
+
+    @classmethod
+    def recompute(cls, start_day, end_day, batch_size=500):
+        """
+        Upserts DailyClosingPrice for start_day..end_day. Days without any
+        snapshot are reported as missing and left untouched.
+        """
+        started = time.monotonic()
+
+        closes = [
+            DailyClosingPrice(
+                date=row["day"],
+                closing_ounce=row["pkr_per_ounce_final"],
+                closing_gram=row["pkr_per_gram_final"],
+                closing_tola=row["pkr_per_tola_final"],
+                source_snapshot_id=row["id"],
+            )
+            for row in cls.last_snapshots(start_day, end_day)
+        ]
+
+        DailyClosingPrice.objects.bulk_create(
+            closes,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["date"],
+            update_fields=CLOSE_FIELDS,
+        )
+
+        covered = {close.date for close in closes}
+        days = (end_day - start_day).days + 1
+        missing = [
+            start_day + timedelta(days=i)
+            for i in range(days)
+            if start_day + timedelta(days=i) not in covered
+        ]
+
+        return {
+            "days": len(closes),
+            "missing": missing,
+            "seconds": round(time.monotonic() - started, 3),
+        }
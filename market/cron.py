@@ -1,8 +1,15 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.utils import timezone
 from .services import GoldPriceService
-from .models import DailyClosingPrice, GoldPriceSnapshot
+from .closing import ClosingPriceEngine
+from .leader import leader_only
+from .retention import SnapshotRetention
+from . import partitions
 
 
+@leader_only
 def fetch_gold_snapshot():
     """
     Runs every 60 seconds via APScheduler:
@@ -14,38 +21,57 @@ def fetch_gold_snapshot():
         service = GoldPriceService()
         snapshot = service.fetch_and_store_snapshot()
 
-        print(f"[APScheduler] Snapshot saved @ {snapshot.timestamp}")
+        print(
+            f"[APScheduler] Snapshot saved @ {snapshot.timestamp} "
+            f"via {service.last_provider} (fetch timings: {service.last_timings})"
+        )
 
     except Exception as e:
-        print(f"[APScheduler] ERROR in fetch_gold_snapshot: {e}")
+        print(f"[APScheduler] ERROR in fetch_gold_snapshot: {e} (fetch timings: {service.last_timings})")
 
 
+@leader_only
 def generate_daily_closing_price():
     """
     Runs once per day at 23:59:
-    - Picks the last snapshot of the day
-    - Stores daily closing prices
+    - Recomputes the closes of today and the previous
+      MARKET_CLOSING_RECOMPUTE_DAYS - 1 days (heals missed runs)
+    - One window query + one bulk upsert
     """
     today = timezone.localdate()
-    last_snapshot = (
-        GoldPriceSnapshot.objects
-        .filter(timestamp__date=today)
-        .order_by("-timestamp")
-        .first()
-    )
+    start_day = today - timedelta(days=settings.MARKET_CLOSING_RECOMPUTE_DAYS - 1)
+    report = ClosingPriceEngine.recompute(start_day, today)
 
-    if not last_snapshot:
+    if today in report["missing"]:
         print("[APScheduler] No snapshots for today.")
-        return
-
-    DailyClosingPrice.objects.update_or_create(
-        date=today,
-        defaults={
-            "closing_ounce": last_snapshot.pkr_per_ounce_final,
-            "closing_gram": last_snapshot.pkr_per_gram_final,
-            "closing_tola": last_snapshot.pkr_per_tola_final,
-            "source_snapshot": last_snapshot,
-        },
+
+    print(
+        f"[APScheduler] Daily closing prices saved for {report['days']} day(s) "
+        f"{start_day}..{today} in {report['seconds']}s."
+    )
+
+
+@leader_only
+def prune_gold_snapshots():
+    """
+    Runs once per day at 03:30:
+    - Downsamples snapshots past the full-resolution window
+    - Deletes snapshots past the retention horizon
+    """
+    report = SnapshotRetention().run()
+
+    print(
+        f"[APScheduler] Snapshot retention: {report['rows']} rows "
+        f"(~{report['bytes_estimate']} bytes) reclaimed in {report['seconds']}s."
     )
 
-    print(f"[APScheduler] Daily closing price saved for {today}.")
+
+@leader_only
+def maintain_snapshot_partitions():
+    """
+    Runs once per day at 00:15:
+    - Keeps monthly snapshot partitions created ahead of time (Postgres)
+    """
+    created = partitions.ensure_partitions(timezone.now().date())
+    if created:
+        print(f"[APScheduler] Created snapshot partitions: {', '.join(created)}")
@@ -0,0 +1,177 @@
+import functools
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .models import SchedulerLease
+
+
+SCHEDULER_LEASE = "market-scheduler"
+
+
+def make_holder_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# --------------------------------------------
+# LEADER LEASE
+# --------------------------------------------
+class LeaderLease:
+    """
+    Leader election on a SchedulerLease row (works on SQLite and Postgres).
+    - acquire/renew is ONE conditional UPDATE: succeeds only if we already
+      hold the lease or it has expired; expiry uses the DB clock, so node
+      clock skew does not matter
+    - start() runs a heartbeat thread renewing every ttl/3; a standby
+      retries at the same pace and takes over within ~ttl of a leader dying
+    - is_leader also checks a local monotonic deadline, so a leader that
+      cannot reach the DB stops acting before its lease can be taken
+    """
+
+    def __init__(self, name=SCHEDULER_LEASE, ttl_seconds=None, holder=None, log=print):
+        self.name = name
+        self.ttl_seconds = ttl_seconds or settings.MARKET_LEADER_LEASE_SECONDS
+        self.holder = holder or make_holder_id()
+        self.log = log
+
+        self._valid_until = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_leader(self):
+        return time.monotonic() < self._valid_until
+
+    def try_acquire(self):
+        """
+        Acquires or renews the lease. Returns True while we hold it.
+        """
+        was_leader = self.is_leader
+        attempt_started = time.monotonic()
+        ttl = timedelta(seconds=self.ttl_seconds)
+
+        lease = SchedulerLease.objects.filter(name=self.name)
+        updated = lease.filter(Q(holder=self.holder) | Q(expires_at__lt=Now()) | Q(expires_at__isnull=True)).update(
+            acquired_at=Case(When(holder=self.holder, then=F("acquired_at")), default=Now()),
+            holder=self.holder,
+            renewed_at=Now(),
+            expires_at=Now() + ttl,
+        )
+
+        if not updated and not lease.exists():
+            try:
+                with transaction.atomic():
+                    SchedulerLease.objects.create(name=self.name)
+            except IntegrityError:
+                pass  # Another node created it first
+            return self.try_acquire()
+
+        if updated:
+            # One second of slack for the round trip and clock rate
+            self._valid_until = attempt_started + self.ttl_seconds - 1
+            if not was_leader:
+                self.log(f"[Leader] {self.holder} acquired lease '{self.name}'.")
+        else:
+            self._valid_until = 0.0
+            if was_leader:
+                self.log(f"[Leader] {self.holder} lost lease '{self.name}'.")
+        return bool(updated)
+
+    def release(self):
+        self._valid_until = 0.0
+        SchedulerLease.objects.filter(name=self.name, holder=self.holder).update(
+            holder="",
+            expires_at=Now(),
+        )
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        try:
+            # First attempt inline, so callers know the role right away
+            self.try_acquire()
+        except Exception as e:
+            self.log(f"[Leader] ERROR acquiring lease '{self.name}': {e}")
+        self._thread = threading.Thread(target=self._heartbeat, name=f"lease-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, release=True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.ttl_seconds)
+            self._thread = None
+        if release:
+            self.release()
+            self.log(f"[Leader] {self.holder} released lease '{self.name}'.")
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.ttl_seconds / 3):
+            try:
+                self.try_acquire()
+            except Exception as e:
+                self.log(f"[Leader] ERROR renewing lease '{self.name}': {e}")
+            finally:
+                close_old_connections()
+
+
+_lease = None
+_lease_lock = threading.Lock()
+
+
+def get_scheduler_lease():
+    """
+    The process-wide lease guarding polling and the scheduled jobs.
+    """
+    global _lease
+    with _lease_lock:
+        if _lease is None:
+            _lease = LeaderLease()
+        return _lease
+
+
+def leader_only(func):
+    """
+    Job decorator: runs func only in the process holding the scheduler
+    lease. Without a heartbeat running, one acquire attempt is made.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        lease = get_scheduler_lease()
+        if not (lease.is_leader or lease.try_acquire()):
+            print(f"[APScheduler] Skipping {func.__name__}: not the leader (standby).")
+            return None
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def lease_status():
+    """
+    Every lease row plus whether this process is the holder.
+    """
+    now = timezone.now()
+    local = _lease
+    return [
+        {
+            "name": lease.name,
+            "holder": lease.holder or None,
+            "acquired_at": lease.acquired_at,
+            "renewed_at": lease.renewed_at,
+            "expires_at": lease.expires_at,
+            "active": bool(lease.holder and lease.expires_at and lease.expires_at > now),
+            "seconds_left": max(0.0, round((lease.expires_at - now).total_seconds(), 1)) if lease.expires_at else 0.0,
+            "held_by_this_process": bool(local and local.name == lease.name and local.holder == lease.holder and local.is_leader),
+        }
+        for lease in SchedulerLease.objects.order_by("name")
+    ]
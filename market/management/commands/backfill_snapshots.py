@@ -0,0 +1,89 @@
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from market.backfill import SnapshotBackfill, load_csv
+from market.providers import HISTORY_INTERVALS, PROVIDERS
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds historical gold price snapshots from a CSV or a provider's price "
+        "history, then rebuilds candles and daily closes for the covered days."
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument(
+            "--csv",
+            help="CSV with timestamp, usd_per_ounce (or gold_close) and usd_pkr_rate (or fx_close) columns.",
+        )
+        source.add_argument(
+            "--provider",
+            choices=sorted(PROVIDERS),
+            help="Download bar closes from this provider.",
+        )
+        parser.add_argument("--start", help="First day (YYYY-MM-DD, UTC) for --provider.")
+        parser.add_argument("--end", help="Last day (YYYY-MM-DD, UTC, inclusive) for --provider.")
+        parser.add_argument(
+            "--interval",
+            default="1m",
+            choices=list(HISTORY_INTERVALS),
+            help="Bar size for --provider (default 1m; Yahoo keeps 1m bars for ~30 days only).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Rows per bulk insert (default 5000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Load and compute only; write nothing.",
+        )
+
+    def handle(self, *args, **options):
+        if options["csv"]:
+            try:
+                epoch, gold, fx = load_csv(options["csv"])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['csv']}: {e}")
+        else:
+            start, end = self._day(options["start"], "--start"), self._day(options["end"], "--end")
+            if start > end:
+                raise CommandError("--start must not be after --end.")
+
+            provider = PROVIDERS[options["provider"]]()
+            epoch, gold, fx = provider.fetch_history(
+                datetime.combine(start, time.min, tzinfo=dt_timezone.utc),
+                datetime.combine(end, time.max, tzinfo=dt_timezone.utc),
+                interval=options["interval"],
+            )
+
+        self.stdout.write(f"Loaded {len(epoch)} bars.")
+
+        report = SnapshotBackfill(chunk_size=options["chunk_size"]).run(
+            epoch, gold, fx, dry_run=options["dry_run"]
+        )
+
+        if not report["rows"]:
+            self.stdout.write(self.style.WARNING(f"Nothing to insert ({report['skipped']} bars already stored)."))
+            return
+
+        prefix = "Would insert" if options["dry_run"] else "Inserted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {report['rows']} snapshots for {report['first_day']}..{report['last_day']} "
+                f"(skipped {report['skipped']} existing) | Candles: {report['candles']} | "
+                f"Daily closes: {report['closes']} | Timings: {report['timings']}"
+            )
+        )
+
+    @staticmethod
+    def _day(value, option):
+        day = parse_date(value) if value else None
+        if day is None:
+            raise CommandError(f"{option} (YYYY-MM-DD) is required with --provider.")
+        return day
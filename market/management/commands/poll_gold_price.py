@@ -1,51 +1,73 @@
-import time
+import signal
+import threading
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from market.services import GoldPriceService
+
+from market.leader import get_scheduler_lease
+from market.worker import PricePoller
+
 
 class Command(BaseCommand):
-    help = "Polls gold price via Selenium scraping periodically and stores snapshots."
+    help = (
+        "Price worker: polls live gold prices on a fixed schedule and stores snapshots. "
+        "Run one per node, outside the web workers; only the lease holder polls."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--interval",
+            type=float,
+            default=settings.GOLD_PRICE_POLL_INTERVAL_SECONDS,
+            help="Seconds between polls (default GOLD_PRICE_POLL_INTERVAL_SECONDS).",
+        )
+        parser.add_argument(
+            "--with-jobs",
+            action="store_true",
+            help="Also run the daily APScheduler jobs (closes, retention, partitions).",
+        )
+        parser.add_argument(
+            "--max-cycles",
             type=int,
-            default=60,  # Changed default to 60 seconds
-            help="Seconds between polls (default 60).",
+            help="Stop after this many polls (default: run until SIGTERM/SIGINT).",
         )
 
     def handle(self, *args, **options):
         interval = options["interval"]
-        service = GoldPriceService()
-        
-        self.stdout.write(self.style.SUCCESS(f"Starting Gold Scraper Poller. Interval: {interval}s"))
-        
+        stop_event = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write(self.style.WARNING(f"Received {signal.Signals(signum).name}; stopping after this cycle."))
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        # Several workers may run (one per node); only the lease holder polls
+        lease = get_scheduler_lease()
+        lease.log = self.stdout.write
+        lease.start()
+
+        scheduler = None
+        if options["with_jobs"]:
+            from market.scheduler import start
+            scheduler = start(include_polling=False)
+
+        self.stdout.write(self.style.SUCCESS(f"Starting gold price worker. Interval: {interval}s"))
+
+        poller = PricePoller(interval, lease=lease, log=self.stdout.write)
         try:
-            while True:
-                start_time = time.time()
-                
-                try:
-                    self.stdout.write("Fetching new snapshot...")
-                    snapshot = service.get_snapshot()
-                    
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"[{snapshot.created_at.strftime('%H:%M:%S')}] "
-                            f"USD/OZ: ${snapshot.spot_ounce_usd} | "
-                            f"PKR/Gram: {snapshot.spot_gram_pkr}"
-                        )
-                    )
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Error during polling cycle: {e}"))
-                
-                # Calculate sleep time to maintain accurate 60s intervals
-                # (Scraping takes time, so we subtract that execution time)
-                elapsed = time.time() - start_time
-                sleep_time = max(0, interval - elapsed)
-                
-                if sleep_time == 0:
-                    self.stdout.write(self.style.WARNING("Scraping took longer than interval!"))
-
-                time.sleep(sleep_time)
-
-        except KeyboardInterrupt:
-            self.stdout.write(self.style.WARNING("Polling stopped by user."))
\ No newline at end of file
+            stats = poller.run(stop_event, max_cycles=options["max_cycles"])
+        finally:
+            if scheduler is not None:
+                scheduler.shutdown(wait=True)
+            # Hand over right away instead of letting the lease lapse
+            lease.stop(release=True)
+
+        average = stats["total_latency"] / stats["cycles"] if stats["cycles"] else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Worker stopped. Cycles: {stats['cycles']} | Failures: {stats['failures']} | "
+                f"Skipped ticks: {stats['skipped']} | Latency avg {average:.3f}s, max {stats['max_latency']:.3f}s"
+            )
+        )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from market.retention import SnapshotRetention
+
+
+class Command(BaseCommand):
+    help = "Downsamples and deletes old gold price snapshots (referenced snapshots are kept)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full-days",
+            type=int,
+            help="Days kept at full resolution (default MARKET_SNAPSHOT_FULL_RESOLUTION_DAYS).",
+        )
+        parser.add_argument(
+            "--downsampled-days",
+            type=int,
+            help="Days kept at hourly resolution (default MARKET_SNAPSHOT_DOWNSAMPLED_DAYS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Rows deleted per statement (default MARKET_SNAPSHOT_PRUNE_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between delete batches (default 0).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the rows that would be removed.",
+        )
+
+    def handle(self, *args, **options):
+        retention = SnapshotRetention(
+            full_days=options["full_days"],
+            downsampled_days=options["downsampled_days"],
+            batch_size=options["batch_size"],
+            pause_seconds=options["pause"],
+        )
+        report = retention.run(dry_run=options["dry_run"])
+
+        prefix = "Would reclaim" if report["dry_run"] else "Reclaimed"
+        self.stdout.write(
+            f"Downsampled: {report['downsampled_rows']} | Expired: {report['expired_rows']} | "
+            f"Batches: {report['batches']}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {report['rows']} rows (~{report['bytes_estimate'] / 1024:.1f} KiB, "
+                f"{report['row_bytes']} B/row) in {report['seconds']}s"
+            )
+        )
@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from market.closing import ClosingPriceEngine
+from market.models import GoldPriceSnapshot
+
+
+class Command(BaseCommand):
+    help = "Recomputes daily closing prices (last snapshot of each local day) for a date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="First local day (YYYY-MM-DD). Default: oldest snapshot.",
+        )
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help="Last local day (YYYY-MM-DD). Default: today.",
+        )
+        parser.add_argument(
+            "--days-per-batch",
+            type=int,
+            default=31,
+            help="Local days recomputed per query (default 31).",
+        )
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        until = options["until"] or timezone.localdate()
+
+        if since is None:
+            oldest = GoldPriceSnapshot.objects.order_by("timestamp").values_list("timestamp", flat=True).first()
+            if oldest is None:
+                self.stdout.write(self.style.WARNING("No snapshots stored; nothing to recompute."))
+                return
+            since = timezone.localtime(oldest).date()
+
+        if since > until:
+            raise CommandError("--since must not be after --until")
+
+        step = timedelta(days=max(options["days_per_batch"], 1))
+        total = 0
+        seconds = 0.0
+        missing = []
+
+        day = since
+        while day <= until:
+            last = min(day + step - timedelta(days=1), until)
+            report = ClosingPriceEngine.recompute(day, last)
+            total += report["days"]
+            seconds += report["seconds"]
+            missing.extend(report["missing"])
+            self.stdout.write(f"{day} → {last}: {report['days']} closes")
+            day = last + timedelta(days=1)
+
+        if missing:
+            self.stdout.write(
+                self.style.WARNING(f"No snapshots for {len(missing)} day(s): {', '.join(map(str, missing[:10]))}"
+                                   + (" ..." if len(missing) > 10 else ""))
+            )
+        self.stdout.write(self.style.SUCCESS(f"Upserted {total} daily closes in {seconds:.2f}s"))
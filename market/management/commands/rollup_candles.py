@@ -0,0 +1,66 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from market.candles import CandleRollup, RESOLUTIONS
+from market.models import GoldPriceSnapshot
+
+
+class Command(BaseCommand):
+    help = "Backfills OHLC price candles (5m/1h/1d) from stored gold price snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="First local day to rebuild (YYYY-MM-DD). Default: oldest snapshot (candles of days thinned by retention are kept).",
+        )
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help="Last local day to rebuild (YYYY-MM-DD). Default: today.",
+        )
+        parser.add_argument(
+            "--resolution",
+            action="append",
+            choices=RESOLUTIONS,
+            help="Only rebuild this resolution (repeatable). Default: all.",
+        )
+        parser.add_argument(
+            "--days-per-batch",
+            type=int,
+            default=7,
+            help="Local days rebuilt per pass (default 7).",
+        )
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        until = options["until"] or timezone.localdate()
+
+        if since is None:
+            oldest = GoldPriceSnapshot.objects.order_by("timestamp").values_list("timestamp", flat=True).first()
+            if oldest is None:
+                self.stdout.write(self.style.WARNING("No snapshots stored; nothing to roll up."))
+                return
+            since = timezone.localtime(oldest).date()
+
+        if since > until:
+            raise CommandError("--since must not be after --until")
+
+        step = timedelta(days=max(options["days_per_batch"], 1))
+        total = 0
+        started = time.monotonic()
+
+        day = since
+        while day <= until:
+            last = min(day + step - timedelta(days=1), until)
+            written = CandleRollup.rebuild(day, last, resolutions=options["resolution"])
+            total += written
+            self.stdout.write(f"{day} → {last}: {written} candles")
+            day = last + timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rolled up {total} candles in {time.monotonic() - started:.1f}s")
+        )
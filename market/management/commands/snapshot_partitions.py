@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from market import partitions
+
+
+class Command(BaseCommand):
+    help = "Creates upcoming monthly GoldPriceSnapshot partitions and retires old ones (Postgres only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="Months of partitions to keep created ahead of now (default 3).",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            help="Detach partitions that ended more than N months ago. Default: keep all.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop retired partitions instead of leaving them detached.",
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            self.stdout.write(self.style.WARNING(
+                "GoldPriceSnapshot is not partitioned on this database (SQLite/local mode); nothing to do."
+            ))
+            return
+
+        today = timezone.now().date()
+
+        created = partitions.ensure_partitions(today, ahead_months=options["ahead"])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+
+        if options["retain_months"] is not None:
+            retired = partitions.retire_partitions(today, options["retain_months"], drop=options["drop"])
+            for name, preserved, action in retired:
+                self.stdout.write(f"{action.capitalize()} {name} ({preserved} referenced snapshots kept)")
+
+        existing = partitions.list_partitions()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(existing)} monthly partitions"
+            + (f", {existing[0][1]:%Y-%m} → {existing[-1][1]:%Y-%m}" if existing else "")
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0004_goldpriceconfig_buy_fee_percentage_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='goldpricesnapshot',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
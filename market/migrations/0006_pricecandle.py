@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0005_goldpricesnapshot_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('5m', '5 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=3)),
+                ('bucket_start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('high', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('low', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('close', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('open_timestamp', models.DateTimeField()),
+                ('close_timestamp', models.DateTimeField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('resolution', 'bucket_start'), name='unique_price_candle_bucket')],
+            },
+        ),
+    ]
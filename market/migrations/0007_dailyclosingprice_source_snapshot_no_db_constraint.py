@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    State only: 0008 drops this FK constraint on Postgres, where the
+    partitioned snapshot table cannot be referenced by id alone. Other
+    backends keep the constraint created by earlier migrations.
+    """
+
+    dependencies = [
+        ("market", "0006_pricecandle"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="dailyclosingprice",
+                    name="source_snapshot",
+                    field=models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="market.goldpricesnapshot",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Converts market_goldpricesnapshot into a table range-partitioned by
+# month on "timestamp". Postgres only; SQLite keeps the plain table and
+# its foreign keys.
+
+from datetime import date
+
+from django.db import migrations
+
+
+TABLE = "market_goldpricesnapshot"
+LEGACY = "market_goldpricesnapshot_unpartitioned"
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_snapshots(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        # A partitioned table cannot be the target of a FK on id alone:
+        # orders and closing prices keep the column, the ORM handles
+        # on_delete (db_constraint=False in state since market 0007 and
+        # wallet 0004)
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = %s::regclass",
+            [TABLE],
+        )
+        for table, constraint in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"')
+
+        # Move the old table (and its index names) out of the way
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+            [TABLE],
+        )
+        index_names = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY}"')
+        for index_name in index_names:
+            cursor.execute(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:50]}_unpart"')
+
+        # Partitioned parent: the partition key must be part of the PK
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY}" INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "timestamp")')
+        cursor.execute(f'CREATE INDEX "{TABLE}_timestamp_idx" ON "{TABLE}" ("timestamp")')
+        cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+
+        # Monthly partitions covering existing data plus a few months ahead
+        cursor.execute(f'SELECT MIN("timestamp")::date, GREATEST(MAX("timestamp")::date, CURRENT_DATE) FROM "{LEGACY}"')
+        first, last = cursor.fetchone()
+        if first is None:
+            cursor.execute("SELECT CURRENT_DATE, CURRENT_DATE")
+            first, last = cursor.fetchone()
+
+        month = date(first.year, first.month, 1)
+        stop = _add_months(date(last.year, last.month, 1), MONTHS_AHEAD)
+        while month <= stop:
+            cursor.execute(
+                f'CREATE TABLE "{TABLE}_p{month.year:04d}_{month.month:02d}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [month.isoformat(), _add_months(month, 1).isoformat()],
+            )
+            month = _add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{LEGACY}"')
+        cursor.execute(f'SELECT COALESCE(MAX("id"), 0) + 1 FROM "{LEGACY}"')
+        next_id = cursor.fetchone()[0]
+
+        # Dropping the legacy table also drops its identity sequence,
+        # freeing the standard sequence name for the new table.
+        cursor.execute(f'DROP TABLE "{LEGACY}"')
+        cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f"SELECT setval('\"{TABLE}_id_seq\"', %s, false)", [next_id])
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{TABLE}_id_seq"\')')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        # Those set db_constraint=False in state; the constraints
+        # themselves are dropped here
+        ("market", "0007_dailyclosingprice_source_snapshot_no_db_constraint"),
+        ("wallet", "0004_snapshot_reference_no_db_constraint"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,5 @@
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 
@@ -67,12 +67,27 @@ class GoldPriceConfig(models.Model):
             GoldPriceConfig.objects.exclude(pk=self.pk).update(is_active=False)
         super().save(*args, **kwargs)
 
+        # Tell every worker to reload its cached pricing config, once the
+        # row is committed (a worker must not reload the old one). A
+        # reload here before then is keyed by the old version.
+        from .cache import PricingConfigCache, bump_config_version
+        PricingConfigCache.clear()
+        transaction.on_commit(bump_config_version)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+
+        from .cache import PricingConfigCache, bump_config_version
+        PricingConfigCache.clear()
+        transaction.on_commit(bump_config_version)
+        return result
+
 
 # --------------------------------------------
 # GOLD PRICE SNAPSHOT (Every minute)
 # --------------------------------------------
 class GoldPriceSnapshot(models.Model):
-    timestamp = models.DateTimeField(default=timezone.now)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
 
     usd_per_ounce = models.DecimalField(max_digits=14, decimal_places=4)
     usd_pkr_rate = models.DecimalField(max_digits=14, decimal_places=4)
@@ -99,12 +114,82 @@ class DailyClosingPrice(models.Model):
     closing_gram = models.DecimalField(max_digits=14, decimal_places=4)
     closing_tola = models.DecimalField(max_digits=14, decimal_places=4)
 
+    # Postgres drops this FK's DB constraint (migration 0008): the
+    # partitioned snapshot table cannot be referenced by id alone. Other
+    # backends keep the constraint; the ORM handles on_delete either way
     source_snapshot = models.ForeignKey(
         GoldPriceSnapshot,
         on_delete=models.CASCADE,
         null=True,
-        blank=True
+        blank=True,
+        db_constraint=False,
     )
 
     def __str__(self):
         return f"Closing Price for {self.date}"
+
+
+# --------------------------------------------
+# PRICE CANDLE (OHLC rollups of snapshots)
+# --------------------------------------------
+class PriceCandle(models.Model):
+    """
+    Open/high/low/close of pkr_per_gram_final per time bucket.
+    Updated incrementally as each snapshot is stored; history
+    endpoints read only these rows.
+    """
+
+    RESOLUTION_5M = "5m"
+    RESOLUTION_1H = "1h"
+    RESOLUTION_1D = "1d"
+
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_5M, "5 minutes"),
+        (RESOLUTION_1H, "1 hour"),
+        (RESOLUTION_1D, "1 day"),
+    ]
+
+    resolution = models.CharField(max_length=3, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+
+    open = models.DecimalField(max_digits=18, decimal_places=4)
+    high = models.DecimalField(max_digits=18, decimal_places=4)
+    low = models.DecimalField(max_digits=18, decimal_places=4)
+    close = models.DecimalField(max_digits=18, decimal_places=4)
+
+    # Timestamps of the snapshots that set open/close (out-of-order safe)
+    open_timestamp = models.DateTimeField()
+    close_timestamp = models.DateTimeField()
+
+    sample_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["resolution", "bucket_start"],
+                name="unique_price_candle_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.resolution} candle @ {self.bucket_start}"
+
+
+# --------------------------------------------
+# SCHEDULER LEASE (leader election across nodes)
+# --------------------------------------------
+class SchedulerLease(models.Model):
+    """
+    One row per lease name. The holder keeps renewing expires_at; once
+    it lapses any other process may take the lease over.
+    """
+
+    name = models.CharField(max_length=64, unique=True)
+    holder = models.CharField(max_length=128, blank=True, default="")
+
+    acquired_at = models.DateTimeField(null=True, blank=True)
+    renewed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} → {self.holder or 'nobody'}"
@@ -0,0 +1,173 @@
+"""
+Monthly range partitions of GoldPriceSnapshot on "timestamp" (Postgres).
+
+SQLite (local mode) keeps a plain, unpartitioned table; every function
+here is a no-op there.
+"""
+
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import GoldPriceSnapshot
+
+
+TABLE = GoldPriceSnapshot._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def is_supported():
+    return connection.vendor == "postgresql"
+
+
+def is_partitioned():
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """
+    [(name, month_start)] of the monthly partitions, oldest first.
+    The DEFAULT partition is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+            """,
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    prefix = f"{TABLE}_p"
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        year, month = name[len(prefix):].split("_")
+        partitions.append((name, date(int(year), int(month), 1)))
+    return partitions
+
+
+def create_partition(cursor, month):
+    """
+    Creates the partition for `month`. Rows already sitting in the DEFAULT
+    partition for that range are moved into it (Postgres refuses to attach
+    a partition whose range overlaps rows in DEFAULT).
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+
+    cursor.execute(
+        f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE "timestamp" >= %s AND "timestamp" < %s LIMIT 1',
+        [start, end],
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+        return name
+
+    cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+    cursor.execute(
+        f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+        [start, end],
+    )
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+        f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        [start, end],
+    )
+    cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+    return name
+
+
+def ensure_partitions(today, ahead_months=3):
+    """
+    Makes sure partitions exist from the current month up to
+    `ahead_months` months ahead. Returns the names created.
+    """
+    if not is_partitioned():
+        return []
+
+    existing = {month for _, month in list_partitions()}
+    current = month_start(today)
+    created = []
+
+    for offset in range(ahead_months + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            created.append(create_partition(cursor, month))
+    return created
+
+
+def retire_partitions(today, retain_months, drop=False):
+    """
+    Detaches monthly partitions that end before the retention window.
+    Snapshots still referenced by orders or daily closes are copied back
+    into the parent (they land in DEFAULT) before the partition goes.
+    With drop=True the detached table is dropped, otherwise it is left
+    behind as an archive table.
+    Returns [(name, preserved_rows, action)].
+    """
+    if not is_partitioned():
+        return []
+
+    from wallet.models import BuyOrder, SellOrder
+    from .models import DailyClosingPrice
+
+    cutoff = add_months(month_start(today), -retain_months)
+    references = [
+        (BuyOrder._meta.db_table, BuyOrder._meta.get_field("snapshot_reference").column),
+        (SellOrder._meta.db_table, SellOrder._meta.get_field("snapshot_reference").column),
+        (DailyClosingPrice._meta.db_table, DailyClosingPrice._meta.get_field("source_snapshot").column),
+    ]
+    referenced = " OR ".join(
+        f'EXISTS (SELECT 1 FROM "{table}" r WHERE r."{column}" = p.id)'
+        for table, column in references
+    )
+
+    retired = []
+    for name, month in list_partitions():
+        if add_months(month, 1) > cutoff:
+            continue
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            cursor.execute(f'INSERT INTO "{TABLE}" SELECT p.* FROM "{name}" p WHERE {referenced}')
+            preserved = cursor.rowcount
+
+            if drop:
+                cursor.execute(f'DROP TABLE "{name}"')
+            else:
+                cursor.execute(f'DELETE FROM "{name}" p WHERE {referenced}')
+
+        retired.append((name, preserved, "dropped" if drop else "detached"))
+    return retired
@@ -0,0 +1,496 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+from decimal import Decimal
+import http.client
+import json
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+
+GOLD_SYMBOL = "GC=F"
+FX_SYMBOL = "PKR=X"
+
+# Bar size → seconds, and the longest span Yahoo serves per request
+HISTORY_INTERVALS = {
+    "1m": (60, timedelta(days=7)),
+    "5m": (5 * 60, timedelta(days=59)),
+    "1h": (60 * 60, timedelta(days=729)),
+    "1d": (24 * 60 * 60, timedelta(days=3650)),
+}
+
+# Shared across polls: abandoned (timed-out) legs keep running here
+# without blocking the next poll.
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="price-fetch")
+
+# Per pool thread HTTP sessions/connections, reused across polls.
+# (Neither curl sessions nor http.client connections are thread-safe.)
+_thread_state = threading.local()
+
+
+# --------------------------------------------
+# PROVIDER INTERFACE
+# --------------------------------------------
+class PriceProvider:
+    """
+    Source of live (usd_per_ounce, usd_pkr_rate).
+
+    Subclasses implement fetch_quote(symbol) and, optionally,
+    fetch_quote_fallback(symbol). fetch() runs both legs concurrently:
+    - primary quote first
+    - fallback also started if primary fails or is still running
+      after hedge_after_seconds (first usable answer wins)
+    - everything bounded by deadline_seconds
+    Per-leg timings are kept on self.last_timings.
+    """
+
+    name = "base"
+    has_fallback = False
+
+    def __init__(self, deadline_seconds=20, hedge_after_seconds=2.0):
+        self.deadline_seconds = deadline_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self.last_timings = {}
+
+    def fetch_quote(self, symbol):
+        raise NotImplementedError
+
+    def fetch_quote_fallback(self, symbol):
+        raise NotImplementedError
+
+    def fetch_history_bars(self, symbol, start, end, interval):
+        """
+        (epoch_seconds, close) numpy arrays for bars in [start, end).
+        """
+        raise NotImplementedError(f"{self.name} has no price history")
+
+    def fetch_history(self, start, end, interval="1m"):
+        """
+        Historical bar closes for backfills, as numpy arrays
+        (epoch_seconds, usd_per_ounce, usd_pkr_rate). Requests are split
+        into windows Yahoo accepts; FX is aligned onto the gold bars.
+        """
+        import numpy as np
+
+        if interval not in HISTORY_INTERVALS:
+            raise ValueError(f"Unsupported interval {interval!r} (use {', '.join(HISTORY_INTERVALS)})")
+        window = HISTORY_INTERVALS[interval][1]
+
+        series = {}
+        for symbol in (GOLD_SYMBOL, FX_SYMBOL):
+            stamps, closes = [], []
+            window_start = start
+            while window_start < end:
+                window_end = min(window_start + window, end)
+                ts, close = self.fetch_history_bars(symbol, window_start, window_end, interval)
+                stamps.append(np.asarray(ts, dtype=np.int64))
+                closes.append(np.asarray(close, dtype=np.float64))
+                window_start = window_end
+            series[symbol] = (np.concatenate(stamps), np.concatenate(closes))
+
+        return align_series(*series[GOLD_SYMBOL], *series[FX_SYMBOL])
+
+    def fetch(self):
+        symbols = (GOLD_SYMBOL, FX_SYMBOL)
+        started = time.monotonic()
+        deadline = started + self.deadline_seconds
+        hedge_at = started + self.hedge_after_seconds
+
+        prices = {}
+        errors = {}
+        timings = {}
+        pending = {}
+        hedged = set()
+
+        def hedge(symbol):
+            if self.has_fallback and symbol not in hedged:
+                hedged.add(symbol)
+                pending[_fetch_pool.submit(self.fetch_quote_fallback, symbol)] = (symbol, "fallback")
+
+        for symbol in symbols:
+            pending[_fetch_pool.submit(self.fetch_quote, symbol)] = (symbol, "primary")
+
+        while pending and len(prices) < len(symbols):
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            if now >= hedge_at:
+                for symbol in symbols:
+                    if symbol not in prices:
+                        hedge(symbol)
+
+            wake_at = hedge_at if (self.has_fallback and now < hedge_at) else deadline
+            done, _ = wait(list(pending), timeout=wake_at - now, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                symbol, leg = pending.pop(future)
+                timings[f"{symbol}:{leg}"] = round(time.monotonic() - started, 3)
+
+                try:
+                    price = future.result()
+                except Exception as e:
+                    price = None
+                    errors[f"{symbol}:{leg}"] = str(e)
+
+                if price is not None:
+                    prices.setdefault(symbol, price)
+                elif symbol not in prices:
+                    hedge(symbol)
+
+        timings["total"] = round(time.monotonic() - started, 3)
+        self.last_timings = timings
+
+        if len(prices) < len(symbols):
+            missing = [s for s in symbols if s not in prices]
+            reason = errors or f"timed out after {self.deadline_seconds}s"
+            raise RuntimeError(f"{self.name}: no price for {', '.join(missing)} ({reason})")
+
+        return prices[GOLD_SYMBOL], prices[FX_SYMBOL]
+
+
+# --------------------------------------------
+# YFINANCE (fast_info, hedged with history())
+# --------------------------------------------
+class YFinanceProvider(PriceProvider):
+    """
+    fast_info is fast but unreliable; history() is slower but very
+    reliable, so it is used as the hedge. Imports yfinance (and pandas)
+    only when first used.
+    """
+
+    name = "yfinance"
+    has_fallback = True
+
+    def fetch_quote(self, symbol):
+        price = self._ticker(symbol).fast_info.get("last_price")
+        if price is None:
+            return None
+        return Decimal(str(price))
+
+    def fetch_quote_fallback(self, symbol):
+        hist = self._ticker(symbol).history(
+            period="1d",
+            interval="1m",
+            timeout=self.deadline_seconds,
+        )
+        if hist.empty:
+            raise ValueError("history() returned empty data.")
+
+        price = hist["Close"].iloc[-1]
+        if price is None:
+            raise ValueError("history() returned None for close price.")
+        return Decimal(str(price))
+
+    def fetch_history_bars(self, symbol, start, end, interval):
+        hist = self._ticker(symbol).history(
+            start=start,
+            end=end,
+            interval=interval,
+            timeout=self.deadline_seconds,
+        )
+        if hist.empty:
+            return [], []
+        return hist.index.asi8 // 1_000_000_000, hist["Close"].to_numpy(dtype=float)
+
+    @staticmethod
+    def _ticker(symbol):
+        import yfinance as yf
+
+        if not hasattr(_thread_state, "yf_session"):
+            try:
+                from curl_cffi import requests as curl_requests
+                _thread_state.yf_session = curl_requests.Session(impersonate="chrome")
+            except ImportError:
+                _thread_state.yf_session = None
+        return yf.Ticker(symbol, session=_thread_state.yf_session)
+
+
+# --------------------------------------------
+# YAHOO CHART API (stdlib only, no pandas)
+# --------------------------------------------
+class YahooChartProvider(PriceProvider):
+    """
+    Reads regularMarketPrice from Yahoo's v8 chart endpoint over a
+    keep-alive http.client connection. No yfinance/pandas import.
+    """
+
+    name = "yahoo_chart"
+    host = "query1.finance.yahoo.com"
+    user_agent = "Mozilla/5.0 (compatible; zariah-price-poller)"
+
+    def fetch_quote(self, symbol):
+        payload = self._get_json(f"/v8/finance/chart/{symbol}?range=1d&interval=1m")
+        result = (payload.get("chart") or {}).get("result") or []
+        if not result:
+            raise ValueError(f"chart API returned no result for {symbol}")
+
+        price = result[0].get("meta", {}).get("regularMarketPrice")
+        if price is None:
+            return None
+        return Decimal(str(price))
+
+    def fetch_history_bars(self, symbol, start, end, interval):
+        payload = self._get_json(
+            f"/v8/finance/chart/{symbol}?period1={int(start.timestamp())}"
+            f"&period2={int(end.timestamp())}&interval={interval}"
+        )
+        result = (payload.get("chart") or {}).get("result") or []
+        if not result or not result[0].get("timestamp"):
+            return [], []
+
+        closes = result[0]["indicators"]["quote"][0]["close"]
+        # Missing bars come back as null
+        return result[0]["timestamp"], [float("nan") if c is None else c for c in closes]
+
+    def _get_json(self, path):
+        conn = getattr(_thread_state, "chart_conn", None)
+        if conn is None:
+            conn = http.client.HTTPSConnection(self.host, timeout=self.deadline_seconds)
+            _thread_state.chart_conn = conn
+
+        try:
+            conn.request("GET", path, headers={"User-Agent": self.user_agent, "Accept": "application/json"})
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            # Drop the broken keep-alive connection; the next poll reconnects
+            conn.close()
+            _thread_state.chart_conn = None
+            raise
+
+        if response.status != 200:
+            raise ValueError(f"chart API returned HTTP {response.status}")
+        return json.loads(body)
+
+
+# --------------------------------------------
+# LOCAL STUB (benchmarks, offline tests)
+# --------------------------------------------
+class StubPriceProvider(PriceProvider):
+    """
+    Deterministic prices derived from the current minute: a slow daily
+    sine wave around fixed base prices. Same minute → same prices.
+    """
+
+    name = "stub"
+
+    BASE_USD_PER_OUNCE = Decimal("2350.00")
+    BASE_USD_PKR_RATE = Decimal("280.00")
+    AMPLITUDE = 0.01
+
+    def fetch(self):
+        started = time.monotonic()
+        gold, fx = self.prices_at(timezone.now())
+        self.last_timings = {"total": round(time.monotonic() - started, 3)}
+        return gold, fx
+
+    def prices_at(self, when):
+        minute = int(when.timestamp() // 60)
+        wave = math.sin(2 * math.pi * (minute % 1440) / 1440)
+
+        gold = self.BASE_USD_PER_OUNCE * Decimal(str(round(1 + self.AMPLITUDE * wave, 6)))
+        fx = self.BASE_USD_PKR_RATE * Decimal(str(round(1 + self.AMPLITUDE / 4 * wave, 6)))
+        return gold.quantize(Decimal("0.0001")), fx.quantize(Decimal("0.0001"))
+
+    def fetch_history_bars(self, symbol, start, end, interval):
+        import numpy as np
+
+        step = HISTORY_INTERVALS[interval][0]
+        first = -(-int(start.timestamp()) // step) * step
+        ts = np.arange(first, int(end.timestamp()), step, dtype=np.int64)
+        wave = np.sin(2 * np.pi * ((ts // 60) % 1440) / 1440)
+
+        if symbol == GOLD_SYMBOL:
+            base, amplitude = float(self.BASE_USD_PER_OUNCE), self.AMPLITUDE
+        else:
+            base, amplitude = float(self.BASE_USD_PKR_RATE), self.AMPLITUDE / 4
+        return ts, np.round(base * np.round(1 + amplitude * wave, 6), 4)
+
+
+def align_series(gold_ts, gold, fx_ts, fx):
+    """
+    Pairs every gold bar with the last FX close at or before it. Bars
+    with no usable price (NaN, or before the first FX bar) are dropped;
+    duplicate timestamps keep the last bar.
+    """
+    import numpy as np
+
+    def clean(ts, close):
+        keep = ~np.isnan(close)
+        ts, close = ts[keep], close[keep]
+        order = np.argsort(ts, kind="stable")
+        ts, close = ts[order], close[order]
+        last = np.append(ts[1:] != ts[:-1], True)
+        return ts[last], close[last]
+
+    gold_ts, gold = clean(gold_ts, gold)
+    fx_ts, fx = clean(fx_ts, fx)
+
+    index = np.searchsorted(fx_ts, gold_ts, side="right") - 1
+    keep = index >= 0
+    return gold_ts[keep], gold[keep], fx[index[keep]]
+
+
+PROVIDERS = {
+    YFinanceProvider.name: YFinanceProvider,
+    YahooChartProvider.name: YahooChartProvider,
+    StubPriceProvider.name: StubPriceProvider,
+}
+
+
+# --------------------------------------------
+# CIRCUIT BREAKER
+# --------------------------------------------
+class CircuitBreaker:
+    """
+    Skips a provider for cooldown_seconds after failure_threshold
+    consecutive failures. Calls slower than slow_call_seconds count as
+    failures. After the cool-down one trial call is let through
+    (half-open) while other callers are still refused; success closes
+    the breaker, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=3, slow_call_seconds=10.0, cooldown_seconds=120):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown_seconds = cooldown_seconds
+
+        self.failures = 0
+        self.open_until = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.open_until is None:
+            return "closed"
+        if time.monotonic() < self.open_until:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        """
+        True when the caller may call the provider. The caller must then
+        report the outcome with record_success() or record_failure().
+        """
+        with self._lock:
+            if self.open_until is None:
+                return True
+            if time.monotonic() < self.open_until or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self, duration):
+        if duration > self.slow_call_seconds:
+            self.record_failure()
+            return
+
+        with self._lock:
+            self.failures = 0
+            self.open_until = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.open_until is not None:
+                self.open_until = time.monotonic() + self.cooldown_seconds
+            self.trial_in_flight = False
+
+
+# --------------------------------------------
+# PROVIDER CHAIN
+# --------------------------------------------
+class ProviderChain:
+    """
+    Tries providers in order, skipping those whose breaker is open, until
+    one returns prices or budget_seconds is used up.
+    """
+
+    def __init__(self, providers, budget_seconds=45, **breaker_options):
+        self.providers = list(providers)
+        self.budget_seconds = budget_seconds
+        self.breakers = {p.name: CircuitBreaker(**breaker_options) for p in self.providers}
+        self.last_timings = {}
+        self.last_provider = None
+
+    def fetch(self):
+        started = time.monotonic()
+        timings = {}
+        errors = {}
+
+        for provider in self.providers:
+            # Budget first: an allowed half-open trial must be reported
+            if time.monotonic() - started >= self.budget_seconds:
+                errors[provider.name] = "polling budget exhausted"
+                break
+
+            breaker = self.breakers[provider.name]
+            if not breaker.allow():
+                errors[provider.name] = "circuit open"
+                continue
+
+            call_started = time.monotonic()
+            try:
+                prices = provider.fetch()
+            except Exception as e:
+                breaker.record_failure()
+                errors[provider.name] = str(e)
+                continue
+            finally:
+                timings[provider.name] = provider.last_timings
+
+            breaker.record_success(time.monotonic() - call_started)
+            self.last_timings = timings
+            self.last_provider = provider.name
+            return prices
+
+        self.last_timings = timings
+        self.last_provider = None
+        raise RuntimeError(f"All price providers failed: {errors}")
+
+    def status(self):
+        return {
+            name: {"state": breaker.state, "failures": breaker.failures}
+            for name, breaker in self.breakers.items()
+        }
+
+
+_chain = None
+_chain_key = None
+_chain_lock = threading.Lock()
+
+
+def get_provider_chain():
+    """
+    Process-wide chain built from settings.GOLD_PRICE_PROVIDERS, so
+    breaker state survives across polls.
+    """
+    global _chain, _chain_key
+
+    key = (
+        tuple(settings.GOLD_PRICE_PROVIDERS),
+        settings.GOLD_PRICE_FETCH_DEADLINE_SECONDS,
+        settings.GOLD_PRICE_HEDGE_AFTER_SECONDS,
+    )
+    with _chain_lock:
+        if _chain is None or _chain_key != key:
+            names, deadline, hedge_after = key
+            unknown = [n for n in names if n not in PROVIDERS]
+            if unknown:
+                raise ValueError(f"Unknown GOLD_PRICE_PROVIDERS: {', '.join(unknown)}")
+
+            _chain = ProviderChain(
+                [PROVIDERS[n](deadline_seconds=deadline, hedge_after_seconds=hedge_after) for n in names],
+                budget_seconds=settings.GOLD_PRICE_POLL_BUDGET_SECONDS,
+                failure_threshold=settings.GOLD_PRICE_BREAKER_FAILURES,
+                slow_call_seconds=settings.GOLD_PRICE_BREAKER_SLOW_SECONDS,
+                cooldown_seconds=settings.GOLD_PRICE_BREAKER_COOLDOWN_SECONDS,
+            )
+            _chain_key = key
+        return _chain
@@ -0,0 +1,170 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .candles import bucket_start
+from .models import DailyClosingPrice, GoldPriceSnapshot, PriceCandle
+
+
+# Rough on-disk size of one snapshot row (header + id + timestamp +
+# 8 numerics) when the backend cannot tell us.
+DEFAULT_ROW_BYTES = 160
+
+
+def unreferenced_snapshots():
+    """
+    Snapshots nobody points at. Orders and daily closes keep their
+    source snapshot forever.
+    """
+    from wallet.models import BuyOrder, SellOrder
+
+    return GoldPriceSnapshot.objects.filter(
+        ~Exists(BuyOrder.objects.filter(snapshot_reference=OuterRef("pk"))),
+        ~Exists(SellOrder.objects.filter(snapshot_reference=OuterRef("pk"))),
+        ~Exists(DailyClosingPrice.objects.filter(source_snapshot=OuterRef("pk"))),
+    )
+
+
+def estimate_row_bytes():
+    table = GoldPriceSnapshot._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT pg_total_relation_size(c.oid)::float8 / GREATEST(c.reltuples, 1) "
+                "FROM pg_class c WHERE c.oid = %s::regclass",
+                [table],
+            )
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] else DEFAULT_ROW_BYTES
+
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [table])
+                size = cursor.fetchone()[0]
+            except Exception:
+                return DEFAULT_ROW_BYTES
+            count = GoldPriceSnapshot.objects.count()
+            return int(size / count) if size and count else DEFAULT_ROW_BYTES
+
+    return DEFAULT_ROW_BYTES
+
+
+# --------------------------------------------
+# SNAPSHOT RETENTION
+# --------------------------------------------
+class SnapshotRetention:
+    """
+    Tiered retention for GoldPriceSnapshot:
+    1. Newer than full_days: every row kept
+    2. full_days..downsampled_days: one row (the bucket close) kept per
+       downsample bucket
+    3. Older than downsampled_days: deleted
+    OHLC history lives on in PriceCandle. Referenced snapshots are never
+    deleted. Deletes run in batches of batch_size, each its own short
+    transaction, so no long locks are held.
+    """
+
+    def __init__(
+        self,
+        full_days=None,
+        downsampled_days=None,
+        batch_size=None,
+        downsample_resolution=PriceCandle.RESOLUTION_1H,
+        pause_seconds=0,
+    ):
+        self.full_days = full_days or settings.MARKET_SNAPSHOT_FULL_RESOLUTION_DAYS
+        self.downsampled_days = downsampled_days or settings.MARKET_SNAPSHOT_DOWNSAMPLED_DAYS
+        self.batch_size = batch_size or settings.MARKET_SNAPSHOT_PRUNE_BATCH_SIZE
+        self.downsample_resolution = downsample_resolution
+        self.pause_seconds = pause_seconds
+
+        if self.downsampled_days < self.full_days:
+            raise ValueError("downsampled_days must be >= full_days")
+
+    def run(self, now=None, dry_run=False):
+        started = time.monotonic()
+        now = now or timezone.now()
+        full_cutoff = bucket_start(PriceCandle.RESOLUTION_1D, now - timedelta(days=self.full_days))
+        downsample_cutoff = bucket_start(PriceCandle.RESOLUTION_1D, now - timedelta(days=self.downsampled_days))
+
+        row_bytes = estimate_row_bytes()
+        report = {"downsampled_rows": 0, "expired_rows": 0, "batches": 0}
+
+        candidates = unreferenced_snapshots()
+
+        # Tier 2: keep only the last snapshot of each bucket, one day at a time
+        window_start = downsample_cutoff
+        while window_start < full_cutoff:
+            window_end = min(window_start + timedelta(days=1), full_cutoff)
+            ids = self._downsample_ids(
+                candidates.filter(timestamp__gte=window_start, timestamp__lt=window_end)
+            )
+            report["downsampled_rows"] += self._delete_ids(ids, report, dry_run)
+            window_start = window_end
+
+        # Tier 3: expire everything older
+        expired = candidates.filter(timestamp__lt=downsample_cutoff)
+        if dry_run:
+            report["expired_rows"] = expired.count()
+        else:
+            report["expired_rows"] = self._delete_batches(expired, report)
+
+        report["rows"] = report["downsampled_rows"] + report["expired_rows"]
+        report["row_bytes"] = row_bytes
+        report["bytes_estimate"] = report["rows"] * row_bytes
+        report["seconds"] = round(time.monotonic() - started, 3)
+        report["dry_run"] = dry_run
+        return report
+
+    def _downsample_ids(self, queryset):
+        """
+        Ids of every row that is not the last one in its bucket.
+        Windows are aligned to whole hours/days, so buckets never straddle
+        two windows.
+        """
+        rows = queryset.order_by("timestamp", "id").values_list("id", "timestamp")
+
+        ids = []
+        previous_id = None
+        previous_bucket = None
+        for snapshot_id, ts in rows:
+            bucket = bucket_start(self.downsample_resolution, ts)
+            if previous_bucket == bucket:
+                ids.append(previous_id)
+            previous_id, previous_bucket = snapshot_id, bucket
+        return ids
+
+    def _delete_ids(self, ids, report, dry_run):
+        deleted = 0
+        batch = []
+        for snapshot_id in ids:
+            batch.append(snapshot_id)
+            if len(batch) >= self.batch_size:
+                deleted += self._delete_batch(batch, report, dry_run)
+                batch = []
+        if batch:
+            deleted += self._delete_batch(batch, report, dry_run)
+        return deleted
+
+    def _delete_batches(self, queryset, report):
+        deleted = 0
+        while True:
+            batch = list(queryset.order_by("timestamp").values_list("id", flat=True)[:self.batch_size])
+            if not batch:
+                return deleted
+            deleted += self._delete_batch(batch, report, dry_run=False)
+
+    def _delete_batch(self, ids, report, dry_run):
+        if dry_run:
+            return len(ids)
+
+        report["batches"] += 1
+        GoldPriceSnapshot.objects.filter(id__in=ids).delete()
+        if self.pause_seconds:
+            time.sleep(self.pause_seconds)
+        return len(ids)
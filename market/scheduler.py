@@ -1,24 +1,46 @@
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
-from django_apscheduler.jobstores import DjangoJobStore
 from django_apscheduler import util
+from django.conf import settings
 from django.utils import timezone
 import atexit
 
-from .cron import fetch_gold_snapshot, generate_daily_closing_price
+from .leader import get_scheduler_lease
+from .cron import (
+    fetch_gold_snapshot,
+    generate_daily_closing_price,
+    prune_gold_snapshots,
+    maintain_snapshot_partitions,
+)
+from wallet.cron import (
+    checkpoint_wallet_balances,
+    purge_idempotency_keys,
+    reconcile_balances,
+    sweep_expired_locks,
+)
 
 
-def start():
+def build_scheduler(include_polling=True):
+    """
+    The scheduler with every job added, not started.
+    include_polling=False: daily jobs only (the poll_gold_price worker
+    runs the snapshot loop itself).
+    Each node keeps its jobs in memory: a shared DjangoJobStore let a
+    standby pick up a due job, advance its next run and skip it (see
+    leader_only), so the leader never ran it.
+    """
     scheduler = BackgroundScheduler(timezone="Asia/Karachi")
-    scheduler.add_jobstore(DjangoJobStore(), "default")
+    scheduler.add_jobstore(MemoryJobStore(), "default")
 
-    # Run every 60 seconds
-    scheduler.add_job(
-        fetch_gold_snapshot,
-        trigger="interval",
-        seconds=60,
-        id="gold_snapshot_job",
-        replace_existing=True,
-    )
+    # Run every GOLD_PRICE_POLL_INTERVAL_SECONDS (60 by default)
+    if include_polling:
+        scheduler.add_job(
+            fetch_gold_snapshot,
+            trigger="interval",
+            seconds=settings.GOLD_PRICE_POLL_INTERVAL_SECONDS,
+            id="gold_snapshot_job",
+            replace_existing=True,
+        )
 
     # Daily closing price at 23:59
     scheduler.add_job(
@@ -30,8 +52,76 @@ def start():
         replace_existing=True,
     )
 
+    # Snapshot retention at 03:30 (quiet hours)
+    scheduler.add_job(
+        prune_gold_snapshots,
+        trigger="cron",
+        hour=3,
+        minute=30,
+        id="snapshot_retention_job",
+        replace_existing=True,
+    )
+
+    # Snapshot partitions ahead of time (Postgres only)
+    scheduler.add_job(
+        maintain_snapshot_partitions,
+        trigger="cron",
+        hour=0,
+        minute=15,
+        id="snapshot_partitions_job",
+        replace_existing=True,
+    )
+
+    # Expired buy/sell locks (releases inventory, re-credits sell holds)
+    scheduler.add_job(
+        sweep_expired_locks,
+        trigger="interval",
+        seconds=settings.WALLET_LOCK_SWEEP_INTERVAL_SECONDS,
+        id="expired_lock_sweep_job",
+        replace_existing=True,
+    )
+
+    # Wallet balance checkpoints (incremental)
+    scheduler.add_job(
+        checkpoint_wallet_balances,
+        trigger="interval",
+        minutes=settings.WALLET_CHECKPOINT_INTERVAL_MINUTES,
+        id="balance_checkpoint_job",
+        replace_existing=True,
+    )
+
+    # Wallet / ledger / order / inventory reconciliation (incremental)
+    scheduler.add_job(
+        reconcile_balances,
+        trigger="interval",
+        minutes=settings.WALLET_RECONCILIATION_INTERVAL_MINUTES,
+        id="reconciliation_job",
+        replace_existing=True,
+    )
+
+    # Expired idempotency keys, hourly
+    scheduler.add_job(
+        purge_idempotency_keys,
+        trigger="cron",
+        minute=45,
+        id="idempotency_purge_job",
+        replace_existing=True,
+    )
+
+    return scheduler
+
+
+def start(include_polling=True):
+    """
+    Every node may start a scheduler; jobs only run on the node holding
+    the scheduler lease (see market.leader).
+    """
+    get_scheduler_lease().start()
+
+    scheduler = build_scheduler(include_polling)
     scheduler.start()
     print("🎯 APScheduler started successfully")
 
     # Shutdown APScheduler when Django stops
-    atexit.register(lambda: scheduler.shutdown(wait=False))
+    atexit.register(lambda: scheduler.running and scheduler.shutdown(wait=False))
+    return scheduler
@@ -1,7 +1,12 @@
 from decimal import Decimal
-import yfinance as yf
+
+from django.db import transaction
 from django.utils import timezone
-from .models import GoldPriceSnapshot, GoldPriceConfig
+from .models import GoldPriceSnapshot
+from .candles import CandleRollup
+from .cache import LatestPriceCache, PricingConfigCache, normalize_decimals
+from .providers import get_provider_chain
+from .streaming import broadcaster
 
 
 class GoldPriceService:
@@ -18,49 +23,27 @@ class GoldPriceService:
     OUNCE_TO_GRAM = Decimal("31.1035")
     GRAM_PER_TOLA = Decimal("11.6638038")
 
+    def __init__(self):
+        self.last_timings = {}
+        self.last_provider = None
+
     # --------------------------------------------
     # 1. Fetch live market prices
     # --------------------------------------------
     def fetch_live_prices(self):
         """
-        Most reliable fetch strategy for yfinance:
-        1. Try fast_info (fast, but unreliable)
-        2. Fallback to history() (slower, but very reliable)
+        Asks the provider chain (settings.GOLD_PRICE_PROVIDERS, in order)
+        for (usd_per_ounce, usd_pkr_rate). Providers behind an open
+        circuit breaker are skipped. Timings per provider/leg are kept
+        on self.last_timings.
         """
 
+        chain = get_provider_chain()
         try:
-            gold = yf.Ticker("GC=F")
-            fx = yf.Ticker("PKR=X")
-
-            # --------------------------------------------
-            # 1) TRY FAST_INFO
-            # --------------------------------------------
-            gold_fast = gold.fast_info.get("last_price")
-            fx_fast = fx.fast_info.get("last_price")
-
-            if gold_fast is not None and fx_fast is not None:
-                return Decimal(str(gold_fast)), Decimal(str(fx_fast))
-
-            # --------------------------------------------
-            # 2) FALLBACK TO HISTORY
-            # --------------------------------------------
-            gold_hist = gold.history(period="1d", interval="1m")
-            fx_hist = fx.history(period="1d", interval="1m")
-
-            if gold_hist.empty or fx_hist.empty:
-                raise ValueError("history() returned empty data for gold or PKR.")
-
-            gold_price = gold_hist["Close"].iloc[-1]
-            fx_price = fx_hist["Close"].iloc[-1]
-
-            if gold_price is None or fx_price is None:
-                raise ValueError("history() returned None values for close prices.")
-
-            return Decimal(str(gold_price)), Decimal(str(fx_price))
-
-        except Exception as e:
-            raise RuntimeError(f"Failed to fetch live prices via yfinance: {e}")
-
+            return chain.fetch()
+        finally:
+            self.last_timings = chain.last_timings
+            self.last_provider = chain.last_provider
 
     # --------------------------------------------
     # 2. Compute PKR prices with margins
@@ -76,14 +59,12 @@ class GoldPriceService:
         pkr_per_gram = pkr_per_ounce / self.OUNCE_TO_GRAM
         pkr_per_tola = pkr_per_gram * self.GRAM_PER_TOLA
 
-        # Apply margins
-        config = GoldPriceConfig.load()
-        safeguard = (Decimal("1.00") + config.safeguard_margin / Decimal("100"))
-        spread = (Decimal("1.00") + config.spread_margin / Decimal("100"))
+        # Apply margins (safeguard * spread, precomputed per config version)
+        multiplier = PricingConfigCache.get()["margin_multiplier"]
 
-        pkr_per_ounce_final = pkr_per_ounce * safeguard * spread
-        pkr_per_gram_final = pkr_per_gram * safeguard * spread
-        pkr_per_tola_final = pkr_per_tola * safeguard * spread
+        pkr_per_ounce_final = pkr_per_ounce * multiplier
+        pkr_per_gram_final = pkr_per_gram * multiplier
+        pkr_per_tola_final = pkr_per_tola * multiplier
 
         return {
             "usd_per_ounce": usd_per_ounce,
@@ -110,6 +91,18 @@ class GoldPriceService:
         usd_per_ounce, usd_pkr_rate = self.fetch_live_prices()
         computed = self.compute_prices(usd_per_ounce, usd_pkr_rate)
 
+        with transaction.atomic():
+            snapshot = self._create_snapshot(computed)
+            CandleRollup.apply_snapshot(snapshot)
+
+        # Refresh the latest-price cache so API reads skip the DB,
+        # then push to stream clients connected to this process
+        entry = LatestPriceCache.store(snapshot)
+        broadcaster.publish(snapshot.pk, entry["bodies"][False])
+
+        return snapshot
+
+    def _create_snapshot(self, computed):
         snapshot = GoldPriceSnapshot.objects.create(
             timestamp=timezone.now(),
             usd_per_ounce=computed["usd_per_ounce"],
@@ -121,15 +114,17 @@ class GoldPriceService:
             pkr_per_gram_final=computed["pkr_per_gram_final"],
             pkr_per_tola_final=computed["pkr_per_tola_final"],
         )
-
+        normalize_decimals(snapshot)
         return snapshot
 
     # --------------------------------------------
     # 4. Retrieve Latest Snapshot (API only)
     # --------------------------------------------
     def get_latest_snapshot(self):
-        return (
-            GoldPriceSnapshot.objects
-            .order_by("-timestamp")
-            .first()
-        )
\ No newline at end of file
+        return LatestPriceCache.get_snapshot()
+
+    def get_latest_price_body(self):
+        """
+        Pre-rendered JSON body for /api/market/gold-price/ (or None).
+        """
+        return LatestPriceCache.get_body()
@@ -0,0 +1,263 @@
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .cache import LatestPriceCache
+
+
+# --------------------------------------------
+# PRICE BROADCASTER (one per process)
+# --------------------------------------------
+class PriceBroadcaster:
+    """
+    Fans each new snapshot out to every connected stream client.
+    - Keeps the last `history` events for Last-Event-ID resume
+    - All idle clients wait on ONE asyncio.Event per tick (no per-client
+      queues or tasks), so thousands of connections cost a coroutine each
+    - publish() is thread-safe; snapshots stored in this process are
+      pushed immediately, and a single watcher task per process picks up
+      snapshots written elsewhere (worker process) via LatestPriceCache
+    """
+
+    def __init__(self, history=120, poll_seconds=1.0):
+        self._events = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._tick = None
+        self._watcher = None
+        self.poll_seconds = poll_seconds
+        self.clients = 0
+
+    @property
+    def last_event_id(self):
+        return self._events[-1][0] if self._events else None
+
+    def publish(self, event_id, data):
+        """
+        event_id: snapshot id (monotonic); data: JSON bytes/str.
+        """
+        if isinstance(data, bytes):
+            data = data.decode()
+
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._append, event_id, data)
+        else:
+            self._append(event_id, data)
+
+    def _append(self, event_id, data):
+        with self._lock:
+            if self._events and event_id <= self._events[-1][0]:
+                return
+            self._events.append((event_id, data))
+
+        tick, self._tick = self._tick, None
+        if tick is not None:
+            tick.set()
+
+    def events_after(self, event_id):
+        with self._lock:
+            events = list(self._events)
+
+        if event_id is None:
+            return events[-1:]
+        return [event for event in events if event[0] > event_id]
+
+    async def subscribe(self, last_event_id=None, heartbeat_seconds=15):
+        """
+        Async iterator of (event_id, data) tuples; yields None when
+        heartbeat_seconds pass without a new event.
+        Resumes after last_event_id (or starts from the latest event).
+        """
+        self._ensure_started()
+        self.clients += 1
+        try:
+            for event in self.events_after(last_event_id):
+                last_event_id = event[0]
+                yield event
+
+            while True:
+                if self._tick is None:
+                    self._tick = asyncio.Event()
+                tick = self._tick
+
+                # An event may have arrived between the replay and now
+                pending = self.events_after(last_event_id) if last_event_id is not None else []
+                if not pending:
+                    try:
+                        await asyncio.wait_for(tick.wait(), heartbeat_seconds)
+                    except asyncio.TimeoutError:
+                        yield None
+                        continue
+                    pending = self.events_after(last_event_id)
+
+                for event in pending:
+                    last_event_id = event[0]
+                    yield event
+        finally:
+            self.clients -= 1
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._tick = None
+            self._watcher = None
+
+        if self._watcher is None or self._watcher.done():
+            self._watcher = loop.create_task(self._watch_latest())
+
+    async def _watch_latest(self):
+        read_latest = sync_to_async(_read_latest, thread_sensitive=False)
+        while True:
+            try:
+                latest = await read_latest()
+            except Exception as e:
+                print(f"[PriceStream] ERROR reading latest price: {e}")
+                latest = None
+
+            if latest is not None:
+                event_id, data = latest
+                if self.last_event_id is None or event_id > self.last_event_id:
+                    self._append(event_id, data.decode())
+
+            await asyncio.sleep(self.poll_seconds)
+
+
+def _read_latest():
+    snapshot = LatestPriceCache.get_snapshot()
+    if snapshot is None:
+        return None
+    return snapshot.pk, LatestPriceCache.get_body()
+
+
+broadcaster = PriceBroadcaster(
+    history=settings.MARKET_STREAM_HISTORY,
+    poll_seconds=settings.MARKET_STREAM_POLL_SECONDS,
+)
+
+
+def _parse_event_id(value):
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+async def _authenticate(request):
+    """
+    JWT auth for plain (non-DRF) async views. Returns user or None.
+    """
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except (AuthenticationFailed, InvalidToken):
+        return None
+    return result[0] if result else None
+
+
+# --------------------------------------------
+# SERVER-SENT EVENTS
+# --------------------------------------------
+async def price_stream_view(request):
+    """
+    GET /api/market/stream/ (text/event-stream)
+    - event "price": same JSON body as /gold-price/, id = snapshot id
+    - comment heartbeat every MARKET_STREAM_HEARTBEAT_SECONDS
+    - resumes after the Last-Event-ID header (or ?last_event_id=)
+    """
+    if request.method != "GET":
+        return JsonResponse({"detail": "Method not allowed."}, status=405)
+
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+
+    last_event_id = _parse_event_id(
+        request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    )
+
+    async def events():
+        yield "retry: 3000\n\n"
+        async for event in broadcaster.subscribe(last_event_id, settings.MARKET_STREAM_HEARTBEAT_SECONDS):
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            event_id, data = event
+            yield f"id: {event_id}\nevent: price\ndata: {data}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# --------------------------------------------
+# WEBSOCKET (raw ASGI, routed from config/asgi.py)
+# --------------------------------------------
+WEBSOCKET_PATH = "/ws/market/gold-price/"
+
+
+async def _websocket_user(token):
+    auth = JWTAuthentication()
+    try:
+        validated = auth.get_validated_token(token)
+        return await sync_to_async(auth.get_user)(validated)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ws(s)://.../ws/market/gold-price/?token=<JWT access>&last_event_id=<id>
+    Sends {"type": "price", "id": ..., "data": {...}} per snapshot and
+    {"type": "ping"} as heartbeat. Browsers cannot set headers on
+    WebSockets, hence the token query param.
+    """
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    if scope["path"] != WEBSOCKET_PATH:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    token = (query.get("token") or [None])[0]
+    user = await _websocket_user(token) if token else None
+    if user is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+
+    await send({"type": "websocket.accept"})
+    last_event_id = _parse_event_id((query.get("last_event_id") or [None])[0])
+
+    async def pump():
+        async for event in broadcaster.subscribe(last_event_id, settings.MARKET_STREAM_HEARTBEAT_SECONDS):
+            if event is None:
+                payload = '{"type":"ping"}'
+            else:
+                event_id, data = event
+                payload = f'{{"type":"price","id":{event_id},"data":{data}}}'
+            await send({"type": "websocket.send", "text": payload})
+
+    sender = asyncio.ensure_future(pump())
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
+        sender.cancel()
+        try:
+            await sender
+        except (asyncio.CancelledError, Exception):
+            pass
+
@@ -1,3 +1,757 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from datetime import timedelta, timezone as dt_timezone
+import time
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+import numpy as np
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from config.perf import query_budget
+from market import partitions
+from market.backfill import SnapshotBackfill, load_csv
+from market.candles import CandleRollup, local_day_start
+from market.closing import ClosingPriceEngine
+from market.cache import LatestPriceCache, PricingConfigCache, get_config_version
+from market.models import DailyClosingPrice, GoldPriceConfig, GoldPriceSnapshot, PriceCandle
+from market.retention import SnapshotRetention
+from market.providers import CircuitBreaker, ProviderChain, StubPriceProvider, YahooChartProvider, YFinanceProvider
+from market.services import GoldPriceService
+from market.streaming import PriceBroadcaster
+from market.worker import PricePoller
+from market.leader import LeaderLease, get_scheduler_lease, leader_only
+from market.scheduler import build_scheduler
+from market.models import SchedulerLease
+
+
+User = get_user_model()
+
+
+def make_snapshot(timestamp=None, gram=Decimal("40000")):
+    return GoldPriceSnapshot.objects.create(
+        timestamp=timestamp or timezone.now(),
+        usd_per_ounce=Decimal("2000"),
+        usd_pkr_rate=Decimal("280"),
+        pkr_per_ounce_raw=gram * Decimal("31.1035"),
+        pkr_per_gram_raw=gram,
+        pkr_per_tola_raw=gram * Decimal("11.6638038"),
+        pkr_per_ounce_final=gram * Decimal("31.1035"),
+        pkr_per_gram_final=gram,
+        pkr_per_tola_final=gram * Decimal("11.6638038"),
+    )
+
+
+class LatestPriceCacheTests(TestCase):
+
+    def setUp(self):
+        GoldPriceConfig.objects.create()
+        LatestPriceCache.invalidate()
+
+        self.user = User.objects.create_user(username="viewer", password="testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        LatestPriceCache.invalidate()
+
+    def test_store_snapshot_fills_cache(self):
+        service = GoldPriceService()
+        with mock.patch.object(
+            service, "fetch_live_prices", return_value=(Decimal("2000"), Decimal("280"))
+        ):
+            snapshot = service.fetch_and_store_snapshot()
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/market/gold-price/")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data["is_stale"])
+        self.assertEqual(Decimal(str(data["pkr_per_gram_final"])), snapshot.pkr_per_gram_final.quantize(Decimal("0.0001")))
+        self.assertEqual(data["margins"]["safeguard_margin"], 2.0)
+
+    def test_falls_back_to_db_when_empty(self):
+        snapshot = make_snapshot()
+        self.assertEqual(LatestPriceCache.get_snapshot().pk, snapshot.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(LatestPriceCache.get_snapshot().pk, snapshot.pk)
+
+    def test_is_stale_recomputed_on_read(self):
+        make_snapshot(timestamp=timezone.now() - timedelta(seconds=170))
+        self.assertFalse(self.client.get("/api/market/gold-price/").json()["is_stale"])
+
+        later = timezone.now() + timedelta(seconds=30)
+        with mock.patch("market.cache.timezone.now", return_value=later):
+            self.assertTrue(self.client.get("/api/market/gold-price/").json()["is_stale"])
+
+    def test_no_snapshot_returns_503(self):
+        response = self.client.get("/api/market/gold-price/")
+        self.assertEqual(response.status_code, 503)
+
+    def test_conditional_get(self):
+        make_snapshot(timestamp=timezone.now() - timedelta(seconds=20))
+        response = self.client.get("/api/market/gold-price/")
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("max-age=40", response["Cache-Control"])
+        self.assertIn("Authorization", response["Vary"])
+
+        etag = response["ETag"]
+        response = self.client.get("/api/market/gold-price/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get(
+            "/api/market/gold-price/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # Config change re-renders the body, so the old ETag no longer matches
+        config = GoldPriceConfig.load()
+        config.spread_margin = Decimal("4.00")
+        config.save()
+        response = self.client.get("/api/market/gold-price/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(MARKET_CLOSING_RECOMPUTE_DAYS=3)
+    def test_closing_prices_are_immutable_once_final(self):
+        today = timezone.localdate()
+        for offset in (4, 3, 2, 1, 0):
+            DailyClosingPrice.objects.create(
+                date=today - timedelta(days=offset),
+                closing_ounce=Decimal("1"),
+                closing_gram=Decimal("1"),
+                closing_tola=Decimal("1"),
+            )
+
+        def day(offset):
+            return (today - timedelta(days=offset)).isoformat()
+
+        response = self.client.get(f"/api/market/closing-prices/{day(3)}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+
+        # Still rewritten by the nightly job
+        for offset in (2, 1, 0):
+            response = self.client.get(f"/api/market/closing-prices/{day(offset)}/")
+            self.assertNotIn("immutable", response["Cache-Control"])
+
+        response = self.client.get("/api/market/closing-prices/", {"from": day(4), "to": day(3)})
+        self.assertEqual(len(response.json()["prices"]), 2)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(len(response["ETag"]), 42)
+
+        response = self.client.get(
+            "/api/market/closing-prices/", {"from": day(4), "to": day(3)}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # Gaps may still be backfilled
+        for params in ({"to": day(3)}, {"from": day(20), "to": day(10)}):
+            response = self.client.get("/api/market/closing-prices/", params)
+            self.assertNotIn("immutable", response["Cache-Control"])
+
+    def test_process_local_cache_rechecks_db(self):
+        first = make_snapshot(timestamp=timezone.now() - timedelta(seconds=60))
+        self.assertEqual(LatestPriceCache.get_snapshot().pk, first.pk)
+
+        # Written by the poller process: never reaches this locmem cache
+        second = make_snapshot(gram=Decimal("41000"))
+        self.assertEqual(LatestPriceCache.get_snapshot().pk, first.pk)
+
+        with mock.patch("market.cache.LOCAL_TTL_SECONDS", 0):
+            self.assertEqual(LatestPriceCache.get_snapshot().pk, second.pk)
+            with self.assertNumQueries(2):
+                # Same snapshot and config: one check each, no re-render
+                body = LatestPriceCache.get_body()
+        self.assertIn(b'"pkr_per_gram_final":41000', body)
+
+    def test_check_requires_shared_cache_for_out_of_process_poller(self):
+        from market.checks import check_shared_price_cache
+
+        with override_settings(DJANGO_ENV="local", MARKET_SCHEDULER_IN_WEB=False):
+            self.assertEqual(check_shared_price_cache(None), [])
+        with override_settings(DJANGO_ENV="staging", MARKET_SCHEDULER_IN_WEB=False):
+            self.assertEqual([e.id for e in check_shared_price_cache(None)], ["market.W001"])
+        with override_settings(DJANGO_ENV="staging", MARKET_SCHEDULER_IN_WEB=True):
+            self.assertEqual(check_shared_price_cache(None), [])
+
+
+class PricingConfigCacheTests(TestCase):
+
+    def setUp(self):
+        self.config = GoldPriceConfig.objects.create(
+            safeguard_margin=Decimal("2.00"),
+            spread_margin=Decimal("3.00"),
+            buy_fee_percentage=Decimal("3.00"),
+        )
+
+    def test_precomputes_multiplier_and_fee_rates(self):
+        pricing = PricingConfigCache.get()
+        self.assertEqual(pricing["margin_multiplier"], Decimal("1.02") * Decimal("1.03"))
+        self.assertEqual(pricing["buy_fee_rate"], Decimal("0.03"))
+        self.assertEqual(pricing["sell_fee_rate"], Decimal("0"))
+
+    def test_cached_until_version_bump(self):
+        PricingConfigCache.get()
+        with self.assertNumQueries(0):
+            PricingConfigCache.get()
+
+        self.config.spread_margin = Decimal("5.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.config.save()
+
+        pricing = PricingConfigCache.get()
+        self.assertEqual(pricing["spread_margin"], Decimal("5.00"))
+        self.assertEqual(pricing["margin_multiplier"], Decimal("1.02") * Decimal("1.05"))
+
+    @mock.patch("market.cache.cache_is_process_local", return_value=False)
+    def test_version_bumps_only_on_commit(self, process_local):
+        before = get_config_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.config.spread_margin = Decimal("5.00")
+            self.config.save()
+            # Uncommitted: workers must keep the old version and row
+            self.assertEqual(get_config_version(), before)
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        self.assertNotEqual(get_config_version(), before)
+
+    def test_config_change_in_another_process_is_seen(self):
+        PricingConfigCache.get()
+
+        # No save(), so no version bump in this process
+        GoldPriceConfig.objects.filter(pk=self.config.pk).update(
+            spread_margin=Decimal("6.00"), updated_at=timezone.now() + timedelta(seconds=1),
+        )
+        self.assertEqual(PricingConfigCache.get()["spread_margin"], Decimal("3.00"))
+
+        with mock.patch("market.cache.LOCAL_TTL_SECONDS", 0):
+            self.assertEqual(PricingConfigCache.get()["spread_margin"], Decimal("6.00"))
+
+    def test_price_body_follows_config_version(self):
+        make_snapshot()
+        LatestPriceCache.invalidate()
+        LatestPriceCache.get_body()
+
+        self.config.safeguard_margin = Decimal("4.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.config.save()
+
+        self.assertIn(b'"safeguard_margin":4.0', LatestPriceCache.get_body())
+
+
+class PriceProviderTests(TestCase):
+
+    def setUp(self):
+        self.provider = YFinanceProvider(deadline_seconds=1, hedge_after_seconds=0.05)
+
+    def test_slow_fast_info_is_hedged_with_history(self):
+        def slow_fast_info(symbol):
+            time.sleep(0.5)
+            return Decimal("1")
+
+        with mock.patch.object(self.provider, "fetch_quote", side_effect=slow_fast_info), \
+                mock.patch.object(self.provider, "fetch_quote_fallback", side_effect=lambda s: Decimal("2")):
+            started = time.monotonic()
+            gold, fx = self.provider.fetch()
+
+        self.assertEqual((gold, fx), (Decimal("2"), Decimal("2")))
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertIn("GC=F:fallback", self.provider.last_timings)
+
+    def test_deadline_raises(self):
+        def hang(symbol):
+            time.sleep(2)
+
+        with mock.patch.object(self.provider, "fetch_quote", side_effect=hang), \
+                mock.patch.object(self.provider, "fetch_quote_fallback", side_effect=hang):
+            with self.assertRaises(RuntimeError):
+                self.provider.fetch()
+
+        self.assertLess(self.provider.last_timings["total"], 1.5)
+
+    def test_stub_provider_is_deterministic(self):
+        stub = StubPriceProvider()
+        when = timezone.now()
+        self.assertEqual(stub.prices_at(when), stub.prices_at(when))
+
+    def test_chain_falls_back_and_opens_breaker(self):
+        broken = YahooChartProvider()
+        chain = ProviderChain([broken, StubPriceProvider()], failure_threshold=2, cooldown_seconds=60)
+
+        with mock.patch.object(broken, "fetch", side_effect=RuntimeError("down")) as fetch:
+            for _ in range(3):
+                chain.fetch()
+                self.assertEqual(chain.last_provider, "stub")
+
+        # Third poll skipped the broken provider entirely
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(chain.status()["yahoo_chart"]["state"], "open")
+
+    def test_half_open_breaker_lets_one_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=60)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        breaker.open_until = time.monotonic()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # trial still running
+
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        breaker.open_until = time.monotonic()
+        self.assertTrue(breaker.allow())
+        breaker.record_success(duration=0.1)
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow() and breaker.allow())
+
+
+class CandleRollupTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="charter", password="testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        base = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        prices = ["100", "105", "95", "102", "110", "90"]
+        # Out of order on purpose: open/close follow timestamps, not insert order
+        for i in (0, 2, 1, 3, 5, 4):
+            snapshot = make_snapshot(timestamp=base + timedelta(minutes=30 * i), gram=Decimal(prices[i]))
+            CandleRollup.apply_snapshot(snapshot)
+        self.base = base
+
+    def test_incremental_rollup(self):
+        first_hour = PriceCandle.objects.get(resolution="1h", bucket_start=self.base)
+        self.assertEqual(
+            (first_hour.open, first_hour.high, first_hour.low, first_hour.close, first_hour.sample_count),
+            (Decimal("100"), Decimal("105"), Decimal("100"), Decimal("105"), 2),
+        )
+        self.assertEqual(PriceCandle.objects.filter(resolution="1h").count(), 3)
+
+    def test_rebuild_matches_incremental(self):
+        fields = ("resolution", "bucket_start", "open", "high", "low", "close", "sample_count")
+        incremental = sorted(PriceCandle.objects.values_list(*fields))
+
+        PriceCandle.objects.all().delete()
+        day = timezone.localtime(self.base).date()
+        CandleRollup.rebuild(day - timedelta(days=1), day + timedelta(days=1))
+
+        self.assertEqual(sorted(PriceCandle.objects.values_list(*fields)), incremental)
+
+    def test_rebuild_after_retention_keeps_old_candles(self):
+        hour = timezone.localtime(timezone.now() - timedelta(days=10)).replace(minute=0, second=0, microsecond=0)
+        for minute, price in ((0, "100"), (20, "120"), (40, "80"), (50, "90")):
+            CandleRollup.apply_snapshot(make_snapshot(timestamp=hour + timedelta(minutes=minute), gram=Decimal(price)))
+
+        fields = ("resolution", "bucket_start", "open", "high", "low", "close", "sample_count")
+        before = sorted(PriceCandle.objects.values_list(*fields))
+
+        # Thinned to the hour's close, then rebuilt from the oldest snapshot
+        SnapshotRetention(full_days=7, downsampled_days=365).run()
+        self.assertEqual(GoldPriceSnapshot.objects.filter(timestamp__lt=self.base - timedelta(days=5)).count(), 1)
+        call_command("rollup_candles", stdout=io.StringIO())
+
+        self.assertEqual(sorted(PriceCandle.objects.values_list(*fields)), before)
+
+    def test_history_endpoint_reads_candles(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/market/history/1h/")
+
+        self.assertEqual(response.status_code, 200)
+        candles = response.json()["candles"]
+        self.assertEqual(len(candles), 3)
+        self.assertEqual([c["close"] for c in candles], [105.0, 102.0, 90.0])
+
+        # Revalidation only runs the summary query
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/market/history/1h/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        snapshot = make_snapshot(timestamp=self.base + timedelta(minutes=170), gram=Decimal("97"))
+        CandleRollup.apply_snapshot(snapshot)
+        response = self.client.get("/api/market/history/1h/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+        # Rewritten bucket with the same sample count (backfill)
+        candle = PriceCandle.objects.filter(resolution="1h").order_by("bucket_start").first()
+        PriceCandle.objects.filter(pk=candle.pk).update(close=candle.close + 1)
+        response = self.client.get("/api/market/history/1h/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_history_rejects_oversized_range(self):
+        response = self.client.get("/api/market/history/5m/", {"from": "2020-01-01T00:00:00"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SnapshotRetentionTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        hour = timezone.localtime(self.now - timedelta(days=10)).replace(minute=0, second=0, microsecond=0)
+
+        self.recent = [make_snapshot(self.now - timedelta(minutes=m)) for m in (1, 2, 3)]
+        self.hourly = [make_snapshot(hour + timedelta(minutes=m)) for m in (0, 20, 40)]
+        self.old = [make_snapshot(self.now - timedelta(days=40, minutes=m)) for m in (1, 2, 3)]
+
+        DailyClosingPrice.objects.create(
+            date=timezone.localtime(self.old[0].timestamp).date(),
+            closing_ounce=1, closing_gram=1, closing_tola=1,
+            source_snapshot=self.old[0],
+        )
+
+    def test_tiers_and_references(self):
+        report = SnapshotRetention(full_days=5, downsampled_days=30, batch_size=1).run(now=self.now)
+
+        remaining = set(GoldPriceSnapshot.objects.values_list("id", flat=True))
+        expected = {s.id for s in self.recent} | {self.hourly[-1].id, self.old[0].id}
+        self.assertEqual(remaining, expected)
+
+        self.assertEqual(report["downsampled_rows"], 2)
+        self.assertEqual(report["expired_rows"], 2)
+        self.assertEqual(report["batches"], 4)
+        self.assertEqual(report["bytes_estimate"], 4 * report["row_bytes"])
+
+    def test_dry_run_deletes_nothing(self):
+        report = SnapshotRetention(full_days=5, downsampled_days=30).run(now=self.now, dry_run=True)
+        self.assertEqual(report["rows"], 4)
+        self.assertEqual(GoldPriceSnapshot.objects.count(), 9)
+
+
+class SnapshotPartitioningTests(TestCase):
+
+    def snapshot_foreign_keys(self):
+        from wallet.models import BuyOrder, SellOrder
+
+        found = []
+        with connection.cursor() as cursor:
+            for model in (BuyOrder, SellOrder, DailyClosingPrice):
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                found += [
+                    model.__name__ for c in constraints.values()
+                    if c["foreign_key"] == (partitions.TABLE, "id")
+                ]
+        return found
+
+    @skipIf(connection.vendor == "postgresql", "the snapshot table is partitioned on Postgres")
+    def test_plain_table_keeps_foreign_keys(self):
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(self.snapshot_foreign_keys(), ["BuyOrder", "SellOrder", "DailyClosingPrice"])
+
+    @skipUnless(connection.vendor == "postgresql", "Postgres only")
+    def test_migration_partitions_snapshots_by_month(self):
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual(self.snapshot_foreign_keys(), [])
+
+        this_month = partitions.month_start(timezone.now().astimezone(dt_timezone.utc))
+        names = [name for name, _ in partitions.list_partitions()]
+        self.assertIn(partitions.partition_name(this_month), names)
+        self.assertIn(partitions.partition_name(partitions.add_months(this_month, 3)), names)
+
+        first = make_snapshot()
+        second = make_snapshot(timestamp=timezone.now() - timedelta(days=3650))
+        self.assertEqual(second.pk, first.pk + 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id, tableoid::regclass::text FROM "{partitions.TABLE}" ORDER BY id'
+            )
+            self.assertEqual(cursor.fetchall(), [
+                (first.pk, partitions.partition_name(this_month)),
+                (second.pk, partitions.DEFAULT_PARTITION),
+            ])
+
+    @skipUnless(connection.vendor == "postgresql", "Postgres only")
+    def test_later_fk_changes_do_not_recreate_the_constraint(self):
+        from wallet.models import BuyOrder
+
+        # What a later AlterField on the FK runs, from migration state
+        old_field = BuyOrder._meta.get_field("snapshot_reference")
+        name, path, args, kwargs = old_field.deconstruct()
+        new_field = models.ForeignKey(*args, **{**kwargs, "to": GoldPriceSnapshot, "db_index": False})
+        new_field.set_attributes_from_name(name)
+        new_field.model = BuyOrder
+        with connection.schema_editor() as editor:
+            editor.alter_field(BuyOrder, old_field, new_field, strict=True)
+
+        self.assertFalse(old_field.db_constraint)
+        self.assertEqual(self.snapshot_foreign_keys(), [])
+
+
+class PriceStreamTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("market.streaming._read_latest", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def collect(self, broadcaster, count, last_event_id=None, publish=()):
+        async def run():
+            events = []
+            stream = broadcaster.subscribe(last_event_id, heartbeat_seconds=0.05)
+            async for event in stream:
+                events.append(event)
+                if len(events) == 1:
+                    for event_id, data in publish:
+                        broadcaster.publish(event_id, data)
+                if len(events) >= count:
+                    break
+            await stream.aclose()
+            return events
+
+        return asyncio.run(run())
+
+    def test_resumes_after_last_event_id(self):
+        broadcaster = PriceBroadcaster(history=10, poll_seconds=60)
+        for event_id in (1, 2, 3):
+            broadcaster.publish(event_id, b"{}")
+
+        events = self.collect(broadcaster, 2, last_event_id=1)
+        self.assertEqual([e[0] for e in events], [2, 3])
+
+    def test_heartbeat_then_published_event(self):
+        broadcaster = PriceBroadcaster(history=10, poll_seconds=60)
+        broadcaster.publish(1, b'{"a":1}')
+
+        events = self.collect(broadcaster, 3, publish=[(2, b'{"a":2}')])
+        self.assertEqual(events[0], (1, '{"a":1}'))
+        self.assertEqual(events[1], (2, '{"a":2}'))
+        self.assertIsNone(events[2])
+        self.assertEqual(broadcaster.clients, 0)
+
+    def test_stream_requires_auth(self):
+        response = self.client.get("/api/market/stream/")
+        self.assertEqual(response.status_code, 401)
+
+
+class SnapshotBackfillTests(TestCase):
+
+    def setUp(self):
+        GoldPriceConfig.objects.create()
+
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as f:
+            f.write("timestamp,gold_close,fx_close\n")
+            # 2024-01-01 17:00..20:59 UTC = 22:00..01:59 Karachi (two local days)
+            for minute in range(240):
+                f.write(f"{1704128400 + minute * 60},{2000 + minute},280.5\n")
+            f.write("1704143000,,\n")
+        self.addCleanup(os.remove, self.path)
+
+    def test_csv_backfill(self):
+        epoch, gold, fx = load_csv(self.path)
+        self.assertEqual(len(epoch), 240)
+
+        report = SnapshotBackfill(chunk_size=100).run(epoch, gold, fx)
+        self.assertEqual(report["rows"], 240)
+        self.assertEqual(report["closes"], 2)
+        self.assertEqual(GoldPriceSnapshot.objects.count(), 240)
+
+        # Same numbers as the per-snapshot path
+        snapshot = GoldPriceSnapshot.objects.order_by("timestamp").last()
+        expected = GoldPriceService().compute_prices(Decimal("2239"), Decimal("280.5"))
+        for field in ("pkr_per_ounce_raw", "pkr_per_gram_final", "pkr_per_tola_final"):
+            self.assertEqual(getattr(snapshot, field), expected[field].quantize(Decimal("0.0001")))
+
+        first_close = DailyClosingPrice.objects.order_by("date").first()
+        self.assertEqual(first_close.source_snapshot.usd_per_ounce, Decimal("2119"))
+        self.assertEqual(PriceCandle.objects.filter(resolution="1h").count(), 4)
+
+        # Re-running skips rows that are already stored
+        self.assertEqual(SnapshotBackfill().run(epoch, gold, fx)["skipped"], 240)
+        self.assertEqual(GoldPriceSnapshot.objects.count(), 240)
+
+    def test_prices_are_stored_at_field_precision(self):
+        epoch = np.array([1704128400], dtype=np.int64)
+        SnapshotBackfill().run(epoch, np.array([40000.123456]), np.array([280.123456]))
+
+        snapshot = GoldPriceSnapshot.objects.get()
+        self.assertEqual(snapshot.usd_per_ounce, Decimal("40000.1235"))
+        self.assertEqual(snapshot.usd_pkr_rate, Decimal("280.1235"))
+
+
+class ClosingPriceEngineTests(TestCase):
+
+    def test_recompute_range(self):
+        today = timezone.localdate()
+        noon = local_day_start(today) + timedelta(hours=12)
+
+        for days_ago in (3, 1):
+            for hours, gram in ((0, "100"), (11, "120"), (-11, "80")):
+                make_snapshot(timestamp=noon - timedelta(days=days_ago, hours=-hours), gram=Decimal(gram))
+        DailyClosingPrice.objects.create(
+            date=today - timedelta(days=1),
+            closing_ounce=Decimal("1"),
+            closing_gram=Decimal("1"),
+            closing_tola=Decimal("1"),
+        )
+
+        report = ClosingPriceEngine.recompute(today - timedelta(days=3), today)
+
+        self.assertEqual(report["days"], 2)
+        self.assertEqual(report["missing"], [today - timedelta(days=2), today])
+        closes = dict(DailyClosingPrice.objects.values_list("date", "closing_gram"))
+        self.assertEqual(closes, {
+            today - timedelta(days=3): Decimal("120"),
+            today - timedelta(days=1): Decimal("120"),
+        })
+
+
+class PricePollerTests(TestCase):
+
+    def make_poller(self, durations, interval=0.1):
+        service = mock.Mock(last_timings={}, last_provider="stub")
+        calls = []
+
+        def fetch_and_store_snapshot():
+            calls.append(time.monotonic())
+            delay = durations.pop(0) if durations else 0
+            if delay is None:
+                raise RuntimeError("provider down")
+            time.sleep(delay)
+            return mock.Mock(pk=len(calls), timestamp=timezone.now(), pkr_per_gram_final=Decimal("1"))
+
+        service.fetch_and_store_snapshot.side_effect = fetch_and_store_snapshot
+        return PricePoller(interval, service=service, log=lambda message: None), calls
+
+    def test_ticks_stay_on_grid(self):
+        poller, calls = self.make_poller([0.04, 0.02, 0.0, 0.03])
+        stats = poller.run(max_cycles=5)
+
+        self.assertEqual(stats["cycles"], 5)
+        self.assertEqual(stats["skipped"], 0)
+        offsets = [(t - calls[0]) / 0.1 for t in calls]
+        for n, offset in enumerate(offsets):
+            self.assertAlmostEqual(offset, n, delta=0.4)
+
+    def test_overrun_skips_ticks_and_failures_are_counted(self):
+        poller, calls = self.make_poller([0.25, None])
+        stats = poller.run(max_cycles=3)
+
+        self.assertEqual(stats["skipped"], 2)
+        self.assertEqual(stats["failures"], 1)
+        self.assertAlmostEqual((calls[1] - calls[0]) / 0.1, 3, delta=0.4)
+
+    def test_stop_event_ends_loop(self):
+        poller, calls = self.make_poller([])
+        stop_event = mock.Mock()
+        stop_event.is_set.side_effect = [False, False, True]
+        stats = poller.run(stop_event)
+
+        self.assertEqual(stats["cycles"], 2)
+
+
+class LeaderLeaseTests(TestCase):
+
+    def test_single_leader_and_takeover(self):
+        first = LeaderLease(ttl_seconds=15, holder="node-a", log=lambda message: None)
+        second = LeaderLease(ttl_seconds=15, holder="node-b", log=lambda message: None)
+
+        self.assertTrue(first.try_acquire())
+        self.assertFalse(second.try_acquire())
+        self.assertTrue(first.try_acquire())  # renew
+        self.assertTrue(first.is_leader)
+        self.assertFalse(second.is_leader)
+
+        # Leader dies: its lease lapses and the standby takes over
+        SchedulerLease.objects.filter(name=first.name).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(second.try_acquire())
+        self.assertFalse(first.try_acquire())
+        self.assertFalse(first.is_leader)
+
+        # Clean release hands over immediately
+        second.release()
+        self.assertTrue(first.try_acquire())
+        self.assertEqual(SchedulerLease.objects.get().holder, "node-a")
+
+    def test_status_endpoint_is_admin_only(self):
+        LeaderLease(holder="node-a", log=lambda message: None).try_acquire()
+        client = APIClient()
+
+        client.force_authenticate(User.objects.create_user(username="plain", password="testpass"))
+        self.assertEqual(client.get("/api/market/leader/").status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username="ops", password="testpass", is_staff=True))
+        lease = client.get("/api/market/leader/").json()["leases"][0]
+        self.assertEqual(lease["holder"], "node-a")
+        self.assertTrue(lease["active"])
+
+
+class SchedulerTests(TestCase):
+
+    def run_due_jobs(self, scheduler, job_id):
+        done = threading.Event()
+        scheduler.add_listener(lambda event: event.job_id == job_id and done.set(), EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+        scheduler.start()
+        try:
+            self.assertTrue(done.wait(5))
+        finally:
+            scheduler.shutdown(wait=True)
+
+    def test_standby_run_does_not_consume_the_leaders(self):
+        runs = []
+
+        @leader_only
+        def probe():
+            runs.append(1)
+
+        # Two nodes, same database; the standby fires first
+        standby, leader = build_scheduler(include_polling=False), build_scheduler(include_polling=False)
+        for scheduler in (standby, leader):
+            scheduler.add_job(probe, trigger="interval", hours=1, next_run_time=timezone.now(), id="probe_job")
+
+        lease = get_scheduler_lease()
+        with mock.patch.object(lease, "_valid_until", 0.0), mock.patch.object(lease, "try_acquire", return_value=False):
+            self.run_due_jobs(standby, "probe_job")
+        self.assertEqual(runs, [])
+
+        with mock.patch.object(lease, "try_acquire", return_value=True):
+            self.run_due_jobs(leader, "probe_job")
+        self.assertEqual(runs, [1])
+
+class MarketEndpointBudgetTests(TestCase):
+    """
+    Query-count and latency budgets for the price endpoints polled by
+    every client.
+    """
+
+    def setUp(self):
+        GoldPriceConfig.objects.create()
+        LatestPriceCache.invalidate()
+        self.addCleanup(LatestPriceCache.invalidate)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="ticker", password="testpass"))
+
+        start = timezone.now() - timedelta(hours=24)
+        for minute in range(0, 24 * 60, 10):
+            CandleRollup.apply_snapshot(make_snapshot(timestamp=start + timedelta(minutes=minute)))
+
+    def test_gold_price_cold_and_warm(self):
+        with query_budget("gold_price_cold", max_queries=2, max_ms=100):
+            self.assertEqual(self.client.get("/api/market/gold-price/").status_code, 200)
+        with query_budget("gold_price_warm", max_queries=0, max_ms=50):
+            response = self.client.get("/api/market/gold-price/")
+        with query_budget("gold_price_not_modified", max_queries=0, max_ms=50):
+            response = self.client.get("/api/market/gold-price/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_history_day_of_5m_candles(self):
+        with query_budget("history_5m", max_queries=2, max_ms=250):
+            response = self.client.get("/api/market/history/5m/")
+        self.assertEqual(len(response.json()["candles"]), 24 * 6)
@@ -1,11 +1,33 @@
 from django.urls import path
-from .views import GoldPriceView
+from .views import (
+    GoldPriceView,
+    FiveMinuteHistoryView,
+    HourHistoryView,
+    DayHistoryView,
+    ClosingPriceListView,
+    ClosingPriceDetailView,
+    LeaderStatusView,
+)
+from .streaming import price_stream_view
 
 urlpatterns = [
     path("gold-price/", GoldPriceView.as_view(), name="gold-price"),
-    
+
+    # Live push of each new snapshot (Server-Sent Events, ASGI)
+    path("stream/", price_stream_view, name="gold-price-stream"),
+
+    # OHLC history (served from candle rollups)
+    path("history/5m/", FiveMinuteHistoryView.as_view(), name="gold-price-history-5m"),
+    path("history/1h/", HourHistoryView.as_view(), name="gold-price-history-1h"),
+    path("history/1d/", DayHistoryView.as_view(), name="gold-price-history-1d"),
+
+    # Daily closing prices (final once outside the nightly recompute window)
+    path("closing-prices/", ClosingPriceListView.as_view(), name="closing-prices"),
+    path("closing-prices/<str:day>/", ClosingPriceDetailView.as_view(), name="closing-price-detail"),
+
+    # Scheduler leader lease (admin only)
+    path("leader/", LeaderStatusView.as_view(), name="scheduler-leader"),
+
     # Future endpoints (placeholders for now)
-    # path("history/1h/", HourHistoryView.as_view()),
-    # path("history/1d/", DayHistoryView.as_view()),
     # path("config/", GoldPriceConfigView.as_view()),
 ]
\ No newline at end of file
@@ -1,53 +1,327 @@
+from datetime import date, timedelta
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
 from rest_framework import status
-from django.utils import timezone
 
-from .services import GoldPriceService
-from .models import GoldPriceConfig
+from .cache import LatestPriceCache, seconds_until_next_snapshot
+from .candles import bucket_start, local_day_start
+from .leader import lease_status
+from .models import DailyClosingPrice, PriceCandle
+
+
+# Closed candles can still be rewritten by a backfill, so they get a
+# long max-age but are not marked immutable.
+CLOSED_RANGE_MAX_AGE = 60 * 60 * 24
+
+# Closing prices the nightly job no longer rewrites never change
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+# --------------------------------------------
+# HTTP caching helpers
+# --------------------------------------------
+def conditional_response(request, build, etag, last_modified=None, max_age=0, immutable=False):
+    """
+    Returns 304 when If-None-Match / If-Modified-Since match, otherwise
+    build(). Either way the response carries ETag, Last-Modified and a
+    private Cache-Control (Vary: Authorization): the endpoints require a
+    JWT, so only the client's own cache may keep the response.
+    """
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if response is None:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+
+    response["ETag"] = etag
+    if last_modified_ts is not None:
+        response["Last-Modified"] = http_date(last_modified_ts)
+
+    if immutable:
+        patch_cache_control(response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, private=True, max_age=max_age)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+def hashed_etag(*parts):
+    """
+    Strong ETag from arbitrary parts; the digest keeps the header short
+    whatever the range size.
+    """
+    return '"{}"'.format(hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest())
 
 
 class GoldPriceView(APIView):
     """
     Returns the latest saved gold price snapshot (not live).
+    Served from the pre-rendered latest-price cache, with ETag /
+    Last-Modified validators and max-age up to the next snapshot.
     """
 
     def get(self, request):
-        service = GoldPriceService()
-        snapshot = service.get_latest_snapshot()
+        parts = LatestPriceCache.get_response_parts()
 
-        if not snapshot:
+        if parts is None:
             return Response(
                 {"detail": "No price data available yet. Please try again shortly."},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-        # Get config margins
-        config = GoldPriceConfig.get_solo()
+        return conditional_response(
+            request,
+            lambda: HttpResponse(parts["body"], content_type="application/json", status=status.HTTP_200_OK),
+            etag=parts["etag"],
+            last_modified=parts["last_modified"],
+            max_age=parts["max_age"],
+        )
+
+
+# --------------------------------------------
+# PRICE HISTORY (OHLC candles)
+# --------------------------------------------
+class CandleHistoryView(APIView):
+    """
+    Returns OHLC candles (pkr_per_gram_final) from the PriceCandle
+    rollups only, never raw snapshots.
+    Query params:
+    - from / to: ISO datetimes (default: last default_window)
+    """
+
+    resolution = None
+    default_window = None
+    max_window = None
+
+    def get(self, request):
+        now = timezone.now()
+
+        try:
+            end = self._parse_datetime(request.query_params.get("to")) or now
+            start = self._parse_datetime(request.query_params.get("from")) or end - self.default_window
+        except ValueError:
+            return Response(
+                {"detail": "from/to must be ISO 8601 datetimes."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if start >= end:
+            return Response({"detail": "from must be before to."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if end - start > self.max_window:
+            return Response(
+                {"detail": f"Range too large for {self.resolution} candles (max {self.max_window.days} days)."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        candles = PriceCandle.objects.filter(
+            resolution=self.resolution,
+            bucket_start__gte=bucket_start(self.resolution, start),
+            bucket_start__lt=end,
+        )
+
+        # Cheap fingerprint of the range: a merged snapshot bumps
+        # sample_count, a backfill that rewrites buckets changes their
+        # values, so the 304 path never loads the rows
+        summary = candles.aggregate(
+            count=Count("id"),
+            samples=Sum("sample_count"),
+            last=Max("close_timestamp"),
+            open=Sum("open"),
+            high=Sum("high"),
+            low=Sum("low"),
+            close=Sum("close"),
+        )
+        etag = hashed_etag(
+            self.resolution,
+            int(start.timestamp()),
+            *(summary[key] for key in ("count", "samples", "last", "open", "high", "low", "close")),
+        )
+
+        # Ranges ending before the current bucket will not change anymore
+        if end <= bucket_start(self.resolution, now):
+            max_age = CLOSED_RANGE_MAX_AGE
+        else:
+            max_age = seconds_until_next_snapshot(summary["last"], now)
+
+        def build():
+            rows = candles.order_by("bucket_start").values_list("bucket_start", "open", "high", "low", "close")
+            return Response({
+                "resolution": self.resolution,
+                "from": start,
+                "to": end,
+                "candles": [
+                    {"t": t, "open": o, "high": h, "low": l, "close": c}
+                    for t, o, h, l, c in rows
+                ],
+            })
+
+        return conditional_response(
+            request, build, etag=etag, last_modified=summary["last"], max_age=max_age,
+        )
+
+    @staticmethod
+    def _parse_datetime(value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(value)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+
+class FiveMinuteHistoryView(CandleHistoryView):
+    resolution = PriceCandle.RESOLUTION_5M
+    default_window = timedelta(hours=24)
+    max_window = timedelta(days=7)
+
+
+class HourHistoryView(CandleHistoryView):
+    resolution = PriceCandle.RESOLUTION_1H
+    default_window = timedelta(days=7)
+    max_window = timedelta(days=90)
+
+
+class DayHistoryView(CandleHistoryView):
+    resolution = PriceCandle.RESOLUTION_1D
+    default_window = timedelta(days=365)
+    max_window = timedelta(days=365 * 10)
+
+
+# --------------------------------------------
+# DAILY CLOSING PRICES
+# --------------------------------------------
+def closing_price_payload(row):
+    return {
+        "date": row.date,
+        "closing_ounce": row.closing_ounce,
+        "closing_gram": row.closing_gram,
+        "closing_tola": row.closing_tola,
+    }
+
+
+def closing_price_etag(rows):
+    return hashed_etag(*(f"{row.pk}.{row.source_snapshot_id or 0}" for row in rows))
+
+
+def first_open_closing_day():
+    """
+    Oldest day the nightly job still recomputes (and may fill in):
+    MARKET_CLOSING_RECOMPUTE_DAYS back, today included. Earlier closes
+    are final.
+    """
+    return timezone.localdate() - timedelta(days=settings.MARKET_CLOSING_RECOMPUTE_DAYS - 1)
+
+
+class ClosingPriceListView(APIView):
+    """
+    Daily closing prices, oldest first.
+    Query params:
+    - from / to: ISO dates (default: last 30 days, max 366 days)
+    Ranges of final days with a close for every day are served as
+    immutable.
+    """
+
+    default_days = 30
+    max_days = 366
+
+    def get(self, request):
+        today = timezone.localdate()
+
+        try:
+            end = self._parse_date(request.query_params.get("to")) or today
+            start = self._parse_date(request.query_params.get("from")) or end - timedelta(days=self.default_days - 1)
+        except ValueError:
+            return Response({"detail": "from/to must be ISO 8601 dates."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if start > end:
+            return Response({"detail": "from must not be after to."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if (end - start).days + 1 > self.max_days:
+            return Response(
+                {"detail": f"Range too large (max {self.max_days} days)."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = list(DailyClosingPrice.objects.filter(date__gte=start, date__lte=end).order_by("date"))
+        immutable = end < first_open_closing_day() and len(rows) == (end - start).days + 1
+        last_modified = local_day_start(rows[-1].date + timedelta(days=1)) if rows else None
+        if last_modified and last_modified > timezone.now():
+            last_modified = timezone.now()
 
-        # Compute staleness
-        age_seconds = (timezone.now() - snapshot.timestamp).total_seconds()
-        stale = age_seconds > 180  # more than 3 minutes old
+        return conditional_response(
+            request,
+            lambda: Response({
+                "from": start,
+                "to": end,
+                "prices": [closing_price_payload(row) for row in rows],
+            }),
+            etag=closing_price_etag(rows),
+            last_modified=last_modified,
+            max_age=settings.GOLD_PRICE_POLL_INTERVAL_SECONDS,
+            immutable=immutable,
+        )
 
-        data = {
-            "timestamp": snapshot.timestamp,
-            "is_stale": stale,
+    @staticmethod
+    def _parse_date(value):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(value)
+        return parsed
 
-            "usd_per_ounce": snapshot.usd_per_ounce,
-            "usd_pkr_rate": snapshot.usd_pkr_rate,
 
-            "pkr_per_ounce_raw": snapshot.pkr_per_ounce_raw,
-            "pkr_per_gram_raw": snapshot.pkr_per_gram_raw,
-            "pkr_per_tola_raw": snapshot.pkr_per_tola_raw,
+class ClosingPriceDetailView(APIView):
+    """
+    Closing price for one local day (YYYY-MM-DD); immutable once the
+    nightly job no longer recomputes it.
+    """
+
+    def get(self, request, day):
+        try:
+            day = date.fromisoformat(day)
+        except ValueError:
+            return Response({"detail": "Date must be YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
 
-            "pkr_per_ounce_final": snapshot.pkr_per_ounce_final,
-            "pkr_per_gram_final": snapshot.pkr_per_gram_final,
-            "pkr_per_tola_final": snapshot.pkr_per_tola_final,
+        row = DailyClosingPrice.objects.filter(date=day).first()
+        if row is None:
+            return Response({"detail": "No closing price for this date."}, status=status.HTTP_404_NOT_FOUND)
 
-            "margins": {
-                "safeguard_margin": config.safeguard_margin,
-                "spread_margin": config.spread_margin,
-            }
-        }
+        immutable = day < first_open_closing_day()
+        return conditional_response(
+            request,
+            lambda: Response(closing_price_payload(row)),
+            etag=closing_price_etag([row]),
+            last_modified=min(local_day_start(day + timedelta(days=1)), timezone.now()),
+            max_age=settings.GOLD_PRICE_POLL_INTERVAL_SECONDS,
+            immutable=immutable,
+        )
 
-        return Response(data, status=status.HTTP_200_OK)
+
+# --------------------------------------------
+# SCHEDULER LEADERSHIP (ops)
+# --------------------------------------------
+class LeaderStatusView(APIView):
+    """
+    Which process holds the scheduler lease (polling + daily jobs).
+    Admin only.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"leases": lease_status()})
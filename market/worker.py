@@ -0,0 +1,97 @@
+import threading
+import time
+
+from django.db import close_old_connections
+
+from .services import GoldPriceService
+
+
+# --------------------------------------------
+# PRICE POLLER (dedicated worker process)
+# --------------------------------------------
+class PricePoller:
+    """
+    Snapshot loop for the poll_gold_price worker.
+    - Ticks on a fixed monotonic grid (start + n * interval), so cycle
+      time never accumulates into drift
+    - A cycle that overruns skips the ticks it missed instead of firing
+      them back to back (runs never overlap)
+    - Every cycle reports its latency and scheduling lag
+    - stop_event (set from a SIGTERM handler) ends the loop between
+      cycles or during the wait
+    - with a lease, only polls while it is the leader; a standby checks
+      every second and starts a fresh grid as soon as it takes over
+    """
+
+    def __init__(self, interval, service=None, lease=None, log=print):
+        self.interval = interval
+        self.service = service or GoldPriceService()
+        self.lease = lease
+        self.log = log
+        self.stats = {"cycles": 0, "failures": 0, "skipped": 0, "max_latency": 0.0, "total_latency": 0.0}
+
+    def run(self, stop_event=None, max_cycles=None):
+        stop_event = stop_event or threading.Event()
+        started = time.monotonic()
+        tick = 0
+
+        while not stop_event.is_set():
+            if self.lease is not None and not self.lease.is_leader:
+                self._wait_for_leadership(stop_event)
+                started = time.monotonic()
+                tick = 0
+                continue
+
+            scheduled = started + tick * self.interval
+            self.run_cycle(lag=time.monotonic() - scheduled)
+
+            if max_cycles is not None and self.stats["cycles"] >= max_cycles:
+                break
+
+            # Next tick on the grid still in the future
+            now = time.monotonic()
+            next_tick = int((now - started) // self.interval) + 1
+            missed = next_tick - tick - 1
+            if missed > 0:
+                self.stats["skipped"] += missed
+                self.log(f"[PricePoller] Cycle overran the interval; skipped {missed} tick(s).")
+            tick = next_tick
+
+            stop_event.wait(max(0.0, started + tick * self.interval - time.monotonic()))
+
+        return self.stats
+
+    def _wait_for_leadership(self, stop_event):
+        self.log(f"[PricePoller] Standby: {self.lease.name} is held by another process.")
+        while not stop_event.is_set() and not self.lease.is_leader:
+            stop_event.wait(1.0)
+
+    def run_cycle(self, lag=0.0):
+        close_old_connections()
+        cycle_started = time.monotonic()
+
+        try:
+            snapshot = self.service.fetch_and_store_snapshot()
+        except Exception as e:
+            snapshot = None
+            self.stats["failures"] += 1
+            error = e
+        finally:
+            latency = time.monotonic() - cycle_started
+            self.stats["cycles"] += 1
+            self.stats["total_latency"] += latency
+            self.stats["max_latency"] = max(self.stats["max_latency"], latency)
+
+        if snapshot is None:
+            self.log(
+                f"[PricePoller] ERROR after {latency:.3f}s (lag {lag:.3f}s): {error} "
+                f"(fetch timings: {self.service.last_timings})"
+            )
+            return None
+
+        self.log(
+            f"[PricePoller] Snapshot {snapshot.pk} @ {snapshot.timestamp:%H:%M:%S} "
+            f"PKR/gram {snapshot.pkr_per_gram_final} via {self.service.last_provider} "
+            f"in {latency:.3f}s (lag {lag:.3f}s, fetch timings: {self.service.last_timings})"
+        )
+        return snapshot
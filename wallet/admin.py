@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import BuyOrder, SellOrder, Wallet, GoldInventory
+from .models import (
+    BuyOrder,
+    SellOrder,
+    Wallet,
+    GoldInventory,
+    WalletBalanceCheckpoint,
+    ReconciliationCounter,
+    ReconciliationRun,
+)
 from .audit_models import OrderAuditLog
 
 
@@ -38,4 +46,23 @@ class SellOrderAdmin(admin.ModelAdmin):
     list_filter = ("status",)
     search_fields = ("user__email", "user__phone", "order_token")
 
-admin.site.register(GoldInventory)
\ No newline at end of file
+admin.site.register(GoldInventory)
+
+
+@admin.register(WalletBalanceCheckpoint)
+class WalletBalanceCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("wallet", "balance_grams", "last_transaction_id", "as_of", "created_at")
+    search_fields = ("wallet__user__email", "wallet__user__username")
+    readonly_fields = ("wallet", "balance_grams", "last_transaction_id", "as_of", "created_at")
+
+
+@admin.register(ReconciliationRun)
+class ReconciliationRunAdmin(admin.ModelAdmin):
+    list_display = ("started_at", "mode", "ok", "max_drift_grams", "rows_processed", "seconds")
+    list_filter = ("ok", "mode")
+    readonly_fields = ("mode", "started_at", "seconds", "rows_processed", "max_drift_grams", "ok", "checks")
+
+
+@admin.register(ReconciliationCounter)
+class ReconciliationCounterAdmin(admin.ModelAdmin):
+    list_display = ("name", "total", "last_id", "last_timestamp", "updated_at")
@@ -0,0 +1,358 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .audit_models import OrderAuditLog
+
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SUFFIX = ".jsonl"
+SEGMENT_SUFFIX = ".segment"
+
+ORDER_TYPES = {
+    "BuyOrder": "BUY",
+    "SellOrder": "SELL",
+}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _to_row(entry):
+    return {
+        "event_id": str(entry.event_id),
+        "user_id": entry.user_id,
+        "order_id": entry.order_id,
+        "order_type": entry.order_type,
+        "event_type": entry.event_type,
+        "description": entry.description,
+        "price_per_gram": entry.price_per_gram,
+        "gold_quantity_grams": entry.gold_quantity_grams,
+        "metadata": entry.metadata,
+        # isoformat() keeps microseconds (DjangoJSONEncoder drops them)
+        "timestamp": entry.timestamp.isoformat(),
+    }
+
+
+def _from_row(row):
+    return OrderAuditLog(
+        event_id=uuid.UUID(row["event_id"]),
+        user_id=row["user_id"],
+        order_id=row["order_id"],
+        order_type=row["order_type"],
+        event_type=row["event_type"],
+        description=row["description"],
+        price_per_gram=Decimal(row["price_per_gram"]) if row["price_per_gram"] is not None else None,
+        gold_quantity_grams=Decimal(row["gold_quantity_grams"]) if row["gold_quantity_grams"] is not None else None,
+        metadata=row["metadata"] or {},
+        timestamp=parse_datetime(row["timestamp"]),
+    )
+
+
+# ----------------------------------------------
+# AUDIT EMITTER
+# ----------------------------------------------
+class AuditEmitter:
+    """
+    Buffered OrderAuditLog writer for the order endpoints.
+    - emit() only builds the row; it is queued on transaction commit (a
+      rolled back order leaves no event) and costs no query
+    - a background thread flushes the queue with bulk_create every
+      flush_seconds, or as soon as batch_size events are waiting
+    - every queued event is first appended to a per-process spool file;
+      a flush rotates the spool into a segment and deletes the segment
+      once its rows are in the DB. Segments left by a failed flush or a
+      crash are replayed (event_id keeps replays idempotent), but only
+      by their own process or once that process is dead
+    - files are named after AUDIT_INSTANCE_ID (default: the hostname);
+      give containers a stable one, or replay another instance's files
+      with replay_audit_spool --all-hosts
+    """
+
+    def __init__(self, batch_size=None, flush_seconds=None, spool_dir=None):
+        self.batch_size = batch_size or settings.AUDIT_BATCH_SIZE
+        self.flush_seconds = flush_seconds or settings.AUDIT_FLUSH_SECONDS
+        self.spool_dir = spool_dir or settings.AUDIT_SPOOL_DIR
+        self.instance = settings.AUDIT_INSTANCE_ID or socket.gethostname()
+
+        self._queue = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._spool = None
+        self._segment = 0
+        self.stats = {"queued": 0, "written": 0, "flushes": 0, "failures": 0}
+
+    # ---- producer side -------------------------------------------------
+    def emit(self, order, event_type, description=None, price_per_gram=None, **metadata):
+        entry = OrderAuditLog(
+            event_id=uuid.uuid4(),
+            user_id=order.user_id,
+            order_id=order.order_token,
+            order_type=ORDER_TYPES[type(order).__name__],
+            event_type=event_type,
+            description=description,
+            price_per_gram=price_per_gram if price_per_gram is not None else order.locked_price_per_gram,
+            gold_quantity_grams=order.gold_quantity_grams,
+            metadata=metadata,
+            timestamp=timezone.now(),
+        )
+        transaction.on_commit(lambda: self.enqueue([entry]))
+        return entry
+
+    def emit_many(self, orders, event_type, description=None, **metadata):
+        entries = [
+            OrderAuditLog(
+                event_id=uuid.uuid4(),
+                user_id=order.user_id,
+                order_id=order.order_token,
+                order_type=ORDER_TYPES[type(order).__name__],
+                event_type=event_type,
+                description=description,
+                price_per_gram=order.locked_price_per_gram,
+                gold_quantity_grams=order.gold_quantity_grams,
+                metadata=metadata,
+                timestamp=timezone.now(),
+            )
+            for order in orders
+        ]
+        if entries:
+            transaction.on_commit(lambda: self.enqueue(entries))
+        return entries
+
+    def enqueue(self, entries):
+        with self._lock:
+            self._ensure_process()
+            lines = "".join(json.dumps(_to_row(e), cls=DjangoJSONEncoder) + "\n" for e in entries)
+            self._spool.write(lines)
+            self._spool.flush()
+            if settings.AUDIT_SPOOL_FSYNC:
+                os.fsync(self._spool.fileno())
+
+            self._queue.extend(entries)
+            self.stats["queued"] += len(entries)
+            full = len(self._queue) >= self.batch_size
+
+        self._start_thread()
+        if full:
+            self._wake.set()
+
+    # ---- flushing ------------------------------------------------------
+    def flush(self):
+        """
+        Writes everything queued so far. Returns the number of rows.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._queue:
+                    return 0
+                batch, self._queue = self._queue, []
+                segment = self._rotate()
+
+            try:
+                OrderAuditLog.objects.bulk_create(batch, batch_size=self.batch_size, ignore_conflicts=True)
+            except Exception as e:
+                # The segment stays on disk and is replayed later
+                self.stats["failures"] += 1
+                logger.error("Writing %d audit events failed (kept in %s): %s", len(batch), segment, e)
+                return 0
+
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass  # Replayed meanwhile; its rows were ignored as duplicates
+            self.stats["written"] += len(batch)
+            self.stats["flushes"] += 1
+            return len(batch)
+
+    def replay(self, stale_after=None):
+        """
+        Writes leftover segments (failed flushes of this process or of
+        dead ones) and the spools of processes that died before flushing.
+        A live process's segment may be mid-flush, so it is left to that
+        process. With stale_after (seconds), other instances' files not
+        touched for that long are replayed too: their pids cannot be
+        checked from here, but a live process rotates its spool on every
+        flush. Returns the number of rows.
+        """
+        if not os.path.isdir(self.spool_dir):
+            return 0
+
+        paths = self._owned_files(SEGMENT_SUFFIX, include_own=True) + self._owned_files(SPOOL_SUFFIX)
+        if stale_after is not None:
+            paths += self._stale_foreign_files(stale_after)
+
+        written = 0
+        for path in paths:
+            with self._flush_lock:
+                try:
+                    with open(path) as f:
+                        entries = [_from_row(json.loads(line)) for line in f if line.strip()]
+                except FileNotFoundError:
+                    continue  # Replayed by another process
+
+                OrderAuditLog.objects.bulk_create(entries, batch_size=self.batch_size, ignore_conflicts=True)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                written += len(entries)
+        return written
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds * 5)
+            self._thread = None
+        self.flush()
+
+    # ---- internals -----------------------------------------------------
+    def _run(self):
+        self._replay_safely()
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+                if self.stats["failures"]:
+                    self._replay_safely()
+            except Exception:
+                logger.exception("Audit flush loop failed")
+            finally:
+                # The thread keeps its own connection; drop it when stale
+                close_old_connections()
+
+    def _replay_safely(self):
+        try:
+            replayed = self.replay()
+            if replayed:
+                logger.info("Replayed %d spooled audit events", replayed)
+        except Exception:
+            logger.exception("Replaying the audit spool failed")
+        finally:
+            close_old_connections()
+
+    def _start_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-emitter", daemon=True)
+            self._thread.start()
+
+    def _ensure_process(self):
+        """
+        Opens this process's spool (again after a fork). Caller holds _lock.
+        """
+        pid = os.getpid()
+        if self._pid == pid and self._spool is not None:
+            return
+        if self._pid != pid:
+            # Forked child: the parent's queue and thread are not ours
+            self._queue, self._thread, self._segment = [], None, 0
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._pid = pid
+        self._spool = open(self._spool_path(), "a")
+
+    def _spool_path(self):
+        return os.path.join(self.spool_dir, f"audit-{self.instance}-{self._pid}{SPOOL_SUFFIX}")
+
+    def _rotate(self):
+        """
+        Renames the live spool to a segment and starts a new spool.
+        Caller holds _lock.
+        """
+        self._spool.close()
+        self._segment += 1
+        segment = self._spool_path()[:-len(SPOOL_SUFFIX)] + f"-{time.time_ns()}-{self._segment}{SEGMENT_SUFFIX}"
+        os.replace(self._spool_path(), segment)
+        self._spool = open(self._spool_path(), "a")
+        return segment
+
+    def _owned_files(self, suffix, include_own=False):
+        """
+        Spool files (or segments) of this instance whose process is dead,
+        plus this process's own with include_own. Other instances' files
+        are left to them: their pids cannot be checked from here.
+        """
+        owned = []
+        for path, pid in self._spool_files(suffix):
+            if (include_own and pid == os.getpid()) or (pid != os.getpid() and not _pid_alive(pid)):
+                owned.append(path)
+        return owned
+
+    def _spool_files(self, suffix):
+        """
+        (path, pid) of this instance's files with suffix.
+        audit-<instance>-<pid>.jsonl / audit-<instance>-<pid>-<ns>-<n>.segment
+        """
+        pattern = re.compile(rf"audit-{re.escape(self.instance)}-(\d+)(?:-\d+-\d+)?{re.escape(suffix)}")
+        files = []
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, f"audit-*{suffix}"))):
+            match = pattern.fullmatch(os.path.basename(path))
+            if match:
+                files.append((path, int(match.group(1))))
+        return files
+
+    def _stale_foreign_files(self, stale_after):
+        """
+        Other instances' segments and spools untouched for stale_after
+        seconds (empty spools are left alone: a live idle process keeps
+        one open).
+        """
+        own = {path for suffix in (SEGMENT_SUFFIX, SPOOL_SUFFIX) for path, _ in self._spool_files(suffix)}
+        cutoff = time.time() - stale_after
+        stale = []
+        for suffix in (SEGMENT_SUFFIX, SPOOL_SUFFIX):
+            for path in sorted(glob.glob(os.path.join(self.spool_dir, f"audit-*{suffix}"))):
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if path not in own and info.st_mtime < cutoff and info.st_size:
+                    stale.append(path)
+        return stale
+
+_emitter = None
+_emitter_lock = threading.Lock()
+
+
+def get_audit_emitter():
+    """
+    The process-wide emitter used by the order views and the sweeper.
+    """
+    global _emitter
+    with _emitter_lock:
+        if _emitter is None:
+            _emitter = AuditEmitter()
+            # Graceful shutdown: write what is still queued
+            atexit.register(_emitter.stop)
+        return _emitter
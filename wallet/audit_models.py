@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class OrderAuditLog(models.Model):
@@ -48,10 +49,19 @@ class OrderAuditLog(models.Model):
     # Extra structured details
     metadata = models.JSONField(default=dict, blank=True)
 
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set by the emitter when the event happens (rows are written later,
+    # in batches)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    # Makes spool replays idempotent (null on rows written before it)
+    event_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["order_id", "timestamp"], name="audit_order_ts_idx"),
+            models.Index(fields=["user", "timestamp"], name="audit_user_ts_idx"),
+        ]
 
     def __str__(self):
         return f"[{self.event_type}] {self.order_type} {self.order_id} — {self.user}"
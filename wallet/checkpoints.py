@@ -0,0 +1,191 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from .models import Wallet, WalletBalanceCheckpoint, WalletTransaction
+
+
+ZERO = Decimal("0")
+
+
+def signed_amount():
+    """
+    Credits count up, debits down.
+    """
+    return Case(
+        When(tx_type=WalletTransaction.DEBIT, then=-F("gold_amount_grams")),
+        default=F("gold_amount_grams"),
+        output_field=WalletTransaction._meta.get_field("gold_amount_grams"),
+    )
+
+
+def latest_checkpoints(wallet_ids, before=None):
+    """
+    {wallet_id: newest checkpoint} (optionally only those with
+    as_of <= before), one window query.
+    """
+    checkpoints = WalletBalanceCheckpoint.objects.filter(wallet_id__in=wallet_ids)
+    if before is not None:
+        checkpoints = checkpoints.filter(as_of__lte=before)
+
+    checkpoints = checkpoints.annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F("wallet_id")],
+            order_by=[F("last_transaction_id").desc()],
+        )
+    ).filter(position=1)
+    return {checkpoint.wallet_id: checkpoint for checkpoint in checkpoints}
+
+
+# ----------------------------------------------
+# BALANCE CHECKPOINTS
+# ----------------------------------------------
+class BalanceCheckpointer:
+    """
+    Per-wallet WalletBalanceCheckpoint rows, so balance lookups and
+    consistency checks only read the ledger rows after a checkpoint.
+    - run() is incremental: only ledger rows with id above the newest
+      checkpointed id are read (one grouped aggregate), and only wallets
+      that have such rows get a new checkpoint
+    - rows younger than settle_seconds are left for the next run, so a
+      transaction still committing with a lower id is not skipped
+    """
+
+    def __init__(self, settle_seconds=None, batch_size=1000):
+        self.settle_seconds = settings.WALLET_CHECKPOINT_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.batch_size = batch_size
+
+    def run(self, now=None):
+        started = time.monotonic()
+        now = now or timezone.now()
+
+        high_water_mark = WalletBalanceCheckpoint.objects.aggregate(last=Max("last_transaction_id"))["last"] or 0
+        cutoff = (
+            WalletTransaction.objects
+            .filter(id__gt=high_water_mark, timestamp__lte=now - timedelta(seconds=self.settle_seconds))
+            .aggregate(last=Max("id"))["last"]
+        )
+
+        report = {"wallets": 0, "transactions": 0, "from_id": high_water_mark, "to_id": cutoff or high_water_mark}
+        if cutoff is None:
+            report["seconds"] = round(time.monotonic() - started, 3)
+            return report
+
+        deltas = list(
+            WalletTransaction.objects
+            .filter(id__gt=high_water_mark, id__lte=cutoff)
+            .order_by()
+            .values("wallet_id")
+            .annotate(delta=Sum(signed_amount()), last_id=Max("id"), as_of=Max("timestamp"), count=Count("id"))
+        )
+
+        for offset in range(0, len(deltas), self.batch_size):
+            batch = deltas[offset:offset + self.batch_size]
+            previous = latest_checkpoints([row["wallet_id"] for row in batch])
+
+            checkpoints = []
+            for row in batch:
+                base = previous.get(row["wallet_id"])
+                checkpoints.append(
+                    WalletBalanceCheckpoint(
+                        wallet_id=row["wallet_id"],
+                        balance_grams=(base.balance_grams if base else ZERO) + row["delta"],
+                        last_transaction_id=row["last_id"],
+                        as_of=max(base.as_of, row["as_of"]) if base else row["as_of"],
+                    )
+                )
+            WalletBalanceCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+
+            report["wallets"] += len(batch)
+            report["transactions"] += sum(row["count"] for row in batch)
+
+        report["seconds"] = round(time.monotonic() - started, 3)
+        return report
+
+    @staticmethod
+    def balance_as_of(wallet, at):
+        """
+        Wallet balance right after every transaction with timestamp <= at:
+        nearest checkpoint at or before `at` + the rows after it.
+        """
+        checkpoint = latest_checkpoints([wallet.pk], before=at).get(wallet.pk)
+        since_id = checkpoint.last_transaction_id if checkpoint else 0
+
+        delta = (
+            WalletTransaction.objects
+            .filter(wallet=wallet, id__gt=since_id, timestamp__lte=at)
+            .aggregate(delta=Coalesce(Sum(signed_amount()), Value(ZERO)))["delta"]
+        )
+        return (checkpoint.balance_grams if checkpoint else ZERO) + delta
+
+    def verify(self, wallet_ids=None):
+        """
+        Compares Wallet.gold_balance_grams with latest checkpoint + newer
+        ledger rows, batch_size wallets per query pair. Each batch reads
+        from one snapshot (REPEATABLE READ on Postgres), so an order
+        processed between the reads is not reported as drift.
+        Returns {"wallets": checked, "mismatches": [...]}.
+        """
+        wallets = Wallet.objects.order_by("id")
+        if wallet_ids:
+            wallets = wallets.filter(id__in=wallet_ids)
+
+        report = {"wallets": 0, "mismatches": []}
+        last_id = 0
+        while True:
+            last_id = self._verify_batch(wallets.filter(id__gt=last_id), report)
+            if last_id is None:
+                return report
+
+    def _verify_batch(self, wallets, report):
+        """
+        Checks the next batch_size wallets into report. Returns the last
+        wallet id checked, None when there were none.
+        """
+        newest_checkpoint = (
+            WalletBalanceCheckpoint.objects
+            .filter(wallet_id=OuterRef("wallet_id"))
+            .order_by("-last_transaction_id")
+            .values("last_transaction_id")[:1]
+        )
+        outermost = not connection.in_atomic_block
+
+        with transaction.atomic():
+            if outermost and connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+            batch = dict(wallets.values_list("id", "gold_balance_grams")[:self.batch_size])
+            if not batch:
+                return None
+
+            checkpoints = latest_checkpoints(list(batch))
+            deltas = dict(
+                WalletTransaction.objects
+                .filter(wallet_id__in=list(batch))
+                .filter(id__gt=Coalesce(Subquery(newest_checkpoint), Value(0)))
+                .order_by()
+                .values("wallet_id")
+                .annotate(delta=Sum(signed_amount()))
+                .values_list("wallet_id", "delta")
+            )
+
+        for wallet_id, actual in batch.items():
+            checkpoint = checkpoints.get(wallet_id)
+            expected = (checkpoint.balance_grams if checkpoint else ZERO) + deltas.get(wallet_id, ZERO)
+            if expected != actual:
+                report["mismatches"].append({
+                    "wallet_id": wallet_id,
+                    "expected": expected,
+                    "actual": actual,
+                    "difference": actual - expected,
+                })
+        report["wallets"] += len(batch)
+        return max(batch)
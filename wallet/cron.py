@@ -0,0 +1,66 @@
+from market.leader import leader_only
+
+from .checkpoints import BalanceCheckpointer
+from .idempotency import IdempotencyStore
+from .reconciliation import Reconciler
+from .sweeper import ExpiredLockSweeper
+
+
+@leader_only
+def sweep_expired_locks():
+    """
+    Runs every WALLET_LOCK_SWEEP_INTERVAL_SECONDS via APScheduler:
+    - Expires abandoned buy/sell locks in batches
+    - Releases reserved inventory, re-credits held sell gold
+    """
+    report = ExpiredLockSweeper().run()
+
+    if report["batches"]:
+        print(
+            f"[APScheduler] Lock sweep: {report['buy_orders']} buy / {report['sell_orders']} sell orders expired, "
+            f"{report['released_grams']}g released, {report['recredited_grams']}g re-credited, "
+            f"max lag {report['max_lag_seconds']}s, {len(report['batches'])} batch(es) in {report['seconds']}s."
+        )
+
+
+@leader_only
+def checkpoint_wallet_balances():
+    """
+    Runs every WALLET_CHECKPOINT_INTERVAL_MINUTES via APScheduler:
+    - Checkpoints the balance of every wallet with new ledger rows
+    """
+    report = BalanceCheckpointer().run()
+
+    if report["wallets"]:
+        print(
+            f"[APScheduler] Balance checkpoints: {report['wallets']} wallets, "
+            f"{report['transactions']} ledger rows (ids {report['from_id']}..{report['to_id']}) "
+            f"in {report['seconds']}s."
+        )
+
+
+@leader_only
+def reconcile_balances():
+    """
+    Runs every WALLET_RECONCILIATION_INTERVAL_MINUTES via APScheduler:
+    - Incremental reconciliation of wallets, ledger, orders and inventory
+    - Alerts (mail_admins) on drift beyond the tolerance
+    """
+    run = Reconciler().run()
+
+    print(
+        f"[APScheduler] Reconciliation {run.mode.lower()}: {'ok' if run.ok else 'DRIFT'} | "
+        f"{run.rows_processed} new rows | max drift {run.max_drift_grams}g | {run.seconds}s"
+    )
+
+
+@leader_only
+def purge_idempotency_keys():
+    """
+    Runs once per hour via APScheduler:
+    - Deletes expired Idempotency-Key records in batches
+    """
+    deleted = IdempotencyStore.purge_expired()
+
+    if deleted:
+        print(f"[APScheduler] Purged {deleted} expired idempotency keys.")
@@ -0,0 +1,100 @@
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+EXPORT_FIELDS = [
+    "id",
+    "wallet_id",
+    "tx_type",
+    "gold_amount_grams",
+    "balance_after_tx",
+    "reference",
+    "idempotency_key",
+    "timestamp",
+]
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Rendered rows joined into one chunk before yielding (fewer, larger writes)
+ROWS_PER_CHUNK = 500
+
+
+class _Line:
+    """
+    File-like sink for csv.writer: hands back each rendered line.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _chunks(lines):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= ROWS_PER_CHUNK:
+            yield "".join(buffer).encode()
+            buffer = []
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def render_csv(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(
+            [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+        )
+
+
+def render_ndjson(rows):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(dict(zip(EXPORT_FIELDS, row))) + "\n"
+
+
+RENDERERS = {
+    "csv": render_csv,
+    "ndjson": render_ndjson,
+}
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Gzip-compresses a byte stream incrementally (wbits=31: gzip header
+    and trailer), so the whole file never sits in memory.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# ----------------------------------------------
+# LEDGER EXPORT
+# ----------------------------------------------
+def export_ledger(queryset, export_format="csv", gzip=False, chunk_size=2000):
+    """
+    Byte chunks of a WalletTransaction queryset rendered as CSV or NDJSON.
+    Rows come through iterator(chunk_size) (a server-side cursor on
+    Postgres), so memory stays flat however long the ledger is.
+    """
+    if export_format not in RENDERERS:
+        raise ValueError(f"format must be one of: {', '.join(RENDERERS)}.")
+
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    chunks = _chunks(RENDERERS[export_format](rows))
+    return gzip_stream(chunks) if gzip else chunks
+
+
+def export_filename(export_format, gzip=False, stem="ledger"):
+    return f"{stem}.{export_format}{'.gz' if gzip else ''}"
@@ -0,0 +1,165 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+
+REPLAY_HEADER = "Idempotent-Replayed"
+# How often a duplicate re-reads the key while the first request runs
+WAIT_POLL_SECONDS = 0.1
+
+
+def request_fingerprint(data):
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# ----------------------------------------------
+# IDEMPOTENCY STORE
+# ----------------------------------------------
+class IdempotencyStore:
+    """
+    (user, key, endpoint) → stored response, kept IDEMPOTENCY_TTL_HOURS.
+    - begin() inserts an in-progress row; the unique constraint makes a
+      concurrent duplicate fail right there, so only one request per key
+      ever runs the endpoint (the others wait for its response)
+    - finish() stores status + body in the endpoint's transaction
+    - a retry is one indexed lookup and gets the stored response back
+    """
+
+    @staticmethod
+    def lookup(user, key, endpoint):
+        return IdempotencyRecord.objects.filter(user=user, key=key, endpoint=endpoint).first()
+
+    @staticmethod
+    def begin(user, key, endpoint, request_hash):
+        """
+        The new in-progress record, or None when another request holds
+        the key.
+        """
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return IdempotencyRecord.objects.create(
+                    user=user,
+                    key=key,
+                    endpoint=endpoint,
+                    request_hash=request_hash,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS),
+                )
+        except IntegrityError:
+            return None
+
+    @staticmethod
+    def finish(record, response):
+        record.status_code = response.status_code
+        record.response_body = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+        record.expires_at = timezone.now() + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+        record.save(update_fields=["status_code", "response_body", "expires_at"])
+
+    @staticmethod
+    def abandon(record):
+        IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+
+    @staticmethod
+    def purge_expired(batch_size=None, now=None):
+        """
+        Deletes expired records batch_size at a time (short statements,
+        expires_at index). Returns the number deleted.
+        """
+        batch_size = batch_size or settings.IDEMPOTENCY_PURGE_BATCH_SIZE
+        now = now or timezone.now()
+        expired = IdempotencyRecord.objects.filter(expires_at__lte=now).order_by("expires_at")
+
+        deleted = 0
+        while True:
+            batch = list(expired.values_list("id", flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += IdempotencyRecord.objects.filter(id__in=batch).delete()[0]
+
+
+def idempotent(endpoint, required=False):
+    """
+    Decorator for APIView handlers keyed on the Idempotency-Key header.
+    Without a key the handler just runs (or 400 when required).
+    - stored response → replayed with an Idempotent-Replayed header
+    - same key, different body → 422
+    - same key still running → waits up to IDEMPOTENCY_WAIT_SECONDS
+      for its response, then 409 with Retry-After
+    Responses below 500 are stored together with the handler's writes;
+    errors leave nothing behind, so the client can retry.
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get("Idempotency-Key")
+            if not key:
+                if required:
+                    return Response({"error": "Idempotency-Key header is required"}, status=400)
+                return handler(view, request, *args, **kwargs)
+
+            if len(key) > 200:
+                return Response({"error": "Idempotency-Key is too long"}, status=400)
+
+            request_hash = request_fingerprint(request.data)
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+
+            while True:
+                record = IdempotencyStore.lookup(request.user, key, endpoint)
+
+                if record is not None and record.expires_at <= timezone.now():
+                    # Expired (or an in-progress row left by a crashed worker)
+                    IdempotencyRecord.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+                    record = None
+
+                if record is None:
+                    record = IdempotencyStore.begin(request.user, key, endpoint, request_hash)
+                    if record is not None:
+                        return run(view, request, record, *args, **kwargs)
+                elif record.request_hash != request_hash:
+                    return Response(
+                        {"error": "Idempotency-Key was already used with a different request"},
+                        status=422,
+                    )
+                elif record.status_code is not None:
+                    response = Response(record.response_body, status=record.status_code)
+                    response[REPLAY_HEADER] = "true"
+                    return response
+
+                # The first request (usually the one the client timed out
+                # on) is still running: replay its response once stored
+                if time.monotonic() >= deadline:
+                    response = Response({"error": "A request with this Idempotency-Key is in progress"}, status=409)
+                    response["Retry-After"] = "1"
+                    return response
+                time.sleep(WAIT_POLL_SECONDS)
+
+        def run(view, request, record, *args, **kwargs):
+            try:
+                with transaction.atomic():
+                    response = handler(view, request, *args, **kwargs)
+                    if response.status_code < 500:
+                        IdempotencyStore.finish(record, response)
+            except Exception:
+                IdempotencyStore.abandon(record)
+                raise
+
+            if record.status_code is None:
+                IdempotencyStore.abandon(record)
+            return response
+
+        return wrapper
+
+    return decorator
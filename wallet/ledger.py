@@ -0,0 +1,135 @@
+import base64
+import json
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import WalletTransaction
+
+
+LEDGER_FIELDS = [
+    "id",
+    "tx_type",
+    "gold_amount_grams",
+    "balance_after_tx",
+    "reference",
+    "idempotency_key",
+    "timestamp",
+]
+
+# Newest first; id breaks timestamp ties so the order is total
+LEDGER_ORDER = ["-timestamp", "-id"]
+
+
+# ----------------------------------------------
+# CURSORS
+# ----------------------------------------------
+def encode_cursor(timestamp, tx_id):
+    payload = json.dumps({"t": timestamp.isoformat(), "id": tx_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    (timestamp, id) of the last row of the previous page.
+    Raises ValueError for anything that is not one of our cursors.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        timestamp = parse_datetime(payload["t"])
+        tx_id = int(payload["id"])
+    except (TypeError, KeyError, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+    if timestamp is None:
+        raise ValueError("Invalid cursor")
+    return timestamp, tx_id
+
+
+# ----------------------------------------------
+# FILTERS
+# ----------------------------------------------
+def _parse_bound(value, end_of_day=False):
+    """
+    ISO datetime, or a date (whole local day; `to` includes that day).
+    """
+    if not value:
+        return None
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        parsed = datetime.combine(day, time.min)
+        if end_of_day:
+            parsed += timedelta(days=1)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_ledger_filters(params):
+    """
+    Query params → filter kwargs for ledger_queryset():
+    - type: CREDIT / DEBIT
+    - from / to: ISO 8601 datetimes or dates
+    Raises ValueError with a client-facing message.
+    """
+    tx_type = (params.get("type") or "").upper() or None
+    if tx_type and tx_type not in dict(WalletTransaction.TRANSACTION_TYPES):
+        raise ValueError("type must be CREDIT or DEBIT.")
+
+    try:
+        start = _parse_bound(params.get("from"))
+        end = _parse_bound(params.get("to"), end_of_day=True)
+    except ValueError:
+        raise ValueError("from/to must be ISO 8601 dates or datetimes.")
+
+    if start and end and start >= end:
+        raise ValueError("from must be before to.")
+
+    return {"tx_type": tx_type, "start": start, "end": end}
+
+
+def ledger_queryset(wallet, tx_type=None, start=None, end=None):
+    """
+    A wallet's ledger, newest first, served by the
+    (wallet, -timestamp, -id) index. wallet=None: every wallet.
+    """
+    rows = WalletTransaction.objects.all()
+    if wallet is not None:
+        rows = rows.filter(wallet=wallet)
+    if tx_type:
+        rows = rows.filter(tx_type=tx_type)
+    if start:
+        rows = rows.filter(timestamp__gte=start)
+    if end:
+        rows = rows.filter(timestamp__lt=end)
+    return rows.order_by(*LEDGER_ORDER)
+
+
+# ----------------------------------------------
+# KEYSET PAGINATION
+# ----------------------------------------------
+def ledger_page(queryset, cursor=None, limit=50):
+    """
+    One page after cursor: WHERE (timestamp, id) < (cursor) ORDER BY
+    timestamp DESC, id DESC LIMIT limit + 1. An index range scan, so page
+    1000 costs the same as page 1 (no OFFSET).
+    Returns (rows, next_cursor or None).
+    """
+    if cursor:
+        timestamp, tx_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=tx_id))
+
+    rows = list(queryset.values(*LEDGER_FIELDS)[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+    return rows, next_cursor
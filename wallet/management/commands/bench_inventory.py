@@ -0,0 +1,113 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test.utils import override_settings
+
+from wallet.models import BuyOrder, SellOrder
+from wallet.services import InventoryEngine
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures inventory reserve/release throughput under concurrency, single row vs striped. "
+        "Every reservation is released again, so stock is left unchanged, but the inventory is "
+        "re-striped (single row, then striped) while it runs: only for a scratch database "
+        "(--scratch), never production. Run against Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent workers (default 16).")
+        parser.add_argument("--ops", type=int, default=200, help="Reserve/release pairs per worker (default 200).")
+        parser.add_argument("--grams", type=Decimal, default=Decimal("0.01"), help="Grams per reservation (default 0.01).")
+        parser.add_argument("--stripes", type=int, help="Stripes for the striped run (default INVENTORY_STRIPES).")
+        parser.add_argument(
+            "--scratch",
+            action="store_true",
+            help="Confirms the configured database is a scratch copy the benchmark may re-stripe.",
+        )
+
+    def handle(self, *args, **options):
+        threads, ops, grams = options["threads"], options["ops"], options["grams"]
+        stripes = options["stripes"]
+
+        if settings.DJANGO_ENV == "production":
+            raise CommandError("Refusing to re-stripe inventory with DJANGO_ENV=production.")
+        if not options["scratch"]:
+            raise CommandError("Point DATABASE_URL at a scratch database and pass --scratch.")
+        pending = (
+            BuyOrder.objects.filter(status=BuyOrder.STATUS_PENDING_LOCKED).exists()
+            or SellOrder.objects.filter(status=SellOrder.STATUS_PENDING_LOCKED).exists()
+        )
+        if pending:
+            raise CommandError("Pending orders hold reservations: this is not a scratch database.")
+
+        needed = grams * threads
+        available = InventoryEngine.totals()["available_grams"]
+        if available < needed:
+            raise CommandError(f"Needs {needed}g available inventory, only {available}g is.")
+
+        results = {}
+        try:
+            with override_settings(INVENTORY_STRIPES=1):
+                InventoryEngine.rebalance()
+                results["single row"] = self._run(threads, ops, grams)
+
+            overrides = {"INVENTORY_STRIPES": stripes} if stripes else {}
+            with override_settings(**overrides):
+                InventoryEngine.rebalance()
+                results["striped"] = self._run(threads, ops, grams)
+        finally:
+            # Back to the configured layout
+            InventoryEngine.rebalance()
+
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:>10}: {result['ops_per_second']:>9.1f} ops/s | "
+                f"{result['ops']} ops in {result['seconds']:.2f}s | errors: {result['errors']}"
+            )
+
+        if results["single row"]["ops_per_second"]:
+            speedup = results["striped"]["ops_per_second"] / results["single row"]["ops_per_second"]
+            self.stdout.write(self.style.SUCCESS(f"Striped speedup: {speedup:.2f}x"))
+
+    def _run(self, threads, ops, grams):
+        counts = {"ops": 0, "errors": 0}
+        lock = threading.Lock()
+        start = threading.Barrier(threads + 1)
+
+        def worker():
+            done = errors = 0
+            start.wait()
+            try:
+                for _ in range(ops):
+                    try:
+                        stripe = InventoryEngine.reserve(grams)
+                        InventoryEngine.release(grams, stripe=stripe)
+                        done += 2
+                    except Exception:
+                        errors += 1
+            finally:
+                close_old_connections()
+                with lock:
+                    counts["ops"] += done
+                    counts["errors"] += errors
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+
+        start.wait()
+        started = time.monotonic()
+        for thread in workers:
+            thread.join()
+        seconds = time.monotonic() - started
+
+        return {
+            **counts,
+            "seconds": seconds,
+            "ops_per_second": counts["ops"] / seconds if seconds else 0.0,
+        }
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from wallet.checkpoints import BalanceCheckpointer
+
+
+class Command(BaseCommand):
+    help = "Checkpoints the balance of every wallet with ledger activity since the last checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--settle-seconds",
+            type=int,
+            help="Skip ledger rows younger than this (default WALLET_CHECKPOINT_SETTLE_SECONDS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Wallets checkpointed per insert (default 1000).",
+        )
+
+    def handle(self, *args, **options):
+        report = BalanceCheckpointer(
+            settle_seconds=options["settle_seconds"],
+            batch_size=options["batch_size"],
+        ).run()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checkpointed {report['wallets']} wallets from {report['transactions']} ledger rows "
+                f"(ids {report['from_id']}..{report['to_id']}) in {report['seconds']}s"
+            )
+        )
@@ -0,0 +1,403 @@
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from decimal import Decimal
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.test import Client
+from django.test.utils import override_settings
+
+from market.cache import LatestPriceCache, PricingConfigCache
+from wallet.checkpoints import BalanceCheckpointer
+from wallet.models import BuyOrder, SellOrder
+from wallet.services import InventoryEngine
+from wallet.sweeper import ExpiredLockSweeper
+
+
+ZERO = Decimal("0")
+ENDPOINTS = ["register", "jwt_login", "buy_lock", "buy_confirm", "sell_lock", "sell_confirm"]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+# ----------------------------------------------
+# CLIENTS
+# ----------------------------------------------
+class InProcessClient:
+    """
+    Django test client: the full middleware/DRF stack, no network.
+    """
+
+    def __init__(self):
+        self.client = Client()
+        self.headers = {}
+
+    def post(self, path, data, headers=None):
+        response = self.client.post(path, data, content_type="application/json", headers={**self.headers, **(headers or {})})
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        return response.status_code, body
+
+
+class HttpClient:
+    """
+    Plain HTTP against a running server (e.g. gunicorn on this node).
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {}
+
+    def post(self, path, data, headers=None):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(data).encode(),
+            headers={"Content-Type": "application/json", **self.headers, **(headers or {})},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            try:
+                return e.code, json.loads(e.read() or b"{}")
+            except ValueError:
+                return e.code, {}
+
+
+# ----------------------------------------------
+# LOAD STATS
+# ----------------------------------------------
+class LoadStats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        self.outcomes = {endpoint: {"ok": 0, "expired": 0, "error": 0} for endpoint in ENDPOINTS}
+        # endpoint → [first request start, last response end]
+        self.spans = {}
+        self.errors = {}
+        self.abandoned = 0
+
+    def record(self, endpoint, started, seconds, outcome, detail=None):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            span = self.spans.setdefault(endpoint, [started, started + seconds])
+            span[0], span[1] = min(span[0], started), max(span[1], started + seconds)
+            self.outcomes[endpoint][outcome] += 1
+            if outcome == "error":
+                key = f"{endpoint}: {detail}"
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def span(self, endpoints):
+        spans = [self.spans[endpoint] for endpoint in endpoints if endpoint in self.spans]
+        if not spans:
+            return 0.0
+        return max(end for _, end in spans) - min(start for start, _ in spans)
+
+    def endpoint_report(self):
+        """
+        Per endpoint; req/s is over the window that endpoint was in use
+        (sign-ups do not dilute the order throughput).
+        """
+        report = {}
+        for endpoint in ENDPOINTS:
+            values = sorted(self.latencies[endpoint])
+            if not values:
+                continue
+            outcomes = self.outcomes[endpoint]
+            seconds = self.span([endpoint])
+            report[endpoint] = {
+                "requests": len(values),
+                "per_second": round(len(values) / seconds, 1) if seconds else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+                **outcomes,
+            }
+        return report
+
+
+# ----------------------------------------------
+# VIRTUAL USER
+# ----------------------------------------------
+class VirtualUser:
+    """
+    register → JWT login → `orders` × (lock → think → confirm → think).
+    Buys while the wallet is empty; afterwards buy_ratio decides.
+    """
+
+    def __init__(self, client, username, stats, options, rng):
+        self.client = client
+        self.username = username
+        self.stats = stats
+        self.options = options
+        self.rng = rng
+        self.balance = ZERO
+
+    def call(self, endpoint, path, data, ok_status=200, headers=None):
+        started = time.perf_counter()
+        try:
+            status, body = self.client.post(path, data, headers)
+        except Exception as e:
+            self.stats.record(endpoint, started, time.perf_counter() - started, "error", type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - started
+
+        if status == ok_status:
+            self.stats.record(endpoint, started, elapsed, "ok")
+            return body
+        if body.get("error") == "Order expired":
+            self.stats.record(endpoint, started, elapsed, "expired")
+        else:
+            self.stats.record(endpoint, started, elapsed, "error", f"{status} {body.get('error') or body.get('detail') or ''}".strip())
+        return None
+
+    def think(self):
+        low, high = self.options["think_ms"]
+        if high:
+            time.sleep(self.rng.uniform(low, high) / 1000)
+
+    def run(self):
+        password = "load-" + uuid4().hex
+        if self.call(
+            "register",
+            "/api/accounts/register/",
+            {"username": self.username, "email": f"{self.username}@loadtest.invalid", "password": password},
+            ok_status=201,
+        ) is None:
+            return
+
+        tokens = self.call("jwt_login", "/api/accounts/jwt/login/", {"username": self.username, "password": password})
+        if tokens is None:
+            return
+        self.client.headers["Authorization"] = f"Bearer {tokens['access']}"
+
+        for _ in range(self.options["orders"]):
+            self.think()
+            sell = self.balance > 0 and self.rng.random() >= self.options["buy_ratio"]
+            if sell:
+                grams = (self.balance * self.options["sell_fraction"]).quantize(Decimal("0.000001"))
+                locked = self.call("sell_lock", "/api/wallet/sell/lock/", {"sell_grams": str(grams)})
+            else:
+                locked = self.call("buy_lock", "/api/wallet/buy/lock/", {"amount_pkr": str(self.options["amount_pkr"])})
+            if locked is None:
+                continue
+            if sell:
+                # Held from the wallet until the order executes or expires
+                self.balance -= grams
+
+            if self.rng.random() < self.options["abandon_ratio"]:
+                with self.stats.lock:
+                    self.stats.abandoned += 1
+                continue
+
+            self.think()
+            side = "sell" if sell else "buy"
+            confirmed = self.call(
+                f"{side}_confirm",
+                f"/api/wallet/{side}/confirm/",
+                {"order_token": locked["order_token"]},
+                headers={"Idempotency-Key": uuid4().hex},
+            )
+            if confirmed is not None and not sell:
+                self.balance = Decimal(confirmed["wallet_balance_grams"])
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test for the order flow: N concurrent virtual users each register, log in (JWT) "
+        "and run lock → confirm buys/sells. Reports throughput, p50/p95/p99 per endpoint, "
+        "error and expiry rates, then checks inventory and wallet consistency. "
+        "Creates real users and orders: run against a scratch Postgres database. "
+        "In-process runs share one interpreter (password hashing competes for the GIL); "
+        "--url measures a real multi-worker server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users (default 20).")
+        parser.add_argument("--orders", type=int, default=10, help="Orders per user (default 10).")
+        parser.add_argument("--buy-ratio", type=float, default=0.7, help="Share of buys once a user holds gold (default 0.7).")
+        parser.add_argument("--sell-fraction", type=Decimal, default=Decimal("0.5"), help="Share of the balance each sell offers (default 0.5).")
+        parser.add_argument("--amount-pkr", type=Decimal, help="PKR per buy (default: the configured minimum).")
+        parser.add_argument("--abandon-ratio", type=float, default=0.0, help="Share of locks never confirmed, left to expire (default 0).")
+        parser.add_argument(
+            "--think-ms",
+            type=int,
+            nargs=2,
+            default=[0, 0],
+            metavar=("MIN", "MAX"),
+            help="Random pause before each lock and confirm (default 0 0).",
+        )
+        parser.add_argument("--url", help="Base URL of a running server; default runs in-process via the test client.")
+        parser.add_argument("--seed", type=int, help="Random seed for the order mix.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        if not options["url"] and LatestPriceCache.get_snapshot() is None:
+            raise CommandError("No price snapshot yet; run poll_gold_price first.")
+
+        amount_pkr = options["amount_pkr"]
+        if amount_pkr is None:
+            amount_pkr = PricingConfigCache.get()["min_buy_amount_pkr"]
+
+        run_id = uuid4().hex[:8]
+        prefix = f"loadtest-{run_id}-"
+        flow = {
+            "orders": options["orders"],
+            "buy_ratio": options["buy_ratio"],
+            "sell_fraction": options["sell_fraction"],
+            "amount_pkr": amount_pkr,
+            "abandon_ratio": options["abandon_ratio"],
+            "think_ms": options["think_ms"],
+        }
+        rng = random.Random(options["seed"])
+        stats = LoadStats()
+        inventory_before = InventoryEngine.totals()
+
+        def worker(index):
+            client = HttpClient(options["url"]) if options["url"] else InProcessClient()
+            user = VirtualUser(client, f"{prefix}{index}", stats, flow, random.Random(rng.random()))
+            try:
+                start.wait()
+                user.run()
+            finally:
+                # The thread ends here; CONN_MAX_AGE would keep its connection open
+                connection.close()
+
+        start = threading.Barrier(options["users"] + 1)
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(options["users"])]
+
+        # The test client talks to "testserver"
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for thread in workers:
+                thread.start()
+            start.wait()
+            started = time.monotonic()
+            for thread in workers:
+                thread.join()
+            seconds = time.monotonic() - started
+
+        swept = ExpiredLockSweeper().run()
+        report = {
+            "run_id": run_id,
+            "users": options["users"],
+            "seconds": round(seconds, 2),
+            "order_phase_seconds": round(stats.span(ENDPOINTS[2:]), 2),
+            "endpoints": stats.endpoint_report(),
+            "errors": stats.errors,
+            "abandoned_locks": stats.abandoned,
+            "swept_locks": swept["buy_orders"] + swept["sell_orders"],
+            "consistency": self._consistency(prefix, inventory_before),
+        }
+        confirms = [report["endpoints"].get(name, {}) for name in ("buy_confirm", "sell_confirm")]
+        confirmed = sum(c.get("ok", 0) for c in confirms)
+        attempted = sum(c.get("requests", 0) for c in confirms)
+        requests = sum(e["requests"] for e in report["endpoints"].values())
+        order_seconds = report["order_phase_seconds"]
+        report["orders_per_second"] = round(confirmed / order_seconds, 1) if order_seconds else 0.0
+        report["error_rate"] = round(sum(stats.errors.values()) / requests, 4) if requests else 0.0
+        report["expiry_rate"] = round(sum(c.get("expired", 0) for c in confirms) / attempted, 4) if attempted else 0.0
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+        else:
+            self._print(report)
+
+        if not report["consistency"]["ok"]:
+            raise CommandError("Consistency check failed.")
+
+    @staticmethod
+    def _consistency(prefix, inventory_before):
+        """
+        - every load-test wallet matches its ledger
+        - inventory total moved by exactly -bought + sold grams (assumes
+          no other traffic during the run)
+        - reserved grams == soft allocations of pending buys
+        """
+        users = get_user_model().objects.filter(username__startswith=prefix)
+        wallet_ids = list(users.values_list("wallet__id", flat=True))
+        wallets = BalanceCheckpointer().verify(wallet_ids) if wallet_ids else {"wallets": 0, "mismatches": []}
+
+        def executed(model):
+            return model.objects.filter(user__in=users, status=model.STATUS_EXECUTED).aggregate(
+                grams=Coalesce(Sum("gold_quantity_grams"), ZERO)
+            )["grams"]
+
+        bought, sold = executed(BuyOrder), executed(SellOrder)
+        inventory_after = InventoryEngine.totals()
+        inventory_delta = inventory_after["total_grams"] - inventory_before["total_grams"]
+        pending = BuyOrder.objects.filter(status=BuyOrder.STATUS_PENDING_LOCKED).aggregate(
+            grams=Coalesce(Sum("soft_allocated_grams"), ZERO)
+        )["grams"]
+
+        checks = {
+            "wallets_vs_ledger": not wallets["mismatches"],
+            "inventory_total": inventory_delta == sold - bought,
+            "reserved_vs_pending_buys": inventory_after["reserved_grams"] == pending,
+        }
+        return {
+            "ok": all(checks.values()),
+            "checks": checks,
+            "wallets_checked": wallets["wallets"],
+            "wallet_mismatches": len(wallets["mismatches"]),
+            "bought_grams": bought,
+            "sold_grams": sold,
+            "inventory_delta_grams": inventory_delta,
+            "reserved_grams": inventory_after["reserved_grams"],
+            "pending_buy_grams": pending,
+        }
+
+    def _print(self, report):
+        self.stdout.write(
+            f"Run {report['run_id']}: {report['users']} users in {report['seconds']}s "
+            f"(orders: {report['order_phase_seconds']}s)"
+        )
+        self.stdout.write(
+            f"{'endpoint':<13} {'reqs':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+            f"{'errors':>6} {'expired':>7}"
+        )
+        for name, row in report["endpoints"].items():
+            self.stdout.write(
+                f"{name:<13} {row['requests']:>6} {row['per_second']:>7} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                f"{row['p99_ms']:>8} {row['max_ms']:>8} {row['error']:>6} {row['expired']:>7}"
+            )
+
+        self.stdout.write(
+            f"Confirmed orders/s: {report['orders_per_second']} | error rate: {report['error_rate']:.2%} | "
+            f"expiry rate: {report['expiry_rate']:.2%} | abandoned: {report['abandoned_locks']} "
+            f"(swept {report['swept_locks']})"
+        )
+        for error, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+            self.stdout.write(self.style.WARNING(f"  {count} × {error}"))
+
+        consistency = report["consistency"]
+        self.stdout.write(
+            f"Bought {consistency['bought_grams']}g, sold {consistency['sold_grams']}g, "
+            f"inventory moved {consistency['inventory_delta_grams']}g; "
+            f"reserved {consistency['reserved_grams']}g vs pending buys {consistency['pending_buy_grams']}g; "
+            f"{consistency['wallets_checked']} wallets, {consistency['wallet_mismatches']} mismatches"
+        )
+        style = self.style.SUCCESS if consistency["ok"] else self.style.ERROR
+        self.stdout.write(style(
+            "Consistent" if consistency["ok"]
+            else "INCONSISTENT: " + ", ".join(name for name, ok in consistency["checks"].items() if not ok)
+        ))
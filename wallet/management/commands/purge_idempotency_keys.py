@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from wallet.idempotency import IdempotencyStore
+
+
+class Command(BaseCommand):
+    help = "Deletes expired Idempotency-Key records in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Rows deleted per statement (default IDEMPOTENCY_PURGE_BATCH_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyStore.purge_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired idempotency keys."))
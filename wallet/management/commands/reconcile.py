@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.reconciliation import Reconciler
+
+
+class Command(BaseCommand):
+    help = "Reconciles wallet balances, the ledger, executed orders and inventory (incremental by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recompute every running total from scratch (audit mode).",
+        )
+        parser.add_argument(
+            "--rebaseline-inventory",
+            action="store_true",
+            help="Accept the current inventory total (after a deliberate restock or write-off).",
+        )
+        parser.add_argument(
+            "--tolerance",
+            help="Grams of drift tolerated (default WALLET_RECONCILIATION_TOLERANCE_GRAMS).",
+        )
+
+    def handle(self, *args, **options):
+        run = Reconciler(tolerance=options["tolerance"]).run(
+            full=options["full"],
+            rebaseline_inventory=options["rebaseline_inventory"],
+        )
+
+        for check in run.checks:
+            style = self.style.SUCCESS if check["ok"] else self.style.ERROR
+            self.stdout.write(
+                style(
+                    f"{check['check']:<26} expected {check['expected']:>20}  actual {check['actual']:>20}  "
+                    f"drift {check['drift']}"
+                )
+            )
+
+        summary = f"{run.mode} run {run.pk}: {run.rows_processed} rows folded in {run.seconds}s"
+        if not run.ok:
+            raise CommandError(f"{summary}; drift of up to {run.max_drift_grams}g.")
+        self.stdout.write(self.style.SUCCESS(summary))
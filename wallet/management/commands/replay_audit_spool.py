@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from wallet.audit import AuditEmitter
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes OrderAuditLog events left in the audit spool by workers of this instance that "
+        "have stopped (failed flushes, crashes); running workers replay their own. "
+        "--all-hosts also takes other instances' files (e.g. a container that came back under "
+        "a new hostname) once untouched for --stale-after seconds. "
+        "Safe to run repeatedly: replays are deduplicated by event_id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spool-dir", help="Spool directory (default AUDIT_SPOOL_DIR).")
+        parser.add_argument(
+            "--all-hosts",
+            action="store_true",
+            help="Also replay other instances' segments and spools.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=float,
+            default=300,
+            help="With --all-hosts: only files untouched for this many seconds (default 300).",
+        )
+
+    def handle(self, *args, **options):
+        stale_after = options["stale_after"] if options["all_hosts"] else None
+        replayed = AuditEmitter(spool_dir=options["spool_dir"]).replay(stale_after=stale_after)
+        self.stdout.write(self.style.SUCCESS(f"Replayed {replayed} audit events."))
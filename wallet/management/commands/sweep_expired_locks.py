@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from wallet.sweeper import ExpiredLockSweeper
+
+
+class Command(BaseCommand):
+    help = "Expires abandoned buy/sell locks: releases reserved inventory and re-credits held sell gold."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Orders expired per transaction (default WALLET_LOCK_SWEEP_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Stop after this many batches (default: until nothing is left).",
+        )
+
+    def handle(self, *args, **options):
+        report = ExpiredLockSweeper(
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+        ).run()
+
+        for number, batch in enumerate(report["batches"], start=1):
+            self.stdout.write(
+                f"Batch {number}: {batch['orders']} {batch['model']} | {batch['grams']}g | {batch['seconds']}s"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Expired {report['buy_orders']} buy / {report['sell_orders']} sell orders | "
+                f"Released {report['released_grams']}g | Re-credited {report['recredited_grams']}g | "
+                f"Max lag {report['max_lag_seconds']}s | {report['seconds']}s"
+            )
+        )
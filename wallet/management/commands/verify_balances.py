@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.checkpoints import BalanceCheckpointer
+
+
+class Command(BaseCommand):
+    help = "Checks every wallet balance against its latest checkpoint plus newer ledger rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wallet", type=int, action="append", help="Only this wallet id (repeatable).")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Wallets checked per query (default 1000).",
+        )
+
+    def handle(self, *args, **options):
+        report = BalanceCheckpointer(batch_size=options["batch_size"]).verify(options["wallet"])
+
+        for mismatch in report["mismatches"]:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Wallet {mismatch['wallet_id']}: balance {mismatch['actual']}g, "
+                    f"ledger says {mismatch['expected']}g (off by {mismatch['difference']}g)"
+                )
+            )
+
+        if report["mismatches"]:
+            raise CommandError(f"{len(report['mismatches'])} of {report['wallets']} wallets do not match their ledger.")
+
+        self.stdout.write(self.style.SUCCESS(f"All {report['wallets']} wallets match their ledger."))
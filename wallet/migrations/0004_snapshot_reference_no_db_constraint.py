@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    State only: market 0008 drops these FK constraints on Postgres, where
+    the partitioned snapshot table cannot be referenced by id alone.
+    Other backends keep the constraint created by earlier migrations.
+    """
+
+    dependencies = [
+        ("market", "0007_dailyclosingprice_source_snapshot_no_db_constraint"),
+        ("wallet", "0003_goldinventory_remove_buyorder_total_pkr_and_more"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="buyorder",
+                    name="snapshot_reference",
+                    field=models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="market.goldpricesnapshot",
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="sellorder",
+                    name="snapshot_reference",
+                    field=models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="market.goldpricesnapshot",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0004_snapshot_reference_no_db_constraint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="buyorder",
+            name="inventory_stripe",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
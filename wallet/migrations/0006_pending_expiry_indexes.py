@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("market", "0009_schedulerlease"),
+        ("wallet", "0005_buyorder_inventory_stripe"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="buyorder",
+            index=models.Index(
+                condition=models.Q(("status", "PENDING_LOCKED")),
+                fields=["status", "expires_at"],
+                name="buyorder_pending_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sellorder",
+            index=models.Index(
+                condition=models.Q(("status", "PENDING_LOCKED")),
+                fields=["status", "expires_at"],
+                name="sellorder_pending_expiry_idx",
+            ),
+        ),
+    ]
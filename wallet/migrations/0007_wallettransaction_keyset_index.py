@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0006_pending_expiry_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="wallettransaction",
+            index=models.Index(
+                fields=["wallet", "-timestamp", "-id"], name="wallettx_wallet_ts_id_idx"
+            ),
+        ),
+    ]
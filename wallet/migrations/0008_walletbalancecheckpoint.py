@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0007_wallettransaction_keyset_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WalletBalanceCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("balance_grams", models.DecimalField(decimal_places=6, max_digits=20)),
+                ("last_transaction_id", models.BigIntegerField()),
+                ("as_of", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="wallettransaction",
+            index=models.Index(fields=["wallet", "id"], name="wallettx_wallet_id_idx"),
+        ),
+        migrations.AddField(
+            model_name="walletbalancecheckpoint",
+            name="wallet",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="balance_checkpoints",
+                to="wallet.wallet",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="walletbalancecheckpoint",
+            index=models.Index(
+                fields=["wallet", "-as_of"], name="wallet_checkpoint_as_of_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="walletbalancecheckpoint",
+            constraint=models.UniqueConstraint(
+                fields=("wallet", "last_transaction_id"),
+                name="unique_wallet_checkpoint",
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0008_walletbalancecheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReconciliationCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                (
+                    "total",
+                    models.DecimalField(decimal_places=8, default=0, max_digits=24),
+                ),
+                ("last_id", models.BigIntegerField(blank=True, null=True)),
+                ("last_timestamp", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ReconciliationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "mode",
+                    models.CharField(
+                        choices=[("INCREMENTAL", "Incremental"), ("FULL", "Full")],
+                        default="INCREMENTAL",
+                        max_length=12,
+                    ),
+                ),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("seconds", models.FloatField(default=0)),
+                ("rows_processed", models.PositiveIntegerField(default=0)),
+                (
+                    "max_drift_grams",
+                    models.DecimalField(decimal_places=8, default=0, max_digits=24),
+                ),
+                ("ok", models.BooleanField(default=True)),
+                ("checks", models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                "ordering": ["-started_at"],
+            },
+        ),
+    ]
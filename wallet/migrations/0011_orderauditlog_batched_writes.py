@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:03
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0010_idempotencyrecord"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderauditlog",
+            name="event_id",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="orderauditlog",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="orderauditlog",
+            index=models.Index(
+                fields=["order_id", "timestamp"], name="audit_order_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderauditlog",
+            index=models.Index(fields=["user", "timestamp"], name="audit_user_ts_idx"),
+        ),
+    ]
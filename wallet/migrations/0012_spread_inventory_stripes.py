@@ -0,0 +1,52 @@
+# Spreads the stock of the single pre-striping GoldInventory row over
+# stripes 1..INVENTORY_STRIPES (InventoryEngine.rebalance() at deploy
+# time). Without it every reserve would keep hitting row 1.
+
+from decimal import Decimal, ROUND_DOWN
+
+from django.conf import settings
+from django.db import migrations
+
+
+STRIPE_QUANTUM = Decimal("0.00000001")
+
+
+def spread_stripes(apps, schema_editor):
+    GoldInventory = apps.get_model("wallet", "GoldInventory")
+    count = max(1, settings.INVENTORY_STRIPES)
+    if not GoldInventory.objects.exists():
+        return  # Fresh install: stripes are created on first use
+
+    GoldInventory.objects.bulk_create(
+        [GoldInventory(id=stripe) for stripe in range(1, count + 1)],
+        ignore_conflicts=True,
+    )
+    rows = list(GoldInventory.objects.select_for_update().order_by("id"))
+
+    # Reservations stay on their row (pending orders point at it);
+    # only available grams move
+    available = sum((row.total_grams - row.reserved_grams for row in rows), Decimal("0"))
+    share = (available / count).quantize(STRIPE_QUANTUM, rounding=ROUND_DOWN)
+    remainder = available - share * count
+
+    for row in rows:
+        if row.id > count:
+            target = Decimal("0")
+        elif row.id == 1:
+            target = share + remainder
+        else:
+            target = share
+        row.total_grams = row.reserved_grams + target
+
+    GoldInventory.objects.bulk_update(rows, ["total_grams"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet", "0011_orderauditlog_batched_writes"),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_stripes, migrations.RunPython.noop),
+    ]
@@ -58,11 +58,45 @@ class WalletTransaction(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # Ledger keyset pagination: WHERE wallet = ? AND (timestamp, id) < ?
+            models.Index(fields=["wallet", "-timestamp", "-id"], name="wallettx_wallet_ts_id_idx"),
+            # Balance checkpoints: a wallet's rows after a checkpoint's id
+            models.Index(fields=["wallet", "id"], name="wallettx_wallet_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.tx_type} {self.gold_amount_grams}g ({self.reference})"
 
 
+# -----------------------------
+# BALANCE CHECKPOINT
+# -----------------------------
+class WalletBalanceCheckpoint(models.Model):
+    """
+    Balance of a wallet after every WalletTransaction with
+    id <= last_transaction_id. as_of = newest timestamp among them.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="balance_checkpoints")
+
+    balance_grams = models.DecimalField(max_digits=20, decimal_places=6)
+    last_transaction_id = models.BigIntegerField()
+    as_of = models.DateTimeField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["wallet", "last_transaction_id"], name="unique_wallet_checkpoint"),
+        ]
+        indexes = [
+            models.Index(fields=["wallet", "-as_of"], name="wallet_checkpoint_as_of_idx"),
+        ]
+
+    def __str__(self):
+        return f"Checkpoint({self.wallet_id}: {self.balance_grams}g @ tx {self.last_transaction_id})"
+
+
 # -----------------------------
 # BUY ORDER
 # -----------------------------
@@ -87,12 +121,18 @@ class BuyOrder(models.Model):
     total_payable_pkr = models.DecimalField(max_digits=20, decimal_places=2, default=0)
 
     soft_allocated_grams = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    # GoldInventory stripe holding the reservation (null: legacy orders)
+    inventory_stripe = models.PositiveSmallIntegerField(null=True, blank=True)
 
+    # Postgres drops this FK's DB constraint (market migration 0008): the
+    # partitioned snapshot table cannot be referenced by id alone. Other
+    # backends keep the constraint; the ORM handles on_delete either way
     snapshot_reference = models.ForeignKey(
         "market.GoldPriceSnapshot",
         on_delete=models.SET_NULL,
         null=True,
-        blank=True
+        blank=True,
+        db_constraint=False,
     )
 
     locked_at = models.DateTimeField()
@@ -103,6 +143,16 @@ class BuyOrder(models.Model):
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING_LOCKED)
 
+    class Meta:
+        indexes = [
+            # Expired-lock sweeper: only pending rows are indexed
+            models.Index(
+                fields=["status", "expires_at"],
+                name="buyorder_pending_expiry_idx",
+                condition=models.Q(status="PENDING_LOCKED"),
+            ),
+        ]
+
     def __str__(self):
         return f"BuyOrder({self.order_token})"
 
@@ -132,11 +182,15 @@ class SellOrder(models.Model):
 
     soft_allocated_grams = models.DecimalField(max_digits=20, decimal_places=8, default=0)
 
+    # Postgres drops this FK's DB constraint (market migration 0008): the
+    # partitioned snapshot table cannot be referenced by id alone. Other
+    # backends keep the constraint; the ORM handles on_delete either way
     snapshot_reference = models.ForeignKey(
         "market.GoldPriceSnapshot",
         on_delete=models.SET_NULL,
         null=True,
-        blank=True
+        blank=True,
+        db_constraint=False,
     )
 
     locked_at = models.DateTimeField()
@@ -147,6 +201,16 @@ class SellOrder(models.Model):
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING_LOCKED)
 
+    class Meta:
+        indexes = [
+            # Expired-lock sweeper: only pending rows are indexed
+            models.Index(
+                fields=["status", "expires_at"],
+                name="sellorder_pending_expiry_idx",
+                condition=models.Q(status="PENDING_LOCKED"),
+            ),
+        ]
+
     def __str__(self):
         return f"SellOrder({self.order_token})"
 
@@ -154,6 +218,7 @@ class SellOrder(models.Model):
 # -----------------------------
 # GOLD INVENTORY
 # -----------------------------
+# One row per stripe (ids 1..INVENTORY_STRIPES); stock = sum of all rows
 class GoldInventory(models.Model):
     total_grams = models.DecimalField(max_digits=20, decimal_places=8, default=0)
     reserved_grams = models.DecimalField(max_digits=20, decimal_places=8, default=0)
@@ -163,4 +228,84 @@ class GoldInventory(models.Model):
         return self.total_grams - self.reserved_grams
 
     def __str__(self):
-        return f"Inventory: {self.total_grams}g total / {self.reserved_grams}g reserved"
\ No newline at end of file
+        return f"Inventory: {self.total_grams}g total / {self.reserved_grams}g reserved"
+
+
+# -----------------------------
+# RECONCILIATION
+# -----------------------------
+class ReconciliationCounter(models.Model):
+    """
+    Running aggregate kept by the reconciliation job: total over every
+    row up to the high-water mark (an id or a timestamp, per counter).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    total = models.DecimalField(max_digits=24, decimal_places=8, default=0)
+
+    last_id = models.BigIntegerField(null=True, blank=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.total}"
+
+
+class ReconciliationRun(models.Model):
+    MODE_INCREMENTAL = "INCREMENTAL"
+    MODE_FULL = "FULL"
+
+    MODE_CHOICES = [
+        (MODE_INCREMENTAL, "Incremental"),
+        (MODE_FULL, "Full"),
+    ]
+
+    mode = models.CharField(max_length=12, choices=MODE_CHOICES, default=MODE_INCREMENTAL)
+    started_at = models.DateTimeField(default=timezone.now)
+    seconds = models.FloatField(default=0)
+
+    rows_processed = models.PositiveIntegerField(default=0)
+    max_drift_grams = models.DecimalField(max_digits=24, decimal_places=8, default=0)
+    ok = models.BooleanField(default=True)
+
+    # [{"check", "expected", "actual", "drift", "ok"}, ...]
+    checks = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"Reconciliation {self.mode} @ {self.started_at:%Y-%m-%d %H:%M} ({'ok' if self.ok else 'DRIFT'})"
+
+
+# -----------------------------
+# IDEMPOTENCY KEYS
+# -----------------------------
+class IdempotencyRecord(models.Model):
+    """
+    Stored outcome of a request made with an Idempotency-Key.
+    status_code is null while the first request is still running.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=200)
+    endpoint = models.CharField(max_length=100)
+
+    # sha256 of the request body: a reused key with another body is refused
+    request_hash = models.CharField(max_length=64)
+
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key", "endpoint"], name="unique_idempotency_key"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"IdempotencyRecord({self.endpoint}: {self.key})"
@@ -0,0 +1,199 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import mail_admins
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .checkpoints import signed_amount
+from .models import (
+    BuyOrder,
+    GoldInventory,
+    ReconciliationCounter,
+    ReconciliationRun,
+    SellOrder,
+    Wallet,
+    WalletTransaction,
+)
+
+
+ZERO = Decimal("0")
+
+LEDGER_NET = "ledger_net"
+BUYS_EXECUTED = "buys_executed"
+SELLS_EXECUTED = "sells_executed"
+# Stock the inventory would hold with no orders ever executed:
+# expected total = base - executed buys + executed sells
+INVENTORY_BASE = "inventory_base"
+
+RUNNING_COUNTERS = [LEDGER_NET, BUYS_EXECUTED, SELLS_EXECUTED]
+
+
+def _sum(queryset, expression):
+    return queryset.aggregate(total=Coalesce(Sum(expression), ZERO), rows=Count("id"))
+
+
+# ----------------------------------------------
+# RECONCILIATION
+# ----------------------------------------------
+class Reconciler:
+    """
+    Cross-checks wallets, ledger, orders and inventory without summing
+    whole tables on every run.
+    - running counters (ReconciliationCounter) for the ledger net amount
+      (high-water mark: id) and executed buy/sell grams (high-water mark:
+      executed_at); each run only reads rows past the mark
+    - rows younger than settle_seconds are summed as a live tail but not
+      folded into the counter, so late commits are never skipped
+    - every aggregate is read from one snapshot (REPEATABLE READ on
+      Postgres), so in-flight orders do not show up as drift
+    - full=True recomputes the counters from scratch (audits)
+    Checks:
+    - wallets_vs_ledger: sum of balances == ledger credits - debits
+    - inventory_vs_orders: inventory total == base - buys + sells
+    - reserved_vs_pending_buys: reserved grams == pending buy allocations
+    """
+
+    def __init__(self, tolerance=None, settle_seconds=None):
+        self.tolerance = Decimal(str(tolerance if tolerance is not None else settings.WALLET_RECONCILIATION_TOLERANCE_GRAMS))
+        self.settle_seconds = settings.WALLET_RECONCILIATION_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+
+    def run(self, full=False, rebaseline_inventory=False, now=None):
+        started = time.monotonic()
+        now = now or timezone.now()
+        cutoff = now - timedelta(seconds=self.settle_seconds)
+        outermost = not connection.in_atomic_block
+
+        with transaction.atomic():
+            if outermost and connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+            counters = {
+                counter.name: counter
+                for counter in ReconciliationCounter.objects.select_for_update().filter(
+                    name__in=RUNNING_COUNTERS + [INVENTORY_BASE]
+                )
+            }
+            # First run: nothing to continue from
+            full = full or any(name not in counters for name in RUNNING_COUNTERS)
+            for name in RUNNING_COUNTERS + [INVENTORY_BASE]:
+                counters.setdefault(name, ReconciliationCounter(name=name))
+
+            rows = 0
+            ledger_net, processed = self._advance_by_id(
+                counters[LEDGER_NET], WalletTransaction.objects.all(), signed_amount(), full, cutoff
+            )
+            rows += processed
+            buys, processed = self._advance_by_executed_at(counters[BUYS_EXECUTED], BuyOrder, full, cutoff)
+            rows += processed
+            sells, processed = self._advance_by_executed_at(counters[SELLS_EXECUTED], SellOrder, full, cutoff)
+            rows += processed
+
+            inventory = GoldInventory.objects.aggregate(
+                total=Coalesce(Sum("total_grams"), ZERO),
+                reserved=Coalesce(Sum("reserved_grams"), ZERO),
+            )
+            wallets = Wallet.objects.aggregate(total=Coalesce(Sum("gold_balance_grams"), ZERO))["total"]
+            pending_buys = _sum(
+                BuyOrder.objects.filter(status=BuyOrder.STATUS_PENDING_LOCKED), "soft_allocated_grams"
+            )["total"]
+
+            base = counters[INVENTORY_BASE]
+            if base.pk is None or rebaseline_inventory:
+                # Accept the current stock (first run, or after a restock)
+                base.total = inventory["total"] + buys - sells
+                base.last_timestamp = now
+                base.save()
+
+            checks = [
+                self._check("wallets_vs_ledger", expected=ledger_net, actual=wallets),
+                self._check("inventory_vs_orders", expected=base.total - buys + sells, actual=inventory["total"]),
+                self._check("reserved_vs_pending_buys", expected=pending_buys, actual=inventory["reserved"]),
+            ]
+
+            run = ReconciliationRun.objects.create(
+                mode=ReconciliationRun.MODE_FULL if full else ReconciliationRun.MODE_INCREMENTAL,
+                started_at=now,
+                seconds=round(time.monotonic() - started, 3),
+                rows_processed=rows,
+                max_drift_grams=max(abs(Decimal(check["drift"])) for check in checks),
+                ok=all(check["ok"] for check in checks),
+                checks=checks,
+            )
+
+        if not run.ok:
+            self.alert(run)
+        return run
+
+    def _check(self, name, expected, actual):
+        drift = actual - expected
+        return {
+            "check": name,
+            "expected": format(expected, "f"),
+            "actual": format(actual, "f"),
+            "drift": format(drift, "f"),
+            "ok": abs(drift) <= self.tolerance,
+        }
+
+    @staticmethod
+    def _advance_by_id(counter, queryset, amount, full, cutoff):
+        """
+        Folds rows with id past the mark and older than cutoff into the
+        counter. Returns (counter total + live tail, rows folded).
+        """
+        if full:
+            counter.total, counter.last_id = ZERO, 0
+        last_id = counter.last_id or 0
+
+        settled_id = queryset.filter(id__gt=last_id, timestamp__lte=cutoff).aggregate(last=Max("id"))["last"]
+        processed = 0
+        if settled_id is not None:
+            added = _sum(queryset.filter(id__gt=last_id, id__lte=settled_id), amount)
+            counter.total += added["total"]
+            counter.last_id = settled_id
+            processed = added["rows"]
+        counter.save()
+
+        tail = _sum(queryset.filter(id__gt=counter.last_id or 0), amount)["total"]
+        return counter.total + tail, processed
+
+    @staticmethod
+    def _advance_by_executed_at(counter, model, full, cutoff):
+        """
+        Same for executed order grams, marked by executed_at (set once,
+        when an order executes).
+        """
+        if full:
+            counter.total, counter.last_timestamp = ZERO, None
+
+        executed = model.objects.filter(status=model.STATUS_EXECUTED)
+        settled = executed.filter(executed_at__lte=cutoff)
+        if counter.last_timestamp is not None:
+            settled = settled.filter(executed_at__gt=counter.last_timestamp)
+
+        added = _sum(settled, "gold_quantity_grams")
+        counter.total += added["total"]
+        counter.last_timestamp = max(cutoff, counter.last_timestamp) if counter.last_timestamp else cutoff
+        counter.save()
+
+        tail = _sum(executed.filter(executed_at__gt=counter.last_timestamp), "gold_quantity_grams")["total"]
+        return counter.total + tail, added["rows"]
+
+    @staticmethod
+    def alert(run):
+        failed = [check for check in run.checks if not check["ok"]]
+        lines = [
+            f"{check['check']}: expected {check['expected']}g, actual {check['actual']}g, drift {check['drift']}g"
+            for check in failed
+        ]
+        print(f"[Reconciliation] DRIFT in run {run.pk}: " + "; ".join(lines))
+        mail_admins(
+            f"Reconciliation drift: {', '.join(check['check'] for check in failed)}",
+            f"Run {run.pk} ({run.mode}) at {run.started_at:%Y-%m-%d %H:%M:%S %Z}\n\n" + "\n".join(lines),
+            fail_silently=True,
+        )
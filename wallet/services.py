@@ -1,15 +1,42 @@
-from decimal import Decimal
+from decimal import Decimal, ROUND_DOWN
+import random
 import uuid
 
-from django.db import transaction
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 
 from .models import Wallet, WalletTransaction, GoldInventory
 
 
+ZERO = Decimal("0")
+
+# GoldInventory stores 8 decimal places
+STRIPE_QUANTUM = Decimal("0.00000001")
+
+
 # ----------------------------------------------
 # WALLET ENGINE
 # ----------------------------------------------
+def supports_update_returning():
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
 class WalletEngine:
+    """
+    Balance changes are one conditional UPDATE that returns the new
+    balance, plus one ledger INSERT, in a single transaction.
+    - the balance is computed by the DB (balance ± grams), so concurrent
+      credits/debits never overwrite each other
+    - debit only matches while balance >= grams; no row = insufficient
+    - the passed wallet instance gets the new balance
+    """
 
     @staticmethod
     @transaction.atomic
@@ -17,11 +44,10 @@ class WalletEngine:
         if grams <= 0:
             raise ValueError("Credit grams must be positive")
 
-        wallet.gold_balance_grams += grams
-        wallet.save(update_fields=["gold_balance_grams"])
+        WalletEngine._apply(wallet, grams)
 
         return WalletTransaction.objects.create(
-            user=wallet.user,
+            user_id=wallet.user_id,
             wallet=wallet,
             tx_type=WalletTransaction.CREDIT,
             gold_amount_grams=grams,
@@ -36,14 +62,11 @@ class WalletEngine:
         if grams <= 0:
             raise ValueError("Debit grams must be positive")
 
-        if wallet.gold_balance_grams < grams:
+        if not WalletEngine._apply(wallet, -grams, minimum=grams):
             raise ValueError("Insufficient gold balance")
 
-        wallet.gold_balance_grams -= grams
-        wallet.save(update_fields=["gold_balance_grams"])
-
         return WalletTransaction.objects.create(
-            user=wallet.user,
+            user_id=wallet.user_id,
             wallet=wallet,
             tx_type=WalletTransaction.DEBIT,
             gold_amount_grams=grams,
@@ -52,65 +75,287 @@ class WalletEngine:
             idempotency_key=str(uuid.uuid4())
         )
 
+    @staticmethod
+    @transaction.atomic
+    def bulk_credit(credits):
+        """
+        credits: (wallet_id, user_id, grams, reference) tuples, several
+        per wallet allowed. One UPDATE (CASE per wallet), one read-back and
+        one bulk INSERT of ledger rows, whatever the number of wallets.
+        """
+        if not credits:
+            return []
+
+        totals = {}
+        for wallet_id, _, grams, _ in credits:
+            if grams <= 0:
+                raise ValueError("Credit grams must be positive")
+            totals[wallet_id] = totals.get(wallet_id, ZERO) + grams
+
+        Wallet.objects.filter(pk__in=totals).update(
+            gold_balance_grams=F("gold_balance_grams") + Case(
+                *[When(pk=wallet_id, then=Value(grams)) for wallet_id, grams in totals.items()],
+                output_field=Wallet._meta.get_field("gold_balance_grams"),
+            ),
+            updated_at=timezone.now(),
+        )
+
+        # Rows stay locked until commit: balance before = after - credited
+        running = {
+            wallet_id: balance - totals[wallet_id]
+            for wallet_id, balance in Wallet.objects.filter(pk__in=totals).values_list("pk", "gold_balance_grams")
+        }
+
+        entries = []
+        for wallet_id, user_id, grams, reference in credits:
+            running[wallet_id] += grams
+            entries.append(
+                WalletTransaction(
+                    user_id=user_id,
+                    wallet_id=wallet_id,
+                    tx_type=WalletTransaction.CREDIT,
+                    gold_amount_grams=grams,
+                    balance_after_tx=running[wallet_id],
+                    reference=reference,
+                    idempotency_key=str(uuid.uuid4()),
+                )
+            )
+        return WalletTransaction.objects.bulk_create(entries)
+
+    @staticmethod
+    def _apply(wallet: Wallet, delta: Decimal, minimum: Decimal = None):
+        """
+        balance += delta (only while balance >= minimum, if given).
+        Returns False when no row matched.
+        """
+        now = timezone.now()
+
+        if supports_update_returning():
+            balance = WalletEngine._update_returning(wallet.pk, delta, minimum, now)
+        else:
+            # No UPDATE ... RETURNING: same conditional update, then read
+            # back (the updated row stays locked until the transaction ends)
+            wallets = Wallet.objects.filter(pk=wallet.pk)
+            if minimum is not None:
+                wallets = wallets.filter(gold_balance_grams__gte=minimum)
+            updated = wallets.update(gold_balance_grams=F("gold_balance_grams") + delta, updated_at=now)
+            balance = (
+                Wallet.objects.filter(pk=wallet.pk).values_list("gold_balance_grams", flat=True).get()
+                if updated else None
+            )
+
+        if balance is None:
+            return False
+
+        wallet.gold_balance_grams = balance
+        wallet.updated_at = now
+        return True
+
+    @staticmethod
+    def _update_returning(wallet_id, delta, minimum, now):
+        meta = Wallet._meta
+        balance_field = meta.get_field("gold_balance_grams")
+        quote = connection.ops.quote_name
+        balance = quote(balance_field.column)
+
+        sql = (
+            f"UPDATE {quote(meta.db_table)} "
+            f"SET {balance} = {balance} + %s, {quote(meta.get_field('updated_at').column)} = %s "
+            f"WHERE {quote(meta.pk.column)} = %s"
+        )
+        params = [
+            connection.ops.adapt_decimalfield_value(delta, balance_field.max_digits, balance_field.decimal_places),
+            connection.ops.adapt_datetimefield_value(now),
+            wallet_id,
+        ]
+        if minimum is not None:
+            sql += f" AND {balance} >= %s"
+            params.append(
+                connection.ops.adapt_decimalfield_value(minimum, balance_field.max_digits, balance_field.decimal_places)
+            )
+        sql += f" RETURNING {balance}"
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        # SQLite hands back a float; normalise to the column's precision
+        return balance_field.to_python(row[0]).quantize(Decimal(1).scaleb(-balance_field.decimal_places))
+
 
 # ----------------------------------------------
-# INVENTORY ENGINE
+# INVENTORY ENGINE (striped)
 # ----------------------------------------------
+def stripe_count():
+    return max(1, settings.INVENTORY_STRIPES)
+
+
 class InventoryEngine:
+    """
+    Gold stock is spread over GoldInventory rows 1..INVENTORY_STRIPES
+    (stripes), so concurrent buys do not all queue on one row.
+    - reserve/release/reduce/increase are single conditional UPDATEs with
+      F() expressions on one stripe: no read-modify-write, no lost updates
+    - reserve starts at a random stripe; if no stripe can cover the
+      grams alone, rebalance() spreads the available grams evenly (all
+      stripes locked in id order) and reserves in the same transaction
+    - totals() is one aggregate over the stripes
+    """
 
     @staticmethod
     def get_inventory():
+        """
+        Stripe 1 (the original single inventory row).
+        """
         inventory, _ = GoldInventory.objects.get_or_create(id=1)
         return inventory
 
     @staticmethod
-    @transaction.atomic
+    def totals():
+        totals = GoldInventory.objects.aggregate(
+            total_grams=Coalesce(Sum("total_grams"), ZERO),
+            reserved_grams=Coalesce(Sum("reserved_grams"), ZERO),
+            stripes=Count("id"),
+        )
+        totals["available_grams"] = totals["total_grams"] - totals["reserved_grams"]
+        return totals
+
+    @staticmethod
     def reserve(grams: Decimal):
+        """
+        Reserves grams on one stripe and returns its id (store it on the
+        order so release/fulfil hit the same stripe).
+        """
         if grams <= 0:
             raise ValueError("Reserve grams must be positive")
 
-        inv = InventoryEngine.get_inventory()
+        for stripe in InventoryEngine._stripe_order():
+            updated = GoldInventory.objects.filter(
+                id=stripe,
+                total_grams__gte=F("reserved_grams") + grams,
+            ).update(reserved_grams=F("reserved_grams") + grams)
+            if updated:
+                return stripe
 
-        if grams > inv.available_grams:
-            raise ValueError("Insufficient inventory to reserve gold")
-
-        inv.reserved_grams += grams
-        inv.save(update_fields=["reserved_grams"])
-        return inv
+        return InventoryEngine.rebalance(reserve_grams=grams)
 
     @staticmethod
-    @transaction.atomic
-    def release(grams: Decimal):
+    def release(grams: Decimal, stripe=None):
         if grams <= 0:
-            return InventoryEngine.get_inventory()
+            return stripe
 
-        inv = InventoryEngine.get_inventory()
-        inv.reserved_grams = max(inv.reserved_grams - grams, Decimal("0"))
-        inv.save(update_fields=["reserved_grams"])
-        return inv
+        if stripe is None:
+            stripe = (
+                GoldInventory.objects
+                .filter(reserved_grams__gte=grams)
+                .values_list("id", flat=True)
+                .first()
+            ) or (
+                GoldInventory.objects
+                .order_by("-reserved_grams")
+                .values_list("id", flat=True)
+                .first()
+            )
+
+        GoldInventory.objects.filter(id=stripe).update(
+            reserved_grams=Greatest(F("reserved_grams") - grams, ZERO)
+        )
+        return stripe
 
     @staticmethod
-    @transaction.atomic
-    def reduce_total(grams: Decimal):
+    def fulfil(grams: Decimal, reserved_grams: Decimal, stripe=None):
+        """
+        Confirmed buy: takes grams out of stock and drops the matching
+        reservation in one UPDATE on the reserving stripe.
+        """
+        if stripe is None:
+            InventoryEngine.reduce_total(grams)
+            return InventoryEngine.release(reserved_grams)
+
+        updated = GoldInventory.objects.filter(id=stripe, total_grams__gte=grams).update(
+            total_grams=F("total_grams") - grams,
+            reserved_grams=Greatest(F("reserved_grams") - reserved_grams, ZERO),
+        )
+        if not updated:
+            raise ValueError("Insufficient total inventory")
+        return stripe
+
+    @staticmethod
+    def reduce_total(grams: Decimal, stripe=None):
         if grams <= 0:
             raise ValueError("Reduce grams must be positive")
 
-        inv = InventoryEngine.get_inventory()
-
-        if grams > inv.total_grams:
-            raise ValueError("Insufficient total inventory")
+        stripes = [stripe] if stripe is not None else InventoryEngine._stripe_order()
+        for candidate in stripes:
+            updated = GoldInventory.objects.filter(id=candidate, total_grams__gte=grams).update(
+                total_grams=F("total_grams") - grams
+            )
+            if updated:
+                return candidate
 
-        inv.total_grams -= grams
-        inv.save(update_fields=["total_grams"])
-        return inv
+        raise ValueError("Insufficient total inventory")
 
     @staticmethod
-    @transaction.atomic
     def increase_total(grams: Decimal):
         if grams <= 0:
             raise ValueError("Increase grams must be positive")
 
-        inv = InventoryEngine.get_inventory()
-        inv.total_grams += grams
-        inv.save(update_fields=["total_grams"])
-        return inv
\ No newline at end of file
+        stripe = random.randint(1, stripe_count())
+        updated = GoldInventory.objects.filter(id=stripe).update(total_grams=F("total_grams") + grams)
+        if not updated:
+            InventoryEngine.ensure_stripes()
+            GoldInventory.objects.filter(id=stripe).update(total_grams=F("total_grams") + grams)
+        return stripe
+
+    @staticmethod
+    def ensure_stripes():
+        GoldInventory.objects.bulk_create(
+            [GoldInventory(id=stripe) for stripe in range(1, stripe_count() + 1)],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def rebalance(reserve_grams: Decimal = None):
+        """
+        Spreads available grams evenly over stripes 1..INVENTORY_STRIPES
+        (rows above that, e.g. after lowering the setting, are drained).
+        With reserve_grams, also reserves them on the first stripe and
+        returns its id. Locks every stripe in id order (no deadlocks).
+        """
+        InventoryEngine.ensure_stripes()
+        count = stripe_count()
+        rows = list(GoldInventory.objects.select_for_update().order_by("id"))
+
+        available = sum((row.available_grams for row in rows), ZERO)
+        if reserve_grams is not None:
+            if reserve_grams > available:
+                raise ValueError("Insufficient inventory to reserve gold")
+            available -= reserve_grams
+
+        share = (available / count).quantize(STRIPE_QUANTUM, rounding=ROUND_DOWN)
+        remainder = available - share * count
+
+        for row in rows:
+            if row.id > count:
+                target = ZERO
+            elif row.id == 1:
+                target = share + remainder + (reserve_grams or ZERO)
+            else:
+                target = share
+            row.total_grams = row.reserved_grams + target
+
+        rows_by_id = {row.id: row for row in rows}
+        if reserve_grams is not None:
+            rows_by_id[1].reserved_grams += reserve_grams
+
+        GoldInventory.objects.bulk_update(rows, ["total_grams", "reserved_grams"])
+        return 1 if reserve_grams is not None else None
+
+    @staticmethod
+    def _stripe_order():
+        count = stripe_count()
+        start = random.randrange(count)
+        return [(start + offset) % count + 1 for offset in range(count)]
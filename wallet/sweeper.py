@@ -0,0 +1,141 @@
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .audit import get_audit_emitter
+from .audit_models import OrderAuditLog
+from .models import BuyOrder, SellOrder
+from .services import InventoryEngine, WalletEngine, supports_update_returning
+
+
+# ----------------------------------------------
+# EXPIRED LOCK SWEEPER
+# ----------------------------------------------
+class ExpiredLockSweeper:
+    """
+    Expires abandoned PENDING_LOCKED orders in batches (oldest first).
+    Per batch, in one short transaction:
+    - claims the rows with one conditional UPDATE (status still
+      PENDING_LOCKED), so a concurrent confirm and the sweeper never both
+      act on the same order
+    - buys: releases the summed soft allocations, one UPDATE per stripe
+    - sells: re-credits the held gold (WalletEngine.bulk_credit)
+    Lag = how long the oldest swept order had been expired.
+    """
+
+    SELL_EXPIRE_REFERENCE = "sell_expire"
+
+    def __init__(self, batch_size=None, max_batches=None):
+        self.batch_size = batch_size or settings.WALLET_LOCK_SWEEP_BATCH_SIZE
+        self.max_batches = max_batches
+
+    def run(self, now=None):
+        started = time.monotonic()
+        now = now or timezone.now()
+        report = {
+            "buy_orders": 0,
+            "sell_orders": 0,
+            "released_grams": 0,
+            "recredited_grams": 0,
+            "max_lag_seconds": 0.0,
+            "batches": [],
+        }
+
+        for model, sweep in ((BuyOrder, self._sweep_buys), (SellOrder, self._sweep_sells)):
+            while self.max_batches is None or len(report["batches"]) < self.max_batches:
+                batch_started = time.monotonic()
+                with transaction.atomic():
+                    orders = self._claim(model, now)
+                    if not orders:
+                        break
+                    grams = sweep(orders)
+                    get_audit_emitter().emit_many(orders, OrderAuditLog.EVENT_LOCK_EXPIRED, description="Expired by sweeper")
+
+                lag = (now - min(order.expires_at for order in orders)).total_seconds()
+                report["max_lag_seconds"] = max(report["max_lag_seconds"], round(lag, 3))
+                report["batches"].append({
+                    "model": model.__name__,
+                    "orders": len(orders),
+                    "grams": grams,
+                    "seconds": round(time.monotonic() - batch_started, 3),
+                })
+
+                if model is BuyOrder:
+                    report["buy_orders"] += len(orders)
+                    report["released_grams"] += grams
+                else:
+                    report["sell_orders"] += len(orders)
+                    report["recredited_grams"] += grams
+
+                if len(orders) < self.batch_size:
+                    break
+
+        report["seconds"] = round(time.monotonic() - started, 3)
+        return report
+
+    def _claim(self, model, now):
+        """
+        Next batch of expired pending orders, flipped to EXPIRED by one
+        conditional UPDATE. Only rows that were still pending are
+        returned (a confirm may have won the race for some).
+        skip_locked: rows a confirm is working on are left for next time.
+        """
+        orders = list(
+            model.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=model.STATUS_PENDING_LOCKED, expires_at__lt=now)
+            .order_by("expires_at")
+            [:self.batch_size]
+        )
+        if not orders:
+            return []
+
+        ids = [order.pk for order in orders]
+        if supports_update_returning():
+            claimed = self._expire_returning(model, ids)
+        else:
+            # Rows are locked by the SELECT above on these backends
+            model.objects.filter(pk__in=ids, status=model.STATUS_PENDING_LOCKED).update(
+                status=model.STATUS_EXPIRED
+            )
+            claimed = set(ids)
+        return [order for order in orders if order.pk in claimed]
+
+    @staticmethod
+    def _expire_returning(model, ids):
+        meta = model._meta
+        quote = connection.ops.quote_name
+        status = quote(meta.get_field("status").column)
+        pk = quote(meta.pk.column)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {quote(meta.db_table)} SET {status} = %s "
+                f"WHERE {pk} IN ({', '.join(['%s'] * len(ids))}) AND {status} = %s "
+                f"RETURNING {pk}",
+                [model.STATUS_EXPIRED, *ids, model.STATUS_PENDING_LOCKED],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def _sweep_buys(orders):
+        per_stripe = {}
+        for order in orders:
+            per_stripe[order.inventory_stripe] = per_stripe.get(order.inventory_stripe, 0) + order.soft_allocated_grams
+
+        for stripe, grams in per_stripe.items():
+            if grams > 0:
+                InventoryEngine.release(grams, stripe=stripe)
+        return sum(per_stripe.values(), 0)
+
+    @classmethod
+    def _sweep_sells(cls, orders):
+        credits = [
+            (order.wallet_id, order.user_id, order.soft_allocated_grams, cls.SELL_EXPIRE_REFERENCE)
+            for order in orders
+            if order.soft_allocated_grams > 0
+        ]
+        WalletEngine.bulk_credit(credits)
+        return sum((grams for _, _, grams, _ in credits), 0)
@@ -1,9 +1,40 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from importlib import import_module
+from unittest import mock, skipUnless
 from decimal import Decimal
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 
-from wallet.models import Wallet, BuyOrder
+from django.test import override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from wallet.models import Wallet, BuyOrder, SellOrder, GoldInventory, WalletTransaction
+from config.perf import explain, full_scans, key_queries, query_budget
+from market.cache import LatestPriceCache
+from market.models import GoldPriceConfig, GoldPriceSnapshot
+from wallet.audit import AuditEmitter
+from wallet.audit_models import OrderAuditLog
 from wallet.services import WalletEngine, InventoryEngine
+from wallet import checkpoints
+from wallet.checkpoints import BalanceCheckpointer
+from wallet.idempotency import REPLAY_HEADER, IdempotencyStore, request_fingerprint
+from wallet.models import IdempotencyRecord, ReconciliationCounter, ReconciliationRun, WalletBalanceCheckpoint
+from wallet.reconciliation import LEDGER_NET, Reconciler
+from wallet.sweeper import ExpiredLockSweeper
+from wallet.views import claim_order
 
 from django.utils import timezone
 from datetime import timedelta
@@ -43,6 +74,31 @@ class WalletEngineTests(TestCase):
         with self.assertRaises(ValueError):
             WalletEngine.debit(self.wallet, Decimal("1"), reference="fail")
 
+    def test_debit_updates_instance_and_ledger(self):
+        WalletEngine.credit(self.wallet, Decimal("2.5"), reference="init")
+        tx = WalletEngine.debit(self.wallet, Decimal("0.1"), reference="debit")
+
+        self.assertEqual(self.wallet.gold_balance_grams, Decimal("2.4"))
+        self.assertEqual(tx.balance_after_tx, Decimal("2.4"))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.gold_balance_grams, Decimal("2.4"))
+
+    def test_stale_instances_do_not_lose_updates(self):
+        WalletEngine.credit(self.wallet, Decimal("3"), reference="init")
+        first = Wallet.objects.get(pk=self.wallet.pk)
+        second = Wallet.objects.get(pk=self.wallet.pk)
+
+        WalletEngine.debit(first, Decimal("1"), reference="a")
+        WalletEngine.debit(second, Decimal("1.5"), reference="b")
+
+        self.assertEqual(second.gold_balance_grams, Decimal("0.5"))
+        with self.assertRaises(ValueError):
+            WalletEngine.debit(first, Decimal("1"), reference="c")
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.gold_balance_grams, Decimal("0.5"))
+        self.assertEqual(WalletTransaction.objects.filter(wallet=self.wallet).count(), 3)
+
     def test_inventory_reserve_and_release(self):
         InventoryEngine.reserve(Decimal("10"))
         inv = InventoryEngine.get_inventory()
@@ -84,3 +140,806 @@ class BuyOrderSafetyTests(TestCase):
 
         # Re-confirming should not change state or crash
         self.assertEqual(order.status, BuyOrder.STATUS_EXECUTED)
+
+
+@override_settings(INVENTORY_STRIPES=4)
+class StripedInventoryTests(TestCase):
+
+    def setUp(self):
+        inventory = InventoryEngine.get_inventory()
+        inventory.total_grams = Decimal("100")
+        inventory.save()
+        InventoryEngine.rebalance()
+
+    def test_rebalance_spreads_available_grams(self):
+        rows = list(GoldInventory.objects.order_by("id").values_list("id", "total_grams"))
+        self.assertEqual(rows, [(i, Decimal("25")) for i in range(1, 5)])
+
+    def test_bench_inventory_refuses_without_scratch(self):
+        with self.assertRaisesMessage(CommandError, "--scratch"):
+            call_command("bench_inventory")
+        with override_settings(DJANGO_ENV="production"), self.assertRaisesMessage(CommandError, "production"):
+            call_command("bench_inventory", "--scratch")
+
+    def test_migration_spreads_pre_striping_stock(self):
+        from django.apps import apps
+        spread_stripes = import_module("wallet.migrations.0012_spread_inventory_stripes").spread_stripes
+
+        # Before striping: one row holding everything, incl. a reservation
+        GoldInventory.objects.exclude(id=1).delete()
+        GoldInventory.objects.filter(id=1).update(total_grams=Decimal("103"), reserved_grams=Decimal("3"))
+        spread_stripes(apps, None)
+
+        rows = list(GoldInventory.objects.order_by("id").values_list("id", "total_grams", "reserved_grams"))
+        self.assertEqual(rows, [
+            (1, Decimal("28"), Decimal("3")),
+            *[(i, Decimal("25"), Decimal("0")) for i in range(2, 5)],
+        ])
+
+    def test_reserve_returns_stripe_and_totals_add_up(self):
+        stripe = InventoryEngine.reserve(Decimal("10"))
+
+        self.assertEqual(GoldInventory.objects.get(id=stripe).reserved_grams, Decimal("10"))
+        totals = InventoryEngine.totals()
+        self.assertEqual(totals["total_grams"], Decimal("100"))
+        self.assertEqual(totals["reserved_grams"], Decimal("10"))
+        self.assertEqual(totals["available_grams"], Decimal("90"))
+        self.assertEqual(totals["stripes"], 4)
+
+    def test_reserve_larger_than_any_stripe_rebalances(self):
+        InventoryEngine.reserve(Decimal("60"))
+
+        totals = InventoryEngine.totals()
+        self.assertEqual(totals["reserved_grams"], Decimal("60"))
+        self.assertEqual(totals["total_grams"], Decimal("100"))
+
+        with self.assertRaises(ValueError):
+            InventoryEngine.reserve(Decimal("41"))
+
+    def test_fulfil_and_release_hit_the_reserving_stripe(self):
+        first = InventoryEngine.reserve(Decimal("5"))
+        second = InventoryEngine.reserve(Decimal("3"))
+
+        InventoryEngine.fulfil(Decimal("5"), Decimal("5"), stripe=first)
+        InventoryEngine.release(Decimal("3"), stripe=second)
+
+        totals = InventoryEngine.totals()
+        self.assertEqual(totals["total_grams"], Decimal("95"))
+        self.assertEqual(totals["reserved_grams"], Decimal("0"))
+
+    def test_shrinking_stripes_drains_extra_rows(self):
+        with override_settings(INVENTORY_STRIPES=2):
+            InventoryEngine.rebalance()
+
+        available = dict(GoldInventory.objects.values_list("id", "total_grams"))
+        self.assertEqual(available[1] + available[2], Decimal("100"))
+        self.assertEqual(available[3] + available[4], Decimal("0"))
+
+
+@override_settings(INVENTORY_STRIPES=2)
+class ExpiredLockSweeperTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="sweeper", password="testpass")
+        self.wallet = Wallet.objects.get(user=self.user)
+        WalletEngine.credit(self.wallet, Decimal("10"), reference="init")
+
+        inventory = InventoryEngine.get_inventory()
+        inventory.total_grams = Decimal("100")
+        inventory.save()
+        InventoryEngine.rebalance()
+
+        self.now = timezone.now()
+
+    def _order(self, model, grams, expires_in):
+        if model is BuyOrder:
+            extra = {"inventory_stripe": InventoryEngine.reserve(grams)}
+        else:
+            WalletEngine.debit(self.wallet, grams, reference="soft_sell_hold")
+            extra = {}
+
+        return model.objects.create(
+            user=self.user,
+            wallet=self.wallet,
+            gold_quantity_grams=grams,
+            soft_allocated_grams=grams,
+            locked_at=self.now - timedelta(minutes=5),
+            expires_at=self.now + timedelta(seconds=expires_in),
+            order_token=f"{model.__name__}-{model.objects.count()}",
+            **extra,
+        )
+
+    def test_sweeps_expired_orders_in_batches(self):
+        expired_buys = [self._order(BuyOrder, Decimal("2"), -60 - i) for i in range(3)]
+        live_buy = self._order(BuyOrder, Decimal("1"), 60)
+        expired_sell = self._order(SellOrder, Decimal("4"), -30)
+
+        report = ExpiredLockSweeper(batch_size=2).run(now=self.now)
+
+        self.assertEqual(report["buy_orders"], 3)
+        self.assertEqual(report["sell_orders"], 1)
+        self.assertEqual(report["released_grams"], Decimal("6"))
+        self.assertEqual(report["recredited_grams"], Decimal("4"))
+        self.assertEqual([batch["orders"] for batch in report["batches"]], [2, 1, 1])
+        self.assertAlmostEqual(report["max_lag_seconds"], 62, delta=1)
+
+        for order in expired_buys + [expired_sell]:
+            order.refresh_from_db()
+            self.assertEqual(order.status, BuyOrder.STATUS_EXPIRED)
+        live_buy.refresh_from_db()
+        self.assertEqual(live_buy.status, BuyOrder.STATUS_PENDING_LOCKED)
+
+        self.assertEqual(InventoryEngine.totals()["reserved_grams"], Decimal("1"))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.gold_balance_grams, Decimal("10"))
+        self.assertEqual(
+            WalletTransaction.objects.filter(reference="sell_expire").get().balance_after_tx,
+            Decimal("10"),
+        )
+
+    def test_swept_order_cannot_be_confirmed(self):
+        order = self._order(BuyOrder, Decimal("2"), -1)
+        ExpiredLockSweeper().run(now=self.now)
+
+        self.assertFalse(claim_order(order, BuyOrder.STATUS_EXECUTED, executed_at=self.now))
+        self.assertEqual(ExpiredLockSweeper().run(now=self.now)["batches"], [])
+
+
+class WalletLedgerPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="trader", password="testpass")
+        self.wallet = Wallet.objects.get(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        # 7 rows, three sharing one timestamp (ids break the tie)
+        base = timezone.now() - timedelta(days=1)
+        stamps = [base, base, base, base + timedelta(hours=1), base + timedelta(hours=2),
+                  base + timedelta(hours=3), base + timedelta(hours=4)]
+        for i, ts in enumerate(stamps):
+            WalletTransaction.objects.create(
+                user=self.user,
+                wallet=self.wallet,
+                tx_type=WalletTransaction.DEBIT if i % 2 else WalletTransaction.CREDIT,
+                gold_amount_grams=Decimal("1"),
+                balance_after_tx=Decimal(i),
+                idempotency_key=f"ledger-{i}",
+                timestamp=ts,
+            )
+
+    def _all_pages(self, **params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, **({"cursor": cursor} if cursor else {}))
+            body = self.client.get("/api/wallet/ledger/", query).json()
+            ids += [row["id"] for row in body["results"]]
+            pages += 1
+            cursor = body["next_cursor"]
+            if not cursor:
+                return ids, pages
+
+    def test_pages_cover_ledger_once_in_order(self):
+        ids, pages = self._all_pages(limit=2)
+
+        expected = list(
+            WalletTransaction.objects.filter(wallet=self.wallet)
+            .order_by("-timestamp", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_type_filter_and_limit_cap(self):
+        ids, _ = self._all_pages(type="debit")
+        self.assertEqual(len(ids), 3)
+
+        with override_settings(WALLET_LEDGER_MAX_PAGE_SIZE=3):
+            body = self.client.get("/api/wallet/ledger/", {"limit": 1000}).json()
+        self.assertEqual(body["limit"], 3)
+        self.assertEqual(len(body["results"]), 3)
+
+    def test_bad_cursor_and_filters_are_rejected(self):
+        self.assertEqual(self.client.get("/api/wallet/ledger/", {"cursor": "nope"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/wallet/ledger/", {"type": "GIFT"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/wallet/ledger/", {"from": "yesterday"}).status_code, 400)
+
+
+class LedgerExportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="exporter", password="testpass")
+        self.wallet = Wallet.objects.get(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        for i in range(5):
+            WalletEngine.credit(self.wallet, Decimal("1.25"), reference=f"buy-{i}")
+
+    def _body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_csv_export_streams_every_row(self):
+        response = self.client.get("/api/wallet/ledger/export/")
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="ledger.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(self._body(response).decode())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["balance_after_tx"], "6.250000")
+        self.assertEqual(rows[0]["reference"], "buy-4")
+
+    def test_gzipped_ndjson_export(self):
+        response = self.client.get("/api/wallet/ledger/export/", {"as": "ndjson", "gzip": "1", "type": "CREDIT"})
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(self._body(response)).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[-1])["gold_amount_grams"], "1.250000")
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get("/api/wallet/ledger/export/", {"as": "xlsx"}).status_code, 400)
+
+
+class BalanceCheckpointTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="holder", password="testpass")
+        self.wallet = Wallet.objects.get(user=self.user)
+        self.other = Wallet.objects.get(user=User.objects.create_user(username="idle", password="testpass"))
+        self.checkpointer = BalanceCheckpointer(settle_seconds=0)
+
+    def _at(self, tx):
+        return WalletTransaction.objects.get(pk=tx.pk).timestamp
+
+    def test_incremental_checkpoints_only_touch_active_wallets(self):
+        WalletEngine.credit(self.wallet, Decimal("5"), reference="a")
+        WalletEngine.credit(self.other, Decimal("1"), reference="b")
+        self.assertEqual(self.checkpointer.run()["wallets"], 2)
+
+        WalletEngine.debit(self.wallet, Decimal("0.3"), reference="c")
+        report = self.checkpointer.run()
+
+        self.assertEqual((report["wallets"], report["transactions"]), (1, 1))
+        latest = WalletBalanceCheckpoint.objects.filter(wallet=self.wallet).order_by("-last_transaction_id").first()
+        self.assertEqual(latest.balance_grams, Decimal("4.7"))
+        self.assertEqual(self.checkpointer.run()["wallets"], 0)
+
+    def test_balance_as_of_uses_checkpoint_plus_newer_rows(self):
+        first = WalletEngine.credit(self.wallet, Decimal("2"), reference="a")
+        self.checkpointer.run()
+        second = WalletEngine.credit(self.wallet, Decimal("3"), reference="b")
+        WalletEngine.debit(self.wallet, Decimal("1"), reference="c")
+
+        self.assertEqual(BalanceCheckpointer.balance_as_of(self.wallet, self._at(first)), Decimal("2"))
+        self.assertEqual(BalanceCheckpointer.balance_as_of(self.wallet, self._at(second)), Decimal("5"))
+        self.assertEqual(BalanceCheckpointer.balance_as_of(self.wallet, timezone.now()), Decimal("4"))
+        self.assertEqual(
+            BalanceCheckpointer.balance_as_of(self.wallet, self._at(first) - timedelta(seconds=1)),
+            Decimal("0"),
+        )
+
+    def test_verify_reports_drift(self):
+        WalletEngine.credit(self.wallet, Decimal("2"), reference="a")
+        self.checkpointer.run()
+        WalletEngine.credit(self.wallet, Decimal("1"), reference="b")
+        self.assertEqual(self.checkpointer.verify()["mismatches"], [])
+
+        Wallet.objects.filter(pk=self.wallet.pk).update(gold_balance_grams=Decimal("10"))
+        mismatches = self.checkpointer.verify()["mismatches"]
+
+        self.assertEqual(len(mismatches), 1)
+        self.assertEqual(mismatches[0]["wallet_id"], self.wallet.pk)
+        self.assertEqual(mismatches[0]["difference"], Decimal("7"))
+
+
+@skipUnless(connection.vendor == "postgresql", "Postgres only")
+class BalanceVerifySnapshotTests(TransactionTestCase):
+
+    def test_order_between_reads_is_not_drift(self):
+        wallet = Wallet.objects.get(user=User.objects.create_user(username="busy", password="testpass"))
+        WalletEngine.credit(wallet, Decimal("2"), reference="a")
+
+        def credit_elsewhere():
+            try:
+                WalletEngine.credit(Wallet.objects.get(pk=wallet.pk), Decimal("1"), reference="b")
+            finally:
+                connection.close()
+
+        # An order commits after the balances are read, before the ledger
+        latest_checkpoints = checkpoints.latest_checkpoints
+
+        def between_reads(wallet_ids, **kwargs):
+            thread = threading.Thread(target=credit_elsewhere)
+            thread.start()
+            thread.join()
+            return latest_checkpoints(wallet_ids, **kwargs)
+
+        checkpointer = BalanceCheckpointer(settle_seconds=0)
+        with mock.patch("wallet.checkpoints.latest_checkpoints", side_effect=between_reads):
+            self.assertEqual(checkpointer.verify()["mismatches"], [])
+        self.assertEqual(checkpointer.verify(), {"wallets": 1, "mismatches": []})
+
+
+class ReconciliationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reconciled", password="testpass")
+        self.wallet = Wallet.objects.get(user=self.user)
+
+        inventory = InventoryEngine.get_inventory()
+        inventory.total_grams = Decimal("100")
+        inventory.save()
+
+        self.reconciler = Reconciler(settle_seconds=0)
+
+    def _buy(self, grams, execute=True):
+        now = timezone.now()
+        stripe = InventoryEngine.reserve(grams)
+        order = BuyOrder.objects.create(
+            user=self.user,
+            wallet=self.wallet,
+            gold_quantity_grams=grams,
+            soft_allocated_grams=grams,
+            inventory_stripe=stripe,
+            locked_at=now,
+            expires_at=now + timedelta(minutes=1),
+            order_token=f"recon-{BuyOrder.objects.count()}",
+        )
+        if execute:
+            claim_order(order, BuyOrder.STATUS_EXECUTED, executed_at=now)
+            InventoryEngine.fulfil(grams, grams, stripe=stripe)
+            WalletEngine.credit(self.wallet, grams, reference=order.order_token)
+        return order
+
+    def _failed(self, run):
+        return [check["check"] for check in run.checks if not check["ok"]]
+
+    def test_incremental_runs_stay_consistent(self):
+        first = self.reconciler.run()
+        self.assertEqual(first.mode, ReconciliationRun.MODE_FULL)
+        self.assertTrue(first.ok)
+
+        self._buy(Decimal("2.5"))
+        self._buy(Decimal("1"), execute=False)
+        run = self.reconciler.run()
+
+        self.assertEqual(run.mode, ReconciliationRun.MODE_INCREMENTAL)
+        self.assertTrue(run.ok, run.checks)
+        self.assertEqual(run.rows_processed, 2)  # one ledger row + one executed buy
+        self.assertEqual(ReconciliationCounter.objects.get(name=LEDGER_NET).total, Decimal("2.5"))
+
+    def test_drift_is_flagged_and_alerted(self):
+        self.reconciler.run()
+        self._buy(Decimal("1"))
+        Wallet.objects.filter(pk=self.wallet.pk).update(gold_balance_grams=Decimal("5"))
+        GoldInventory.objects.filter(id=1).update(reserved_grams=Decimal("3"))
+
+        with mock.patch.object(Reconciler, "alert") as alert:
+            run = self.reconciler.run()
+
+        self.assertFalse(run.ok)
+        self.assertEqual(self._failed(run), ["wallets_vs_ledger", "reserved_vs_pending_buys"])
+        self.assertEqual(run.max_drift_grams, Decimal("4"))
+        alert.assert_called_once_with(run)
+
+    def test_full_mode_recomputes_counters_and_rebaseline_accepts_restock(self):
+        self.reconciler.run()
+        self._buy(Decimal("1"))
+        ReconciliationCounter.objects.filter(name=LEDGER_NET).update(total=Decimal("42"))
+        GoldInventory.objects.filter(id=1).update(total_grams=Decimal("149"))
+
+        with mock.patch.object(Reconciler, "alert"):
+            self.assertEqual(self._failed(self.reconciler.run()), ["wallets_vs_ledger", "inventory_vs_orders"])
+            self.assertEqual(self._failed(self.reconciler.run(full=True)), ["inventory_vs_orders"])
+
+        self.assertTrue(self.reconciler.run(rebaseline_inventory=True).ok)
+        self.assertTrue(self.reconciler.run().ok)
+
+
+class IdempotencyKeyTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="retrier", password="testpass")
+        self.wallet = Wallet.objects.get(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        inventory = InventoryEngine.get_inventory()
+        inventory.total_grams = Decimal("100")
+        inventory.save()
+
+        now = timezone.now()
+        grams = Decimal("2")
+        self.order = BuyOrder.objects.create(
+            user=self.user,
+            wallet=self.wallet,
+            gold_quantity_grams=grams,
+            soft_allocated_grams=grams,
+            inventory_stripe=InventoryEngine.reserve(grams),
+            locked_at=now,
+            expires_at=now + timedelta(minutes=1),
+            order_token="idem-order",
+        )
+
+    def _confirm(self, key, token="idem-order"):
+        return self.client.post(
+            "/api/wallet/buy/confirm/", {"order_token": token}, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_stored_response(self):
+        first = self._confirm("key-1")
+        retry = self._confirm("key-1")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry[REPLAY_HEADER], "true")
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.gold_balance_grams, Decimal("2"))
+
+        # A new key runs the endpoint again (and is refused by the order state)
+        self.assertEqual(self._confirm("key-2").status_code, 400)
+
+    def test_reused_key_with_other_body_and_in_flight_key(self):
+        self._confirm("key-1")
+        self.assertEqual(self._confirm("key-1", token="other-order").status_code, 422)
+
+        IdempotencyStore.begin(self.user, "key-busy", "buy_confirm", request_fingerprint({"order_token": "idem-order"}))
+        with override_settings(IDEMPOTENCY_WAIT_SECONDS=0):
+            response = self._confirm("key-busy")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_retry_waits_for_the_first_response(self):
+        record = IdempotencyStore.begin(
+            self.user, "key-slow", "buy_confirm", request_fingerprint({"order_token": "idem-order"})
+        )
+
+        # The first request finishes while the retry polls
+        def first_finishes(seconds):
+            IdempotencyStore.finish(record, Response({"status": "executed"}, status=200))
+
+        with mock.patch("wallet.idempotency.time.sleep", side_effect=first_finishes) as sleep:
+            retry = self._confirm("key-slow")
+
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), {"status": "executed"})
+        self.assertEqual(retry[REPLAY_HEADER], "true")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, BuyOrder.STATUS_PENDING_LOCKED)
+
+    def test_missing_key_and_purge(self):
+        response = self.client.post("/api/wallet/buy/confirm/", {"order_token": "idem-order"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        self._confirm("key-1")
+        IdempotencyStore.begin(self.user, "stale", "sell_confirm", "hash")
+        IdempotencyRecord.objects.filter(key="stale").update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(IdempotencyStore.purge_expired(batch_size=1), 1)
+        self.assertEqual(list(IdempotencyRecord.objects.values_list("key", flat=True)), ["key-1"])
+
+
+class AuditEmitterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="audited", password="testpass")
+        self.wallet = Wallet.objects.get(user=self.user)
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool_dir = spool.name
+        self.emitter = AuditEmitter(batch_size=50, flush_seconds=60, spool_dir=self.spool_dir)
+        # Flushes run inline here, inside the test transaction
+        patcher = mock.patch.object(self.emitter, "_start_thread")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        now = timezone.now()
+        self.order = BuyOrder.objects.create(
+            user=self.user,
+            wallet=self.wallet,
+            gold_quantity_grams=Decimal("1.5"),
+            locked_price_per_gram=Decimal("250.25"),
+            locked_at=now,
+            expires_at=now + timedelta(minutes=1),
+            order_token="audit-order",
+        )
+
+    def _spooled(self):
+        return sorted(os.listdir(self.spool_dir))
+
+    def test_events_are_queued_on_commit_and_flushed_in_bulk(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.emitter.emit(self.order, OrderAuditLog.EVENT_LOCK_CREATED, inventory_stripe=3)
+            self.emitter.emit(self.order, OrderAuditLog.EVENT_EXECUTED)
+            # Nothing is written inside the request
+            self.assertEqual(OrderAuditLog.objects.count(), 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.emitter.flush(), 2)
+
+        rows = list(OrderAuditLog.objects.order_by("timestamp"))
+        self.assertEqual([row.event_type for row in rows], ["LOCK_CREATED", "EXECUTED"])
+        self.assertEqual(rows[0].order_type, "BUY")
+        self.assertEqual(rows[0].price_per_gram, Decimal("250.25"))
+        self.assertEqual(rows[0].metadata, {"inventory_stripe": 3})
+        # Only the (empty) live spool is left
+        self.assertEqual(len(self._spooled()), 1)
+
+    def test_failed_flush_is_replayed_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.emitter.emit(self.order, OrderAuditLog.EVENT_LOCK_EXPIRED, description="Expired at confirm")
+
+        with mock.patch.object(OrderAuditLog.objects, "bulk_create", side_effect=RuntimeError("db down")):
+            self.assertEqual(self.emitter.flush(), 0)
+        self.assertEqual(OrderAuditLog.objects.count(), 0)
+        self.assertTrue(any(name.endswith(".segment") for name in self._spooled()))
+
+        self.assertEqual(self.emitter.replay(), 1)
+        self.assertEqual(self.emitter.replay(), 0)
+        self.assertEqual(OrderAuditLog.objects.get().description, "Expired at confirm")
+
+        # Replaying the same events again does not duplicate them
+        entry = OrderAuditLog.objects.get()
+        self.emitter.enqueue([entry])
+        self.emitter.flush()
+        self.assertEqual(OrderAuditLog.objects.count(), 1)
+
+    def test_replay_leaves_live_processes_segments_alone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.emitter.emit(self.order, OrderAuditLog.EVENT_LOCK_CREATED)
+        with mock.patch.object(OrderAuditLog.objects, "bulk_create", side_effect=RuntimeError("db down")):
+            self.emitter.flush()
+
+        # Seen from another process on this host (e.g. replay_audit_spool)
+        other = AuditEmitter(spool_dir=self.spool_dir)
+        with mock.patch("wallet.audit.os.getpid", return_value=os.getpid() + 1):
+            self.assertEqual(other.replay(), 0)
+            with mock.patch("wallet.audit._pid_alive", return_value=False):
+                self.assertEqual(other.replay(), 1)
+        self.assertEqual(OrderAuditLog.objects.count(), 1)
+
+    def test_other_instances_files_are_replayed_with_all_hosts(self):
+        with override_settings(AUDIT_INSTANCE_ID="web-1"):
+            before_restart = AuditEmitter(spool_dir=self.spool_dir)
+        patcher = mock.patch.object(before_restart, "_start_thread")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            before_restart.emit(self.order, OrderAuditLog.EVENT_LOCK_CREATED)
+        with self.assertLogs("wallet.audit", "ERROR"):
+            with mock.patch.object(OrderAuditLog.objects, "bulk_create", side_effect=RuntimeError("db down")):
+                before_restart.flush()
+
+        # Back under a new name: the old instance's segment is not its own
+        with override_settings(AUDIT_INSTANCE_ID="web-2"):
+            self.assertEqual(AuditEmitter(spool_dir=self.spool_dir).replay(), 0)
+
+        def replay_all_hosts():
+            out = io.StringIO()
+            call_command("replay_audit_spool", "--spool-dir", self.spool_dir, "--all-hosts", stdout=out)
+            return out.getvalue()
+
+        # Recently touched files may belong to a live instance
+        self.assertIn("Replayed 0 ", replay_all_hosts())
+        long_ago = time.time() - 3600
+        for name in self._spooled():
+            os.utime(os.path.join(self.spool_dir, name), (long_ago, long_ago))
+        self.assertIn("Replayed 1 ", replay_all_hosts())
+        self.assertEqual(OrderAuditLog.objects.count(), 1)
+
+    def test_flush_tolerates_segment_replayed_meanwhile(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.emitter.emit(self.order, OrderAuditLog.EVENT_LOCK_CREATED)
+
+        bulk_create = OrderAuditLog.objects.bulk_create
+
+        def replayed_elsewhere(*args, **kwargs):
+            for name in self._spooled():
+                if name.endswith(".segment"):
+                    os.remove(os.path.join(self.spool_dir, name))
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(OrderAuditLog.objects, "bulk_create", side_effect=replayed_elsewhere):
+            self.assertEqual(self.emitter.flush(), 1)
+        self.assertEqual(self.emitter.stats["written"], 1)
+
+    def test_rolled_back_order_leaves_no_event(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.emitter.emit(self.order, OrderAuditLog.EVENT_LOCK_CREATED)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.emitter.flush(), 0)
+
+
+class EndpointBudgetTests(TestCase):
+    """
+    Query-count and latency budgets for the wallet endpoints, on seeded
+    data. A new N+1 or round trip fails here; raise a budget only on
+    purpose. Latency budgets are loose (PERF_LATENCY_BUDGET_SCALE) and
+    only catch gross regressions.
+    """
+
+    LEDGER_ROWS = 300
+
+    def setUp(self):
+        GoldPriceConfig.objects.create()
+        LatestPriceCache.invalidate()
+        self.addCleanup(LatestPriceCache.invalidate)
+        GoldPriceSnapshot.objects.create(
+            usd_per_ounce=Decimal("2000"),
+            usd_pkr_rate=Decimal("280"),
+            pkr_per_ounce_raw=Decimal("1244140"),
+            pkr_per_gram_raw=Decimal("40000"),
+            pkr_per_tola_raw=Decimal("466552"),
+            pkr_per_ounce_final=Decimal("1244140"),
+            pkr_per_gram_final=Decimal("40000"),
+            pkr_per_tola_final=Decimal("466552"),
+        )
+
+        inventory = InventoryEngine.get_inventory()
+        inventory.total_grams = Decimal("1000")
+        inventory.save()
+        # Stock on every stripe, so the first reserve attempt succeeds
+        InventoryEngine.rebalance()
+
+        self.user = User.objects.create_user(username="budgeted", password="testpass")
+        self.wallet = Wallet.objects.get(user=self.user)
+        for i in range(self.LEDGER_ROWS):
+            WalletEngine.credit(self.wallet, Decimal("0.01"), reference=f"seed-{i}")
+
+        # Real JWT auth, so every request loads its user like production
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        # Warm the price and pricing-config caches, as in a running worker
+        LatestPriceCache.get_snapshot()
+
+    def _post(self, path, data, **headers):
+        return self.client.post(path, data, format="json", **headers)
+
+    def test_buy_lock_and_confirm(self):
+        with query_budget("buy_lock", max_queries=4, max_ms=250):
+            response = self._post("/api/wallet/buy/lock/", {"amount_pkr": "10000"})
+        self.assertEqual(response.status_code, 200)
+
+        with query_budget("buy_confirm", max_queries=9, max_ms=250):
+            response = self._post(
+                "/api/wallet/buy/confirm/", {"order_token": response.json()["order_token"]}, HTTP_IDEMPOTENCY_KEY="b-1"
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_sell_lock_and_confirm(self):
+        with query_budget("sell_lock", max_queries=5, max_ms=250):
+            response = self._post("/api/wallet/sell/lock/", {"sell_grams": "1"})
+        self.assertEqual(response.status_code, 200)
+
+        with query_budget("sell_confirm", max_queries=7, max_ms=250):
+            response = self._post(
+                "/api/wallet/sell/confirm/", {"order_token": response.json()["order_token"]}, HTTP_IDEMPOTENCY_KEY="s-1"
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_balance_and_ledger_pages(self):
+        with query_budget("wallet_balance", max_queries=2, max_ms=100):
+            self.assertEqual(self.client.get("/api/wallet/balance/").status_code, 200)
+
+        with query_budget("wallet_ledger_first_page", max_queries=3, max_ms=150):
+            page = self.client.get("/api/wallet/ledger/", {"limit": 200}).json()
+        with query_budget("wallet_ledger_next_page", max_queries=3, max_ms=150):
+            last = self.client.get("/api/wallet/ledger/", {"limit": 200, "cursor": page["next_cursor"]}).json()
+        self.assertEqual(len(page["results"]) + len(last["results"]), self.LEDGER_ROWS)
+
+    def test_ledger_export_streams_in_constant_queries(self):
+        with query_budget("wallet_ledger_export", max_queries=3, max_ms=500):
+            response = self.client.get("/api/wallet/ledger/export/", {"as": "ndjson"})
+            rows = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(rows), self.LEDGER_ROWS)
+
+
+class QueryPlanTests(TestCase):
+
+    def test_key_queries_use_their_indexes(self):
+        for name, (queryset, table, index) in key_queries().items():
+            with self.subTest(name):
+                plan = explain(queryset)
+                self.assertEqual(full_scans(plan, table), [], plan)
+                if index:
+                    self.assertIn(index, plan)
+
+
+class MicrobenchCommandTests(TestCase):
+
+    def setUp(self):
+        GoldPriceConfig.objects.create()
+        inventory = InventoryEngine.get_inventory()
+        inventory.total_grams = Decimal("10")
+        inventory.save()
+        InventoryEngine.rebalance()
+
+        output = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        self.output = output.name
+
+    def test_results_are_saved_and_compared(self):
+        args = ["--number", "3", "--repeats", "2", "--warmup", "1", "--cpu-number", "10"]
+        call_command("microbench", *args, "--output", self.output, stdout=io.StringIO())
+
+        with open(self.output) as f:
+            results = json.load(f)["results"]
+        self.assertIn("pricing.compute_prices", results)
+        self.assertEqual(results["engine.wallet_credit"]["errors"], 0)
+        self.assertEqual(results["engine.inventory_release"]["ops"], 7)
+
+        # Engine pairs leave no stock change, reservations or throwaway users behind
+        totals = InventoryEngine.totals()
+        self.assertEqual((totals["total_grams"], totals["reserved_grams"]), (Decimal("10"), Decimal("0")))
+        self.assertFalse(User.objects.filter(username__startswith="microbench-").exists())
+
+        # A baseline 1000x faster than this run is a regression
+        results = {name: {**row, "median_us": row["median_us"] / 1000} for name, row in results.items()}
+        with open(self.output, "w") as f:
+            json.dump({"meta": {}, "results": results}, f)
+
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command("microbench", *args, "--skip-engine", "--baseline", self.output, "--fail-on-regression", stdout=out)
+        self.assertIn("wallet.tola", out.getvalue())
+
+
+class LoadtestOrdersCommandTests(TransactionTestCase):
+    """
+    Virtual users run in threads on their own connections, so the seed
+    data has to be committed.
+    """
+
+    def setUp(self):
+        GoldPriceConfig.objects.create()
+        LatestPriceCache.invalidate()
+        self.addCleanup(LatestPriceCache.invalidate)
+        GoldPriceSnapshot.objects.create(
+            usd_per_ounce=Decimal("2000"),
+            usd_pkr_rate=Decimal("280"),
+            pkr_per_ounce_raw=Decimal("1244140"),
+            pkr_per_gram_raw=Decimal("40000"),
+            pkr_per_tola_raw=Decimal("466552"),
+            pkr_per_ounce_final=Decimal("1244140"),
+            pkr_per_gram_final=Decimal("40000"),
+            pkr_per_tola_final=Decimal("466552"),
+        )
+
+        inventory = InventoryEngine.get_inventory()
+        inventory.total_grams = Decimal("100")
+        inventory.save()
+        InventoryEngine.rebalance()
+
+        # Audit rows land before the tables are flushed, spools off the repo
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        self.emitter = AuditEmitter(spool_dir=spool_dir)
+        self.addCleanup(self.emitter.stop)
+        patcher = mock.patch("wallet.audit._emitter", self.emitter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_in_process_run_reports_and_stays_consistent(self):
+        # The in-memory SQLite test database locks whole tables; only
+        # Postgres runs the virtual users concurrently
+        users = 2 if connection.vendor == "postgresql" else 1
+        out = io.StringIO()
+        call_command("loadtest_orders", "--users", str(users), "--orders", "2", "--seed", "1", "--json", stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report["users"], users)
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(report["endpoints"]["register"]["requests"], users)
+        self.assertEqual(report["endpoints"]["jwt_login"]["ok"], users)
+        orders = [report["endpoints"].get(name, {}) for name in ("buy_confirm", "sell_confirm")]
+        self.assertEqual(sum(row.get("ok", 0) for row in orders), 2 * users)
+        for key in ("orders_per_second", "error_rate", "expiry_rate", "swept_locks"):
+            self.assertIn(key, report)
+
+        self.assertTrue(report["consistency"]["ok"], report["consistency"])
+        self.assertEqual(report["consistency"]["wallets_checked"], users)
+        self.emitter.flush()
+        self.assertEqual(OrderAuditLog.objects.filter(event_type=OrderAuditLog.EVENT_EXECUTED).count(), 2 * users)
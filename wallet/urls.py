@@ -3,6 +3,7 @@ from django.urls import path
 from .views import (
     WalletBalanceView,
     WalletLedgerView,
+    WalletLedgerExportView,
     BuyLockView,
     BuyConfirmView,
     SellLockView,
@@ -12,6 +13,7 @@ from .views import (
 urlpatterns = [
     path("balance/", WalletBalanceView.as_view()),
     path("ledger/", WalletLedgerView.as_view()),
+    path("ledger/export/", WalletLedgerExportView.as_view()),
 
     # NEW BUY/SELL SYSTEM
     path("buy/lock/", BuyLockView.as_view()),
@@ -2,6 +2,9 @@ from decimal import Decimal
 from uuid import uuid4
 from datetime import timedelta
 
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 
@@ -12,11 +15,32 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from market.models import GoldPriceSnapshot, GoldPriceConfig
+from market.cache import LatestPriceCache, PricingConfigCache
 
 from .models import Wallet, BuyOrder, SellOrder, WalletTransaction
+from .audit import get_audit_emitter
+from .audit_models import OrderAuditLog
+from .idempotency import idempotent
+from .export import EXPORT_CONTENT_TYPES, export_filename, export_ledger
+from .ledger import ledger_page, ledger_queryset, parse_ledger_filters
 from .services import WalletEngine, InventoryEngine
 
+
+def claim_order(order, status, **fields):
+    """
+    Moves a PENDING_LOCKED order to status with one conditional UPDATE.
+    False if something else (sweeper, a parallel confirm) got there first.
+    """
+    claimed = type(order).objects.filter(pk=order.pk, status=order.STATUS_PENDING_LOCKED).update(
+        status=status, **fields
+    )
+    if claimed:
+        order.status = status
+        for name, value in fields.items():
+            setattr(order, name, value)
+    return bool(claimed)
+
+
 # -----------------------------
 # BUY — LOCK
 # -----------------------------
@@ -31,9 +55,8 @@ class BuyLockView(APIView):
 
         amount_pkr = Decimal(request.data.get("amount_pkr"))
 
-        config = GoldPriceConfig.load()
-        min_buy = config.min_buy_amount_pkr
-        fee_pct = config.buy_fee_percentage
+        pricing = PricingConfigCache.get()
+        min_buy = pricing["min_buy_amount_pkr"]
 
         if amount_pkr < min_buy:
             return Response(
@@ -41,15 +64,17 @@ class BuyLockView(APIView):
                 status=400
             )
 
-        snapshot = GoldPriceSnapshot.objects.latest("timestamp")
+        snapshot = LatestPriceCache.get_snapshot()
+        if not snapshot:
+            return Response({"error": "No price data available yet"}, status=503)
         price = snapshot.pkr_per_gram_final
 
         grams = amount_pkr / price
-        fee_pkr = amount_pkr * fee_pct / 100
+        fee_pkr = amount_pkr * pricing["buy_fee_rate"]
         total_payable = amount_pkr + fee_pkr
 
         # Reserve inventory BEFORE creating order
-        InventoryEngine.reserve(grams)
+        stripe = InventoryEngine.reserve(grams)
 
         order = BuyOrder.objects.create(
             user=user,
@@ -59,11 +84,13 @@ class BuyLockView(APIView):
             fee_pkr=fee_pkr,
             total_payable_pkr=total_payable,
             soft_allocated_grams=grams,
+            inventory_stripe=stripe,
             snapshot_reference=snapshot,
             locked_at=timezone.now(),
-            expires_at=timezone.now() + timedelta(seconds=config.lock_duration_seconds),
+            expires_at=timezone.now() + timedelta(seconds=pricing["lock_duration_seconds"]),
             order_token=str(uuid4()),
         )
+        get_audit_emitter().emit(order, OrderAuditLog.EVENT_LOCK_CREATED, inventory_stripe=stripe)
 
         return Response({
             "order_token": order.order_token,
@@ -83,36 +110,37 @@ class BuyConfirmView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @idempotent("buy_confirm", required=True)
     def post(self, request):
-
-        idempotency_key = request.headers.get("Idempotency-Key")
-
-        if not idempotency_key:
-            return Response(
-                {"error": "Idempotency-Key header is required"},
-                status=400
-            )
-
         token = request.data.get("order_token")
-        order = get_object_or_404(BuyOrder, order_token=token)
+        order = get_object_or_404(BuyOrder.objects.select_related("wallet"), order_token=token)
 
         if order.status != BuyOrder.STATUS_PENDING_LOCKED:
             return Response({"error": "Order cannot be confirmed"}, status=400)
 
-        if timezone.now() > order.expires_at:
-            InventoryEngine.release(order.soft_allocated_grams)
-            order.status = BuyOrder.STATUS_EXPIRED
-            order.save()
+        now = timezone.now()
+
+        if now > order.expires_at:
+            with transaction.atomic():
+                if not claim_order(order, BuyOrder.STATUS_EXPIRED):
+                    return Response({"error": "Order cannot be confirmed"}, status=400)
+                InventoryEngine.release(order.soft_allocated_grams, stripe=order.inventory_stripe)
+                get_audit_emitter().emit(order, OrderAuditLog.EVENT_LOCK_EXPIRED, description="Expired at confirm")
             return Response({"error": "Order expired"}, status=400)
 
-        InventoryEngine.reduce_total(order.gold_quantity_grams)
-        InventoryEngine.release(order.soft_allocated_grams)
+        with transaction.atomic():
+            # Lost to the expiry sweeper or a concurrent confirm
+            if not claim_order(order, BuyOrder.STATUS_EXECUTED, executed_at=now):
+                return Response({"error": "Order cannot be confirmed"}, status=400)
 
-        WalletEngine.credit(order.wallet, order.gold_quantity_grams, reference=order.order_token)
+            InventoryEngine.fulfil(
+                order.gold_quantity_grams,
+                order.soft_allocated_grams,
+                stripe=order.inventory_stripe,
+            )
 
-        order.status = BuyOrder.STATUS_EXECUTED
-        order.executed_at = timezone.now()
-        order.save()
+            WalletEngine.credit(order.wallet, order.gold_quantity_grams, reference=order.order_token)
+            get_audit_emitter().emit(order, OrderAuditLog.EVENT_EXECUTED)
 
         return Response({
             "status": "success",
@@ -141,19 +169,24 @@ class SellLockView(APIView):
             return Response({"error": "Not enough gold to sell"}, status=400)
 
         # Load current config and pricing
-        config = GoldPriceConfig.load()
-        fee_pct = config.sell_fee_percentage
+        pricing = PricingConfigCache.get()
 
-        snapshot = GoldPriceSnapshot.objects.latest("timestamp")
+        snapshot = LatestPriceCache.get_snapshot()
+        if not snapshot:
+            return Response({"error": "No price data available yet"}, status=503)
         price = snapshot.pkr_per_gram_final
 
         # Calculate PKR values
         gross_pkr = grams * price
-        fee_pkr = gross_pkr * fee_pct / 100
+        fee_pkr = gross_pkr * pricing["sell_fee_rate"]
         net_pkr = gross_pkr - fee_pkr
 
-        # Soft debit (hold) the gold before creating order
-        WalletEngine.debit(wallet, grams, reference="soft_sell_hold")
+        # Soft debit (hold) the gold before creating order; the conditional
+        # debit also catches a concurrent sell that spent the balance
+        try:
+            WalletEngine.debit(wallet, grams, reference="soft_sell_hold")
+        except ValueError:
+            return Response({"error": "Not enough gold to sell"}, status=400)
 
         # Create sell order
         order = SellOrder.objects.create(
@@ -166,9 +199,10 @@ class SellLockView(APIView):
             total_payable_pkr=net_pkr,
             snapshot_reference=snapshot,
             locked_at=timezone.now(),
-            expires_at=timezone.now() + timedelta(seconds=config.lock_duration_seconds),
+            expires_at=timezone.now() + timedelta(seconds=pricing["lock_duration_seconds"]),
             order_token=str(uuid4()),
         )
+        get_audit_emitter().emit(order, OrderAuditLog.EVENT_LOCK_CREATED)
 
         # Return response
         return Response({
@@ -189,24 +223,30 @@ class SellConfirmView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @idempotent("sell_confirm")
     def post(self, request):
         token = request.data.get("order_token")
-        order = get_object_or_404(SellOrder, order_token=token)
+        order = get_object_or_404(SellOrder.objects.select_related("wallet"), order_token=token)
 
         if order.status != SellOrder.STATUS_PENDING_LOCKED:
             return Response({"error": "Order cannot be confirmed"}, status=400)
 
-        if timezone.now() > order.expires_at:
-            WalletEngine.credit(order.wallet, order.soft_allocated_grams, reference="sell_expire")
-            order.status = SellOrder.STATUS_EXPIRED
-            order.save()
+        now = timezone.now()
+
+        if now > order.expires_at:
+            with transaction.atomic():
+                if not claim_order(order, SellOrder.STATUS_EXPIRED):
+                    return Response({"error": "Order cannot be confirmed"}, status=400)
+                WalletEngine.credit(order.wallet, order.soft_allocated_grams, reference="sell_expire")
+                get_audit_emitter().emit(order, OrderAuditLog.EVENT_LOCK_EXPIRED, description="Expired at confirm")
             return Response({"error": "Order expired"}, status=400)
 
-        InventoryEngine.increase_total(order.gold_quantity_grams)
+        with transaction.atomic():
+            if not claim_order(order, SellOrder.STATUS_EXECUTED, executed_at=now):
+                return Response({"error": "Order cannot be confirmed"}, status=400)
 
-        order.status = SellOrder.STATUS_EXECUTED
-        order.executed_at = timezone.now()
-        order.save()
+            InventoryEngine.increase_total(order.gold_quantity_grams)
+            get_audit_emitter().emit(order, OrderAuditLog.EVENT_EXECUTED)
 
         return Response({
             "status": "success",
@@ -225,12 +265,76 @@ class WalletBalanceView(APIView):
         })
 
 class WalletLedgerView(APIView):
+    """
+    The user's ledger, newest first, keyset-paginated on (timestamp, id).
+    Query params:
+    - limit: rows per page (default WALLET_LEDGER_PAGE_SIZE, capped at
+      WALLET_LEDGER_MAX_PAGE_SIZE)
+    - cursor: next_cursor of the previous page
+    - type: CREDIT / DEBIT
+    - from / to: ISO 8601 dates or datetimes
+    """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        tx = WalletTransaction.objects.filter(
-            wallet=request.user.wallet
-        ).order_by("-timestamp")
+        try:
+            limit = int(request.query_params.get("limit") or settings.WALLET_LEDGER_PAGE_SIZE)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        limit = max(1, min(limit, settings.WALLET_LEDGER_MAX_PAGE_SIZE))
+
+        try:
+            filters = parse_ledger_filters(request.query_params)
+            rows, next_cursor = ledger_page(
+                ledger_queryset(request.user.wallet, **filters),
+                cursor=request.query_params.get("cursor"),
+                limit=limit,
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response({
+            "results": rows,
+            "next_cursor": next_cursor,
+            "limit": limit,
+        })
+
+
+class WalletLedgerExportView(APIView):
+    """
+    Streams the user's whole ledger (newest first) as a download.
+    Query params:
+    - as: csv (default) / ndjson
+    - gzip: 1 for a .gz file
+    - type, from / to: same filters as the ledger endpoint
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        export_format = request.query_params.get("as", "csv").lower()
+        compress = request.query_params.get("gzip") in ("1", "true")
+
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return Response({"error": "as must be csv or ndjson"}, status=400)
+
+        try:
+            filters = parse_ledger_filters(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        chunks = export_ledger(
+            ledger_queryset(request.user.wallet, **filters),
+            export_format=export_format,
+            gzip=compress,
+            chunk_size=settings.WALLET_LEDGER_EXPORT_CHUNK_SIZE,
+        )
 
-        return Response(list(tx.values()))
+        response = StreamingHttpResponse(
+            chunks,
+            content_type="application/gzip" if compress else EXPORT_CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{export_filename(export_format, compress)}"'
+        response["Cache-Control"] = "private, no-store"
+        return response